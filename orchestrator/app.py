@@ -1,9 +1,23 @@
 import sys
 import os
-
-from flask import Flask, render_template, jsonify, request
-
-from orchestrator.services.processor_service import ProcessorService
+from urllib.parse import urlencode
+
+from flask import Flask, Response, render_template, jsonify, request, send_file, stream_with_context
+
+from orchestrator.services.job_service import job_registry, stream_events
+from orchestrator.services.task_executor import task_executor
+from orchestrator.services.grounding_cache import grounding_cache
+from orchestrator.services.screen_cache import screen_cache_stats
+from orchestrator.services.llm_provider import prompt_cache_stats
+from orchestrator.services.replay_service import model_replay
+from orchestrator.services.metrics_service import metrics, trace_registry
+from orchestrator.services.db_writer import db_writer
+from orchestrator.services.artifact_store import DIGEST_PATTERN, artifact_store
+from orchestrator.services.vnc_pool import vnc_pool
+from orchestrator.services.recording_service import RecordingReader, multipart_frames, recording_path, to_timestamp
+from orchestrator.models.task import TaskMessage
+from orchestrator.services.pagination import InvalidPageRequest, select_fields
+from orchestrator.services.container_reconciler import CONTAINER_RECONCILE_INTERVAL, container_reconciler
 
 # API to process tasks for a user
 
@@ -12,9 +26,13 @@ from models.base import init_db
 from models.base import SessionLocal
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from services.group_service import create_group, get_groups
-from services.user_service import check_and_create_containers, create_user, get_users_by_group
-from services.task_service import TaskService
+from services.group_service import GROUP_DEFAULT_FIELDS, GROUP_FIELDS, create_group, get_groups_page
+from services.user_service import (
+    USER_DEFAULT_FIELDS, USER_FIELDS, check_and_create_containers, create_user, get_users_by_group_page,
+)
+from services.task_service import (
+    MESSAGE_DEFAULT_FIELDS, MESSAGE_FIELDS, TASK_DEFAULT_FIELDS, TASK_FIELDS, TaskService,
+)
 
 from flask_cors import CORS
 import logging
@@ -22,7 +40,7 @@ import logging
 logging.basicConfig(level=logging.ERROR)  # فقط خطاها را لاگ کنید
 
 app = Flask(__name__)
-CORS(app)  # فعال‌سازی CORS برای تمام روت‌ها
+CORS(app, expose_headers=["Link", "X-Next-Cursor"])  # فعال‌سازی CORS برای تمام روت‌ها
 
 
 # Route for the main page
@@ -31,13 +49,56 @@ def index():
     return render_template("index.html")
 
 
-# API to get all groups
+@app.errorhandler(InvalidPageRequest)
+def invalid_page_request(error):
+    return jsonify({"error": str(error)}), 400
+
+
+def page_response(page):
+    """
+    The page's items as a JSON list; the next page is linked from the Link and X-Next-Cursor headers.
+    """
+    response = jsonify(page.items)
+    if page.next_cursor:
+        args = request.args.to_dict()
+        args["cursor"] = page.next_cursor
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
+
+
+def page_args():
+    return request.args.get("cursor"), request.args.get("limit", type=int)
+
+
+def event_offset(resume_header: bool = False):
+    """
+    Index of the first job event to return, from ?since= (or the SSE Last-Event-ID header).
+
+    Returns:
+        int: The offset, or None if it is not a non-negative integer.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") if resume_header else None
+    try:
+        since = int(last_event_id) + 1 if last_event_id else int(request.args.get("since", 0))
+    except ValueError:
+        return None
+    return since if since >= 0 else None
+
+
+INVALID_EVENT_OFFSET = {"error": "since and Last-Event-ID must be non-negative integers."}
+
+
+# API to get all groups, a page at a time (?limit=, ?cursor=, ?fields=id,name,root_user,users)
 @app.route("/api/groups", methods=["GET"])
 def get_groups_api():
+    fields = select_fields(GROUP_FIELDS, request.args.get("fields"), GROUP_DEFAULT_FIELDS)
     db = SessionLocal()
-    groups = get_groups(db)
-    db.close()
-    return jsonify([{"id": group.id, "name": group.name, "root_user": group.root_user} for group in groups])
+    try:
+        page = get_groups_page(db, fields, *page_args())
+    finally:
+        db.close()
+    return page_response(page)
 
 
 # API to create a new group
@@ -65,15 +126,16 @@ def create_group_api():
         db.close()  # در هر صورت Session را ببندید
 
 
-# API to get users by group
+# API to get users by group, a page at a time (?limit=, ?cursor=, ?fields=)
 @app.route("/api/groups/<int:group_id>/users", methods=["GET"])
 def get_users_by_group_api(group_id):
+    fields = select_fields(USER_FIELDS, request.args.get("fields"), USER_DEFAULT_FIELDS)
     db = SessionLocal()
-    users = get_users_by_group(db, group_id)
-    db.close()
-    return jsonify(
-        [{"id": user.id, "name": user.name, "parent_user_id": user.parent_user_id, "vnc_port": user.novnc_port} for user
-         in users])
+    try:
+        page = get_users_by_group_page(db, group_id, fields, *page_args())
+    finally:
+        db.close()
+    return page_response(page)
 
 
 # API to create a new user
@@ -83,6 +145,7 @@ def create_user_api():
     db = SessionLocal()
     user = create_user(db, data["name"], data["parent_user_id"], data["group_id"], data["vnc_port"])
     db.close()
+    container_reconciler.request(user.id)
     return jsonify({"id": user.id, "name": user.name, "parent_user_id": user.parent_user_id, "vnc_port": user.novnc_port})
 
 
@@ -93,16 +156,32 @@ def create_child_user_api(parent_user_id):
     db = SessionLocal()
     user = create_user(db, data["name"], parent_user_id, None, data['description'])
     db.close()
+    container_reconciler.request(user.id)
     return jsonify({"id": user.id, "name": user.name, "parent_user_id": user.parent_user_id, "vnc_port": user.novnc_port})
 
 
-# API to get tasks for a user
+# API to get tasks for a user, a page at a time (?limit=, ?cursor=, ?fields=, ?status=)
 @app.route("/api/users/<int:user_id>/tasks", methods=["GET"])
 def get_tasks_for_user_api(user_id):
+    fields = select_fields(TASK_FIELDS, request.args.get("fields"), TASK_DEFAULT_FIELDS)
     db = SessionLocal()
-    tasks = TaskService.get_tasks_by_user(db, user_id)
-    db.close()
-    return jsonify([{"id": task.id, "description": task.description, "user_id": task.user_id} for task in tasks])
+    try:
+        page = TaskService.get_tasks_page(db, user_id, fields, *page_args(), status=request.args.get("status"))
+    finally:
+        db.close()
+    return page_response(page)
+
+
+# API to get the messages of a task in order, a page at a time (?limit=, ?cursor=, ?fields=)
+@app.route("/api/tasks/<int:task_id>/messages", methods=["GET"])
+def get_task_messages_api(task_id):
+    fields = select_fields(MESSAGE_FIELDS, request.args.get("fields"), MESSAGE_DEFAULT_FIELDS)
+    db = SessionLocal()
+    try:
+        page = TaskService.get_messages_page(db, task_id, fields, *page_args())
+    finally:
+        db.close()
+    return page_response(page)
 
 
 # API to add a task
@@ -119,15 +198,19 @@ def add_task_api(user_id):
 def process_tasks_api(user_id):
     db = SessionLocal()
     try:
-        tasks = TaskService.get_tasks_by_user(db, user_id)
-        service = ProcessorService(db, tasks[0])
-        service.process_task()
-        # prompt, output = TaskService.process_tasks(db, user_id)
+        # تسک‌ها در صف اجرا قرار می‌گیرند و درخواست منتظر پایان آن‌ها نمی‌ماند
+        tasks = TaskService.get_pending_tasks_by_user(db, user_id)
+        job = job_registry.create(user_id, [task.id for task in tasks])
+        for task in tasks:
+            task_executor.submit(task.id, user_id, job.listener(task.id))
         return jsonify({
-            "message": "Tasks processed successfully",
-            "prompt": "",
-            "output": ""
-        })
+            "message": "Tasks queued for processing",
+            "job_id": job.id,
+            "task_ids": job.task_ids,
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+            "executor": task_executor.stats()
+        }), 202
     except Exception as e:
         # ثبت کامل خطا در لاگ
         logging.error("Error processing tasks:", exc_info=True)
@@ -136,14 +219,194 @@ def process_tasks_api(user_id):
         db.close()  # در هر صورت Session را ببندید
 
 
+# API to get the status of a processing job
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_api(job_id):
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    since = event_offset()
+    if since is None:
+        return jsonify(INVALID_EVENT_OFFSET), 400
+    data = job.as_dict()
+    if request.args.get("events"):
+        data["events"] = job.events[since:]
+    return jsonify(data)
+
+
+# Server-Sent Events stream of a job's steps; resumes after Last-Event-ID or ?since=
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events_api(job_id):
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    since = event_offset(resume_header=True)
+    if since is None:
+        return jsonify(INVALID_EVENT_OFFSET), 400
+    return Response(
+        stream_with_context(stream_events(job, since)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# API to see the task executor's queue depth, utilization and wait times
+@app.route("/api/stats/executor", methods=["GET"])
+def executor_stats_api():
+    return jsonify(task_executor.stats())
+
+
+# API to see how many vision-model calls the unchanged-screen cache saved
+@app.route("/api/stats/vision_cache", methods=["GET"])
+def vision_cache_stats_api():
+    return jsonify(screen_cache_stats.as_dict())
+
+
+# API to see how many grounding calls were served from the cache
+@app.route("/api/stats/grounding_cache", methods=["GET"])
+def grounding_cache_stats_api():
+    return jsonify(grounding_cache.stats())
+
+
+# API to see token usage per model, including prompt tokens served from the provider's cache
+@app.route("/api/stats/prompt_cache", methods=["GET"])
+def prompt_cache_stats_api():
+    return jsonify(prompt_cache_stats.as_dict())
+
+
+# API to see the model record/replay mode and how many requests were served from recordings
+@app.route("/api/stats/model_replay", methods=["GET"])
+def model_replay_stats_api():
+    return jsonify(model_replay.stats())
+
+
+# API to see how many rows the batched database writer groups into each commit
+@app.route("/api/stats/db_writer", methods=["GET"])
+def db_writer_stats_api():
+    return jsonify(db_writer.stats())
+
+
+# A screenshot or annotated click image referenced by a task message's artifact_digest
+@app.route("/api/artifacts/<digest>", methods=["GET"])
+def get_artifact_api(digest):
+    if not DIGEST_PATTERN.match(digest):
+        return jsonify({"error": "Invalid artifact digest."}), 400
+    try:
+        artifact_store.wait(digest)
+    except Exception:
+        logging.error("Error writing artifact:", exc_info=True)
+    path = artifact_store.path(digest)
+    if not os.path.exists(path):
+        return jsonify({"error": "Artifact not found."}), 404
+    return send_file(os.path.abspath(path), mimetype=f"image/{artifact_store.format.lower()}", max_age=31536000)
+
+
+# API to see how many images the artifact store wrote, deduplicated and evicted
+@app.route("/api/stats/artifacts", methods=["GET"])
+def artifact_stats_api():
+    return jsonify(artifact_store.stats())
+
+
+# Container reconciler counters: passes, containers created and started, fixes in flight
+@app.route("/api/stats/containers", methods=["GET"])
+def container_stats_api():
+    return jsonify(container_reconciler.stats())
+
+
+# Frames recorded for a task, with their step and capture time, to build a scrubber from
+@app.route("/api/tasks/<int:task_id>/recording", methods=["GET"])
+def get_recording_index_api(task_id):
+    path = recording_path(task_id)
+    if not os.path.exists(path):
+        return jsonify({"error": "Recording not found."}), 404
+    frames = RecordingReader(path).index()
+    return jsonify({"task_id": task_id, "frames": [entry.as_dict() for entry in frames]})
+
+
+# Stream a task's recording as multipart images, starting at ?step=, ?message_id= or ?index=
+@app.route("/api/tasks/<int:task_id>/recording/stream", methods=["GET"])
+def stream_recording_api(task_id):
+    path = recording_path(task_id)
+    if not os.path.exists(path):
+        return jsonify({"error": "Recording not found."}), 404
+    reader = RecordingReader(path)
+    try:
+        if "message_id" in request.args:
+            db = SessionLocal()
+            try:
+                message = db.query(TaskMessage).filter(
+                    TaskMessage.id == request.args.get("message_id", type=int), TaskMessage.task_id == task_id
+                ).first()
+            finally:
+                db.close()
+            if not message:
+                return jsonify({"error": "Message not found."}), 404
+            start = reader.seek_time(to_timestamp(message.created_at))
+        elif "step" in request.args:
+            start = reader.seek_step(request.args.get("step", type=int))
+        else:
+            start = request.args.get("index", 0, type=int)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    image_format = "PNG" if request.args.get("format", "").lower() == "png" else "JPEG"
+    return Response(
+        stream_with_context(multipart_frames(reader, start, request.args.get("count", type=int), image_format)),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+    )
+
+
+# Timeline of a task's steps and the spans inside them (model calls, grounding, VNC, commands)
+@app.route("/api/tasks/<int:task_id>/timeline", methods=["GET"])
+def task_timeline_api(task_id):
+    trace = trace_registry.get(task_id)
+    if not trace:
+        return jsonify({"error": "Timeline not found."}), 404
+    return jsonify(trace.as_dict())
+
+
+@metrics.register_collector
+def collect_service_stats():
+    executor = task_executor.stats()
+    return {
+        "orchestrator_executor_running": ("Tasks running on the executor.", executor["running"]),
+        "orchestrator_executor_queue_depth": ("Tasks waiting for a worker.", executor["queue_depth"]),
+        "orchestrator_vnc_pool_connections": ("Open pooled VNC connections.", len(vnc_pool)),
+        "orchestrator_container_fixes_in_flight": ("User containers being created or started.",
+                                                   container_reconciler.stats()["in_flight"]),
+        "orchestrator_db_writer_queued": ("Database writes waiting for the next grouped commit.",
+                                          db_writer.stats()["queued"]),
+        "orchestrator_cache_hits": ("Requests served from a cache.", {
+            (("cache", "vision"),): screen_cache_stats.hits,
+            (("cache", "grounding"),): grounding_cache.hits,
+            (("cache", "model_replay"),): model_replay.hits,
+        }),
+        "orchestrator_cache_misses": ("Requests a cache could not serve.", {
+            (("cache", "vision"),): screen_cache_stats.misses,
+            (("cache", "grounding"),): grounding_cache.misses,
+            (("cache", "model_replay"),): model_replay.misses,
+        }),
+    }
+
+
+# Prometheus scrape endpoint: span latency histograms, error, token and retry counters, service gauges
+@app.route("/metrics", methods=["GET"])
+def metrics_api():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 def main():
     """
     Start the Flask server.
     """
     init_db()
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(func=check_and_create_containers, trigger="interval", minutes=1)
-    scheduler.start()
+    # The debug reloader runs main() in a watcher process and again in the serving process;
+    # only the serving one manages containers, or both would create the same containers
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        scheduler = BackgroundScheduler()
+        # Docker events start and recreate containers as they stop; the periodic pass is a safety net
+        container_reconciler.start()
+        scheduler.add_job(func=check_and_create_containers, trigger="interval", seconds=CONTAINER_RECONCILE_INTERVAL)
+        scheduler.start()
     app.run(debug=True)
 
 
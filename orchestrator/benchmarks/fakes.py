@@ -0,0 +1,169 @@
+"""
+Local stand-ins for a user's desktop, used by the benchmarks: a minimal RFB (VNC) server
+and a Docker client whose containers answer exec calls immediately.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+# 32 bits per pixel, depth 24, little endian, true colour, RGB max 255, shifts 0/8/16 (rgba)
+PIXEL_FORMAT = b"\x20\x18\x00\x01\x00\xff\x00\xff\x00\xff\x00\x08\x10\x00\x00\x00"
+
+
+def synthetic_desktop(width: int, height: int) -> np.ndarray:
+    """
+    An RGBA screen with a gradient wallpaper, a panel and a few windows, so image encoders
+    see something closer to a desktop than a flat colour.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    pixels[..., 0] = (x * 255 // max(width - 1, 1)).astype(np.uint8)
+    pixels[..., 1] = (y * 255 // max(height - 1, 1)).astype(np.uint8)
+    pixels[..., 2] = 120
+    pixels[: height // 30] = (40, 40, 40, 255)
+    rng = np.random.default_rng(0)
+    for _ in range(6):
+        top, left = rng.integers(0, height // 2), rng.integers(0, width // 2)
+        pixels[top:top + height // 3, left:left + width // 3] = (*rng.integers(0, 255, 3), 255)
+        # Text-like noise inside the window
+        block = pixels[top + 20:top + height // 3 - 20, left + 20:left + width // 3 - 20, :3]
+        block[rng.random(block.shape[:2]) < 0.05] = 0
+    pixels[..., 3] = 255
+    return pixels
+
+
+class FakeRFBServer:
+    """
+    RFB 3.8 server without authentication that answers every framebuffer update request
+    with one raw rectangle of its framebuffer and accepts key, pointer and cut text events.
+
+    Runs on its own event loop thread, so clients talk to it over a real local socket.
+    """
+
+    def __init__(self, width: int = 1920, height: int = 1080, host: str = "127.0.0.1"):
+        self.width = width
+        self.height = height
+        self.host = host
+        self.port = None
+        self.connections = 0
+        self.events = 0
+        self.framebuffer = synthetic_desktop(width, height).tobytes()
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._writers = set()
+
+    def start(self):
+        async def serve():
+            self._server = await asyncio.start_server(self._handle, self.host, 0)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+        self._loop.run_until_complete(serve())
+        threading.Thread(target=self._loop.run_forever, name="fake-rfb", daemon=True).start()
+        return self
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            # Let the connection handlers finish before the loop stops
+            handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if handlers:
+                await asyncio.wait(handlers, timeout=1)
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def drop_connections(self):
+        """
+        Close every client socket from the server side, as a restarted desktop would.
+        """
+        async def close():
+            for writer in list(self._writers):
+                writer.close()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        name = b"fake-desktop"
+        try:
+            writer.write(b"RFB 003.008\n")
+            await reader.readline()
+            writer.write(b"\x01\x01")  # one security type: none
+            await reader.readexactly(1)
+            writer.write(b"\x00\x00\x00\x00")  # security result: ok
+            await reader.readexactly(1)  # ClientInit
+            writer.write(self.width.to_bytes(2, "big") + self.height.to_bytes(2, "big") + PIXEL_FORMAT
+                         + len(name).to_bytes(4, "big") + name)
+            while True:
+                message_type = (await reader.readexactly(1))[0]
+                if message_type == 0:  # SetPixelFormat
+                    await reader.readexactly(19)
+                elif message_type == 2:  # SetEncodings
+                    header = await reader.readexactly(3)
+                    await reader.readexactly(4 * int.from_bytes(header[1:], "big"))
+                elif message_type == 3:  # FramebufferUpdateRequest
+                    await reader.readexactly(9)
+                    writer.write(b"\x00\x00\x00\x01" + b"\x00\x00\x00\x00"
+                                 + self.width.to_bytes(2, "big") + self.height.to_bytes(2, "big")
+                                 + b"\x00\x00\x00\x00" + self.framebuffer)
+                    await writer.drain()
+                elif message_type == 4:  # KeyEvent
+                    await reader.readexactly(7)
+                    self.events += 1
+                elif message_type == 5:  # PointerEvent
+                    await reader.readexactly(5)
+                    self.events += 1
+                elif message_type == 6:  # ClientCutText
+                    header = await reader.readexactly(7)
+                    await reader.readexactly(int.from_bytes(header[3:], "big"))
+                    self.events += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+class FakeContainer:
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "running"
+        self.commands = []
+
+    def start(self):
+        self.status = "running"
+
+    def exec_run(self, command, detach=False):
+        self.commands.append(command)
+        return SimpleNamespace(exit_code=0, output=b"" if detach else b"fake output\n")
+
+
+class FakeContainers:
+    def __init__(self):
+        self._containers = {}
+
+    def get(self, name: str):
+        container = self._containers.get(name)
+        if container is None:
+            container = self._containers[name] = FakeContainer(name)
+        return container
+
+    def list(self, all=False, filters=None):
+        return list(self._containers.values())
+
+    def run(self, image=None, name=None, **kwargs):
+        return self.get(name)
+
+
+class FakeDockerClient:
+    """
+    Just enough of ``docker.DockerClient`` for ContainerService.
+    """
+
+    def __init__(self):
+        self.containers = FakeContainers()
@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks of the desktop I/O, encoding, parsing and database hot paths.
+
+    python -m orchestrator.benchmarks.hot_paths --output bench.json
+    python -m orchestrator.benchmarks.hot_paths --output bench-new.json --compare bench.json
+
+Runs against a local stand-in RFB server and a fake Docker client, so no desktop, container
+or model is needed. Results (milliseconds per operation) are written as JSON together with the
+git commit they were measured on.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from orchestrator.benchmarks.fakes import FakeDockerClient, FakeRFBServer, synthetic_desktop
+from orchestrator.models.base import Base, create_db_engine
+from orchestrator.models.task import Task, TaskMessage
+from orchestrator.services import command_service, config_service  # noqa: F401, registers encoding profiles
+from orchestrator.services.command_service import CommandService
+from orchestrator.services.container_service import ContainerService
+from orchestrator.services.db_writer import BatchedWriter
+from orchestrator.services.encoding_profiles import EncodingProfile
+from orchestrator.services.frame import Frame
+from orchestrator.services.grounding_service import extract_bbox_midpoint
+from orchestrator.services.llm_provider import AnthropicBaseProvider, OpenAIBaseProvider
+from orchestrator.services.runtime import runtime
+from orchestrator.services.task_service import extract_json_blocks
+from orchestrator.services.vnc_pool import VNCConnectionPool, vnc_pool
+
+USER_ID = 1
+JPEG_PROFILE = EncodingProfile(format="JPEG")
+
+BBOX_RESPONSES = [
+    "<|box_start|>(120,340),(200,380)<|box_end|>",
+    "The element is at <|box_start|>(512.5,88.25),(640.75,120.0)<|box_end|> on the screen",
+    "(1024, 768)",
+]
+JSON_RESPONSE = (
+    "I will first open the terminal and then run the installer.\n"
+    '[{"name": "click", "parameters": {"query": "Terminal icon"}}, '
+    '{"name": "type_text", "parameters": {"text": "sudo apt install telegram-desktop"}}]\n'
+    'Then: {"name": "send_key", "parameters": {"name": "Return"}}'
+)
+
+
+def measure(func, iterations: int, warmup: int = 2):
+    """
+    Time ``func`` over ``iterations`` calls after ``warmup`` untimed calls.
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    mean = statistics.mean(times)
+    return {
+        "iterations": iterations,
+        "mean_ms": mean,
+        "p50_ms": times[len(times) // 2],
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "min_ms": times[0],
+        "max_ms": times[-1],
+        "ops_per_sec": 1000 / mean if mean else None,
+    }
+
+
+def bench_vnc(server: FakeRFBServer, iterations: int):
+    results = {}
+    pool = VNCConnectionPool(host=server.host, max_size=iterations + 8)
+    users = itertools.count(1000)
+    results["vnc.connect"] = measure(lambda: runtime.run(pool.acquire(next(users), server.port)), iterations)
+    runtime.run(pool.close_all())
+
+    async def click(client):
+        client.mouse.move(10, 10)
+        client.mouse.click()
+
+    results["vnc.action.pooled"] = measure(lambda: pool.run(USER_ID, server.port, click), iterations)
+    runtime.run(pool.close_all())
+
+    actions = [{"type": "click", "x": 10, "y": 10}, {"type": "key", "name": "Return"}] * 3
+    with mock.patch.object(CommandService, "get_vnc_port", staticmethod(lambda user_id: server.port)), \
+            mock.patch.object(vnc_pool, "host", server.host):
+        results["command.click"] = measure(lambda: CommandService.click(10, 10, USER_ID), iterations)
+        results["command.type_short"] = measure(lambda: CommandService.typing("ls -la /tmp", USER_ID), iterations)
+        results["command.type_paste_2k"] = measure(lambda: CommandService.typing("x" * 2000, USER_ID), iterations)
+        results["command.actions_6_single"] = measure(
+            lambda: [CommandService.click(10, 10, USER_ID) if action["type"] == "click"
+                     else CommandService.send_key(action["name"], USER_ID) for action in actions],
+            iterations,
+        )
+        results["command.actions_6_batch"] = measure(
+            lambda: CommandService.run_actions(actions, USER_ID, settle_ms=0), iterations
+        )
+        results["screenshot.capture"] = measure(lambda: CommandService.screenshot(USER_ID), iterations)
+        results["screenshot.capture_to_png"] = measure(lambda: CommandService.screenshot(USER_ID).png, iterations)
+        results["screenshot.capture_to_jpeg"] = measure(
+            lambda: CommandService.screenshot(USER_ID).encode_for(JPEG_PROFILE), iterations
+        )
+        runtime.run(vnc_pool.close_all())
+    return results
+
+
+def bench_encoding(width: int, height: int, iterations: int):
+    pixels = synthetic_desktop(width, height)
+    results = {}
+    # A new frame per call, so the per-frame encoding caches don't hide the cost
+    results["encode.png"] = measure(lambda: Frame(pixels).png, iterations)
+    for provider in (OpenAIBaseProvider("benchmark"), AnthropicBaseProvider("benchmark")):
+        name = provider.__class__.__name__
+        results[f"create_image_block.{name}"] = measure(lambda: provider.wrap_block(Frame(pixels)), iterations)
+    frame = Frame(pixels)
+    provider = OpenAIBaseProvider("benchmark")
+    provider.wrap_block(frame)
+    results["create_image_block.cached_frame"] = measure(lambda: provider.wrap_block(frame), iterations)
+    return results
+
+
+def bench_parsing(iterations: int):
+    return {
+        "parse.extract_bbox_midpoint": measure(
+            lambda: [extract_bbox_midpoint(response) for response in BBOX_RESPONSES], iterations * 20
+        ),
+        "parse.extract_json_blocks": measure(lambda: extract_json_blocks(JSON_RESPONSE), iterations * 20),
+    }
+
+
+def bench_database(iterations: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", echo=False)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        task = Task(description="benchmark")
+        session.add(task)
+        session.commit()
+        content = json.dumps({"role": "assistant", "content": "OBSERVATION: " + "x" * 500})
+
+        def append_and_commit():
+            task.task_messages.append(TaskMessage(content=content))
+            session.commit()
+
+        def append_batch():
+            for _ in range(100):
+                task.task_messages.append(TaskMessage(content=content))
+            session.commit()
+
+        results["db.append_commit_each"] = measure(append_and_commit, iterations)
+        results["db.append_100_one_commit"] = measure(append_batch, max(iterations // 10, 3))
+        results["db.task_messages_decode"] = measure(task.messages, iterations)
+        session.close()
+        engine.dispose()
+    return results
+
+
+def bench_concurrent_writes(iterations: int, writers: int = 16, messages: int = 20):
+    """
+    Message appends from ``writers`` concurrent tasks, ``messages`` each: one commit per message
+    (rollback journal and WAL) against the batched writer. Each timed operation is the whole burst.
+    """
+    results = {}
+    content = json.dumps({"role": "assistant", "content": "OBSERVATION: " + "x" * 500})
+    name = f"{writers}x{messages}"
+    with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(max_workers=writers) as pool:
+        engines = {
+            "rollback_journal": create_engine(f"sqlite:///{os.path.join(directory, 'journal.db')}",
+                                              connect_args={"timeout": 60}, pool_size=writers),
+            "wal": create_db_engine(f"sqlite:///{os.path.join(directory, 'wal.db')}", echo=False),
+        }
+        for mode, engine in engines.items():
+            Base.metadata.create_all(bind=engine)
+            Session = sessionmaker(bind=engine)
+            with Session() as session:
+                tasks = [Task(description=f"benchmark {index}") for index in range(writers)]
+                session.add_all(tasks)
+                session.commit()
+                task_ids = [task.id for task in tasks]
+
+            def commit_each(task_id):
+                with Session() as session:
+                    for _ in range(messages):
+                        session.add(TaskMessage(task_id=task_id, content=content))
+                        session.commit()
+
+            results[f"db.concurrent_{name}_commit_each.{mode}"] = measure(
+                lambda: list(pool.map(commit_each, task_ids)), iterations
+            )
+
+        writer = BatchedWriter(session_factory=sessionmaker(bind=engines["wal"]))
+
+        def batched(task_id):
+            futures = [writer.append_message(task_id, content) for _ in range(messages)]
+            for future in futures:
+                future.result()
+
+        results[f"db.concurrent_{name}_batched_writer.wal"] = measure(
+            lambda: list(pool.map(batched, task_ids)), iterations
+        )
+        for engine in engines.values():
+            engine.dispose()
+    return results
+
+
+def bench_container(iterations: int):
+    service = ContainerService.__new__(ContainerService)
+    service.client = FakeDockerClient()
+    with mock.patch.object(command_service, "_container_service", service):
+        return {
+            "container.run_command": measure(
+                lambda: CommandService.run_command_via_container("echo hello", USER_ID), iterations
+            ),
+            "container.run_background_command": measure(
+                lambda: CommandService.run_background_command_via_container("sleep 1", USER_ID), iterations
+            ),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path: str):
+    with open(previous_path) as f:
+        previous = json.load(f)["results"]
+    print(f"\nCompared with {previous_path}:")
+    for name, result in results.items():
+        before = previous.get(name)
+        if before:
+            change = (result["mean_ms"] - before["mean_ms"]) / before["mean_ms"] * 100 if before["mean_ms"] else 0.0
+            print(f"  {name:40s} {before['mean_ms']:10.3f} -> {result['mean_ms']:10.3f} ms  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--groups", nargs="+",
+                        default=["vnc", "encoding", "parsing", "database", "concurrent_writes", "container"])
+    parser.add_argument("--output", default="benchmarks.json")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    server = FakeRFBServer(args.width, args.height).start()
+    groups = {
+        "vnc": lambda: bench_vnc(server, args.iterations),
+        "encoding": lambda: bench_encoding(args.width, args.height, args.iterations),
+        "parsing": lambda: bench_parsing(args.iterations),
+        "database": lambda: bench_database(args.iterations),
+        "concurrent_writes": lambda: bench_concurrent_writes(args.iterations),
+        "container": lambda: bench_container(args.iterations),
+    }
+    results = {}
+    for name in args.groups:
+        # The services print every request and result; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.update(groups[name]())
+        print(f"{name} done")
+    server.stop()
+
+    for name, result in results.items():
+        print(f"  {name:40s} mean {result['mean_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms")
+    report = {
+        "commit": git_commit(),
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "screen": [args.width, args.height],
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
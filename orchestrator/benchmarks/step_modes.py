@@ -0,0 +1,93 @@
+"""
+Compare the two-model and fused step modes on the same objective.
+
+    python -m orchestrator.benchmarks.step_modes --user-id 1 --task "Open the terminal" --repeat 3
+
+Each run creates a task for the user and processes it on the user's desktop with the configured
+live models, recording steps, per-step and per-request latency and token usage. Results are
+written as JSON.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from orchestrator.models.base import get_db, init_db
+from orchestrator.models.task import Task
+from orchestrator.services.config_service import STEP_MODES
+from orchestrator.services.llm_provider import prompt_cache_stats
+from orchestrator.services.processor_service import ProcessorService
+
+
+def token_totals():
+    totals = {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+    for usage in prompt_cache_stats.as_dict().values():
+        for key in totals:
+            totals[key] += usage[key]
+    return totals
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": statistics.mean(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def run_once(user_id: int, description: str, mode: str):
+    events = []
+
+    def listener(event_type, **data):
+        events.append((event_type, data))
+
+    tokens_before = token_totals()
+    with get_db() as db:
+        task = Task(description=description, user_id=user_id)
+        db.add(task)
+        db.commit()
+        started = time.perf_counter()
+        ProcessorService(db, task, listener, step_mode=mode).process_task()
+        seconds = time.perf_counter() - started
+        task_id = task.id
+    tokens_after = token_totals()
+
+    return {
+        "task_id": task_id,
+        "seconds": seconds,
+        "steps": summarize([data["seconds"] for event_type, data in events if event_type == "step_finished"]),
+        "model_requests": summarize([data["seconds"] for event_type, data in events if event_type == "thought"]),
+        "tokens": {key: tokens_after[key] - tokens_before[key] for key in tokens_after},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True, help="User whose desktop runs the tasks")
+    parser.add_argument("--task", required=True, help="Objective given to the agent")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per mode")
+    parser.add_argument("--modes", nargs="+", default=list(STEP_MODES), choices=STEP_MODES)
+    parser.add_argument("--output", default="step_modes.json")
+    args = parser.parse_args()
+
+    init_db()
+    results = {"task": args.task, "modes": {}}
+    for mode in args.modes:
+        runs = [run_once(args.user_id, args.task, mode) for _ in range(args.repeat)]
+        results["modes"][mode] = {
+            "runs": runs,
+            "seconds": summarize([run["seconds"] for run in runs]),
+            "step_seconds": statistics.mean(run["steps"].get("mean", 0) for run in runs),
+        }
+        print(f"{mode}: {results['modes'][mode]['seconds']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
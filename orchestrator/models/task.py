@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from enum import Enum as PyEnum
@@ -18,6 +18,8 @@ class TaskStatus(PyEnum):
 # مدل Task
 class Task(Base):
     __tablename__ = "tasks"
+    # لیست تسک‌های یک کاربر، با یا بدون فیلتر وضعیت
+    __table_args__ = (Index("ix_tasks_user_id_status", "user_id", "status"),)
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
@@ -39,10 +41,32 @@ class Task(Base):
         return f"<Task(id={self.id}, description={self.description}, status={self.status}, user_id={self.user_id}, parent_task_id={self.parent_task_id})>"
 
     def messages(self):
-        # print(self.task_messages)
-        # for test in self.task_messages:
-        #     print(test.content)
-        return [json.loads(task_message.content) for task_message in self.task_messages]
+        """
+        Decoded task messages, in order.
+
+        task_messages is append-only, so the decoded history is cached on the instance and only
+        rows added since the previous call are JSON-decoded. If the relationship was reloaded
+        with different rows (e.g. after an expiring commit) the cache is rebuilt once.
+        """
+        rows = self.task_messages
+        decoded = self.__dict__.get("_decoded_messages")
+        if decoded is None or not self._decoded_rows_match(rows):
+            decoded = self.__dict__["_decoded_messages"] = []
+            self.__dict__["_decoded_rows"] = []
+        decoded_rows = self.__dict__["_decoded_rows"]
+        for task_message in rows[len(decoded):]:
+            decoded.append(json.loads(task_message.content))
+            decoded_rows.append(task_message)
+        return list(decoded)
+
+    def _decoded_rows_match(self, rows):
+        decoded_rows = self.__dict__.get("_decoded_rows", [])
+        if len(rows) < len(decoded_rows):
+            return False
+        if not decoded_rows:
+            return True
+        last, current = decoded_rows[-1], rows[len(decoded_rows) - 1]
+        return current is last or (current.id is not None and current.id == last.id)
 
 
 def Message(content, role="assistant"):
@@ -51,10 +75,14 @@ def Message(content, role="assistant"):
 # مدل Message
 class TaskMessage(Base):
     __tablename__ = "task_messages"
+    # پیام‌های یک تسک به ترتیب زمان، برای صفحه‌بندی
+    __table_args__ = (Index("ix_task_messages_task_id_created_at", "task_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)  # زمان ایجاد پیام
     task_id = Column(Integer, ForeignKey("tasks.id"))  # کلید خارجی به تسک مربوطه
+    # digest تصویر مربوط به پیام (اسکرین‌شات یا محل کلیک) در artifact_store
+    artifact_digest = Column(String(64), nullable=True)
 
     task = relationship("Task", back_populates="task_messages")
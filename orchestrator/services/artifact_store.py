@@ -0,0 +1,226 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from orchestrator.services.frame import Frame
+
+# Directory screenshots and annotated images are stored in, one file per content digest
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+# WEBP (lossless) or PNG
+ARTIFACT_FORMAT = os.getenv("ARTIFACT_FORMAT", "WEBP").upper()
+# Artifacts not written or reused for this long are removed (seconds, default 7 days)
+ARTIFACT_MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE", str(7 * 24 * 3600)))
+# Beyond this total size the least recently used artifacts are removed
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 ** 3)))
+# Seconds between two retention passes
+ARTIFACT_EVICT_INTERVAL = float(os.getenv("ARTIFACT_EVICT_INTERVAL", "300"))
+ARTIFACT_WRITERS = int(os.getenv("ARTIFACT_WRITERS", "2"))
+
+SAVE_PARAMS = {
+    "WEBP": {"lossless": True, "method": 4},
+    "PNG": {"optimize": True},
+}
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def image_digest(image: Image.Image) -> str:
+    """
+    SHA-256 of a PIL image's pixels; equal to ``Frame.digest`` for the same RGB content.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return hashlib.sha256(image.tobytes()).hexdigest()
+
+
+def derived_digest(digest: str, *params) -> str:
+    """
+    Digest of an image fully determined by another artifact and some parameters, e.g. a
+    screenshot with the click position drawn on it.
+    """
+    return hashlib.sha256(":".join([digest, *map(str, params)]).encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for screenshots and annotated grounding images.
+
+    Each image is stored once under its digest, compressed, so the same screen seen by several
+    steps or tasks takes one file. :meth:`put` returns the digest at once; encoding and writing
+    happen on the store's own worker threads, off the agent loop. Artifacts are removed once
+    older than ``max_age`` and, least recently used first, while the store exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory: str = ARTIFACT_DIR, image_format: str = ARTIFACT_FORMAT,
+                 max_age: float = ARTIFACT_MAX_AGE, max_bytes: int = ARTIFACT_MAX_BYTES,
+                 evict_interval: float = ARTIFACT_EVICT_INTERVAL, writers: int = ARTIFACT_WRITERS):
+        if image_format not in SAVE_PARAMS:
+            raise ValueError(f"Unsupported ARTIFACT_FORMAT {image_format!r}; expected one of {sorted(SAVE_PARAMS)}.")
+        self.directory = directory
+        self.format = image_format
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.suffix = "." + image_format.lower()
+        self._pool = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="artifact-writer")
+        self._lock = threading.Lock()
+        self._pending = {}  # digest -> Future of the write
+        self._last_evicted = time.monotonic()
+        self.writes = 0
+        self.deduplicated = 0
+        self.bytes_written = 0
+        self.evicted = 0
+
+    def path(self, digest: str) -> str:
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid artifact digest {digest!r}.")
+        return os.path.join(self.directory, digest[:2], digest + self.suffix)
+
+    def put(self, image, digest: str = None) -> str:
+        """
+        Store an image unless an identical one is already stored.
+
+        Args:
+            image: A Frame, a PIL image, or a callable returning either; a callable is only
+                called (on a writer thread) if the artifact is not stored yet.
+            digest (str): Content digest; required for callables, computed otherwise.
+
+        Returns:
+            str: The digest the image is stored under.
+        """
+        if digest is None:
+            if isinstance(image, Frame):
+                digest = image.digest
+            elif isinstance(image, Image.Image):
+                digest = image_digest(image)
+            else:
+                raise ValueError("A digest is required to store an image produced by a callable.")
+        with self._lock:
+            if digest in self._pending:
+                self.deduplicated += 1
+                return digest
+            self._pending[digest] = future = self._pool.submit(self._write, digest, image)
+        future.add_done_callback(lambda _: self._written(digest))
+        self._maybe_evict()
+        return digest
+
+    def _written(self, digest: str):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _write(self, digest: str, image):
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Refresh the last use, so screens that keep coming back are evicted last
+            os.utime(path)
+            with self._lock:
+                self.deduplicated += 1
+            return path
+        if callable(image) and not isinstance(image, (Frame, Image.Image)):
+            image = image()
+        params = SAVE_PARAMS[self.format]
+        if isinstance(image, Frame):
+            data = image.encode(self.format, **params)
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.format, **params)
+            data = buffer.getvalue()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.writes += 1
+            self.bytes_written += len(data)
+        return path
+
+    def get(self, digest: str) -> bytes:
+        """
+        The stored (compressed) bytes of an artifact, waiting for a write still in progress.
+
+        Raises:
+            FileNotFoundError: If the artifact was never stored or has been evicted.
+        """
+        self.wait(digest)
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+    def load(self, digest: str) -> Frame:
+        return Frame.from_bytes(self.get(digest))
+
+    def wait(self, digest: str, timeout: float = None):
+        future = self._pending.get(digest)
+        if future is not None:
+            future.result(timeout)
+
+    def flush(self, timeout: float = None):
+        """
+        Block until every write started so far has finished.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result(timeout)
+
+    def _maybe_evict(self):
+        with self._lock:
+            if time.monotonic() - self._last_evicted < self.evict_interval:
+                return
+            self._last_evicted = time.monotonic()
+        self._pool.submit(self.evict)
+
+    def evict(self, now: float = None):
+        """
+        Apply the retention policy: drop artifacts past ``max_age``, then the least recently
+        used ones until the store fits in ``max_bytes``.
+
+        Returns:
+            int: Number of artifacts removed.
+        """
+        now = now if now is not None else time.time()
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self.evicted += removed
+        return removed
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "format": self.format,
+            "writes": self.writes,
+            "deduplicated": self.deduplicated,
+            "bytes_written": self.bytes_written,
+            "evicted": self.evicted,
+            "pending": len(self._pending),
+        }
+
+
+artifact_store = ArtifactStore()
@@ -1,11 +1,145 @@
+import asyncio
+import os
+import re
+import time
 from typing import Dict
-from orchestrator.models.base import SessionLocal
+
+from asyncvnc import key_codes
+from orchestrator.models.base import get_db
 from orchestrator.models.task import Task
 from orchestrator.models.user import User
 from orchestrator.services.container_service import ContainerService
+from orchestrator.services.frame import Frame
+from orchestrator.services.metrics_service import metrics, span
+from orchestrator.services.runtime import runtime
+from orchestrator.services.vnc_pool import CONNECTION_ERRORS, vnc_pool
 from sqlalchemy.orm import Session
-import asyncio, asyncvnc
-from PIL import Image
+
+# Short text is typed as key events, in groups of TYPING_GROUP_SIZE keys with a pause between
+# groups so slow applications don't drop keys
+TYPING_DELAY_MS = int(os.getenv("TYPING_DELAY_MS", "12"))
+TYPING_GROUP_SIZE = int(os.getenv("TYPING_GROUP_SIZE", "50"))
+# Longer text is put on the desktop clipboard and pasted with one key combination
+TYPING_PASTE_THRESHOLD = int(os.getenv("TYPING_PASTE_THRESHOLD", "200"))
+# Shift+Insert pastes in terminals as well as in GUI applications
+TYPING_PASTE_KEYS = os.getenv("TYPING_PASTE_KEYS", "Shift+Insert").split("+")
+# Time for the VNC server to take the clipboard over before the paste keys arrive
+PASTE_SETTLE_MS = 50
+
+# Default pause between the actions of a batch, for the screen to react
+ACTION_SETTLE_MS = int(os.getenv("ACTION_SETTLE_MS", "50"))
+
+vnc_batch_actions = metrics.histogram(
+    "orchestrator_vnc_batch_actions", "Actions run per VNC batch.", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+# Characters typed with a named key
+SPECIAL_KEYS = {"\n": "Return", "\t": "Tab"}
+
+
+def keysym(char: str) -> int:
+    """
+    X keysym of a character; characters without a named keysym use the Unicode keysym range.
+    """
+    if char in SPECIAL_KEYS:
+        return key_codes[SPECIAL_KEYS[char]]
+    return key_codes.get(char, 0x01000000 + ord(char))
+
+
+def key_events(text: str) -> bytes:
+    """
+    RFB KeyEvent messages pressing and releasing each character of ``text`` in turn.
+    """
+    events = bytearray()
+    for char in text:
+        code = keysym(char).to_bytes(4, "big")
+        events += b"\x04\x01\x00\x00" + code + b"\x04\x00\x00\x00" + code
+    return bytes(events)
+
+
+def client_cut_text(text: str) -> bytes:
+    """
+    RFB ClientCutText message setting the server's clipboard to ``text`` (Latin-1 only).
+    """
+    data = text.encode("latin-1")
+    return b"\x06\x00\x00\x00" + len(data).to_bytes(4, "big") + data
+
+
+def text_entry_method(text: str) -> str:
+    """
+    Choose how to enter text: "paste" for long Latin-1 text, "keys" otherwise.
+    """
+    if len(text) < TYPING_PASTE_THRESHOLD:
+        return "keys"
+    try:
+        text.encode("latin-1")
+    except UnicodeEncodeError:
+        # ClientCutText can only carry Latin-1
+        return "keys"
+    return "paste"
+
+
+async def type_keys(client, text: str, group_size: int = TYPING_GROUP_SIZE, delay_ms: int = TYPING_DELAY_MS):
+    for start in range(0, len(text), group_size):
+        if start:
+            await asyncio.sleep(delay_ms / 1000)
+        client.writer.write(key_events(text[start:start + group_size]))
+        await client.drain()
+
+
+async def paste_text(client, text: str):
+    client.writer.write(client_cut_text(text))
+    await client.drain()
+    await asyncio.sleep(PASTE_SETTLE_MS / 1000)
+    client.keyboard.press(*TYPING_PASTE_KEYS)
+
+
+async def move_action(client, action):
+    client.mouse.move(action["x"], action["y"])
+
+
+async def click_action(client, action):
+    if "x" in action:
+        client.mouse.move(action["x"], action["y"])
+    client.mouse.click()
+
+
+async def double_click_action(client, action):
+    await click_action(client, action)
+    client.mouse.click()
+
+
+async def right_click_action(client, action):
+    if "x" in action:
+        client.mouse.move(action["x"], action["y"])
+    client.mouse.right_click()
+
+
+async def key_action(client, action):
+    name = action["name"]
+    # Combinations are written as "Ctrl+C"; a "+" that ends the name is the key itself ("Ctrl++")
+    client.keyboard.press(*re.split(r"\+(?=.)", name))
+
+
+async def type_action(client, action):
+    text = action["text"].replace("\r\n", "\n")
+    method = text_entry_method(text)
+    if method == "paste":
+        await paste_text(client, text)
+    else:
+        await type_keys(client, text)
+    return method
+
+
+# GUI actions runnable in a batch, by "type"
+GUI_ACTIONS = {
+    "move": move_action,
+    "click": click_action,
+    "double_click": double_click_action,
+    "right_click": right_click_action,
+    "key": key_action,
+    "type": type_action,
+}
 
 
 class CommandService:
@@ -106,110 +240,260 @@ class CommandService:
         db.commit()
 
     @staticmethod
-    def typing(text, current_user_id: int):
+    def get_vnc_port(current_user_id: int) -> int:
         """
-        Simulate typing text via VNC (synchronous version).
+        Look up the VNC port of a user's desktop.
 
         Args:
-            db (Session): Database session.
-            command (Dict): Command containing text to type.
+            current_user_id (int): ID of the user.
+
+        Returns:
+            int: The host port mapped to the container's VNC server.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        with get_db() as db:
+            user = db.query(User).filter(User.id == current_user_id).first()
+            if not user:
+                raise ValueError(f"User with ID {current_user_id} not found.")
+            return user.vnc_port
+
+    @staticmethod
+    async def async_run_vnc_action(current_user_id: int, action):
+        """
+        Run an async action against the user's pooled VNC connection.
+
+        Args:
+            current_user_id (int): ID of the user whose desktop is driven.
+            action: Coroutine function receiving the connected ``asyncvnc.Client``.
+
+        Returns:
+            The value returned by ``action``.
+        """
+        with span("vnc.action", action.__name__):
+            port = await runtime.to_thread(CommandService.get_vnc_port, current_user_id)
+            return await vnc_pool.execute(current_user_id, port, action)
+
+    @staticmethod
+    def run_vnc_action(current_user_id: int, action):
+        """
+        Synchronous wrapper around :meth:`async_run_vnc_action`.
+        """
+        return runtime.run(CommandService.async_run_vnc_action(current_user_id, action))
+
+    @staticmethod
+    async def async_run_actions(actions, current_user_id: int, settle_ms: int = ACTION_SETTLE_MS):
+        """
+        Run a sequence of GUI actions over one VNC session, with one port lookup.
+
+        Args:
+            actions (list): Dicts with a "type" from GUI_ACTIONS and its arguments, e.g.
+                {"type": "click", "x": 10, "y": 20}, {"type": "key", "name": "Ctrl+C"},
+                {"type": "type", "text": "ls"}. An action may set its own "settle_ms".
+            current_user_id (int): ID of the user whose desktop is driven.
+            settle_ms (int): Pause before each action after the first.
+
+        Returns:
+            list: One dict per action with "type", "ok", "result", "error" and "seconds".
+                Actions after a failed one are not run and are reported with ok False.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        # The size goes to the task timeline and a histogram; as a span target it would add a series per size
+        vnc_batch_actions.observe(len(actions))
+        with span("vnc.batch", actions=len(actions)):
+            return await CommandService._run_actions(actions, current_user_id, settle_ms)
+
+    @staticmethod
+    async def _run_actions(actions, current_user_id: int, settle_ms: int):
+        port = await runtime.to_thread(CommandService.get_vnc_port, current_user_id)
+        results = []
+        failed = False
+        # No retry on a dead connection here: part of the batch may already have run
+        async with vnc_pool.session(current_user_id, port) as client:
+            for index, action in enumerate(actions):
+                result = {"type": action.get("type"), "ok": False, "result": None, "error": None, "seconds": 0.0}
+                results.append(result)
+                if failed:
+                    result["error"] = "Not run, an earlier action failed."
+                    continue
+                if index:
+                    await asyncio.sleep(action.get("settle_ms", settle_ms) / 1000)
+                started = time.perf_counter()
+                try:
+                    handler = GUI_ACTIONS.get(action.get("type"))
+                    if handler is None:
+                        raise ValueError(f"Unknown action type: {action.get('type')}")
+                    result["result"] = await handler(client, action)
+                    await client.drain()
+                    result["ok"] = True
+                except CONNECTION_ERRORS:
+                    raise
+                except Exception as e:
+                    result["error"] = str(e)
+                    failed = True
+                result["seconds"] = time.perf_counter() - started
+        return results
+
+    @staticmethod
+    def run_actions(actions, current_user_id: int, settle_ms: int = ACTION_SETTLE_MS):
+        """
+        Run a sequence of GUI actions over one VNC session (synchronous version).
+        """
+        return runtime.run(CommandService.async_run_actions(actions, current_user_id, settle_ms))
+
+    @staticmethod
+    async def async_typing(text, current_user_id: int):
+        """
+        Simulate typing text via VNC.
+
+        Text of at least TYPING_PASTE_THRESHOLD characters is sent through the clipboard and
+        pasted; shorter text (or text the clipboard can't carry) is typed in key groups.
+
+        Args:
+            text (str): Text to type.
             current_user_id (int): ID of the current user executing the command.
 
+        Returns:
+            str: The method used, "paste" or "keys".
+
         Raises:
-            ValueError: If required fields are missing.
+            ValueError: If the user does not exist.
+        """
+
+        async def type_text(client):
+            return await type_action(client, {"text": text})
+
+        return await CommandService.async_run_vnc_action(current_user_id, type_text)
+
+    @staticmethod
+    def typing(text, current_user_id: int):
+        """
+        Simulate typing text via VNC (synchronous version).
         """
-        db = SessionLocal()
+        return runtime.run(CommandService.async_typing(text, current_user_id))
 
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+    @staticmethod
+    async def async_click(x, y, current_user_id: int):
 
-        async def async_typing():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                await client.type(text)
+        async def click(client):
+            client.mouse.move(x, y)
+            client.mouse.click()
 
-        asyncio.run(async_typing())
+        await CommandService.async_run_vnc_action(current_user_id, click)
 
     @staticmethod
     def click(x, y , current_user_id: int):
-        db = SessionLocal()
+        runtime.run(CommandService.async_click(x, y, current_user_id))
 
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+    @staticmethod
+    async def async_double_click(x, y, current_user_id: int):
 
-        async def async_click():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                await client.mouse.move(x, y)
-                await client.mouse.click()
+        async def double_click(client):
+            client.mouse.move(x, y)
+            client.mouse.click()
+            client.mouse.click()
 
-        asyncio.run(async_click())
+        await CommandService.async_run_vnc_action(current_user_id, double_click)
 
     @staticmethod
     def double_click(x, y , current_user_id: int):
-        db = SessionLocal()
+        runtime.run(CommandService.async_double_click(x, y, current_user_id))
+
+    @staticmethod
+    async def async_right_click(x, y, current_user_id: int):
 
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+        async def right_click(client):
+            client.mouse.move(x, y)
+            client.mouse.right_click()
 
-        async def async_click():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                await client.mouse.move(x, y)
-                await client.mouse.double_click()
+        await CommandService.async_run_vnc_action(current_user_id, right_click)
 
-        asyncio.run(async_click())
-        
     @staticmethod
     def right_click(x, y , current_user_id: int):
-        db = SessionLocal()
+        runtime.run(CommandService.async_right_click(x, y, current_user_id))
 
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+    @staticmethod
+    async def async_send_key(name, current_user_id: int):
 
-        async def async_click():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                await client.mouse.move(x, y)
-                await client.mouse.right_click()
+        async def send_key(client):
+            await key_action(client, {"name": name})
 
-        asyncio.run(async_click())
+        await CommandService.async_run_vnc_action(current_user_id, send_key)
 
     @staticmethod
     def send_key(name , current_user_id: int):
-        db = SessionLocal()
+        runtime.run(CommandService.async_send_key(name, current_user_id))
 
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+    @staticmethod
+    async def async_screenshot(current_user_id: int):
+        """
+        Take a screenshot via VNC.
 
-        async def async_click():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                await client.keyboard.press(name)
+        Args:
+            current_user_id (int): ID of the current user executing the command.
 
-        asyncio.run(async_click())
+        Returns:
+            Frame: The captured screen, kept in memory.
+        """
+
+        async def screenshot(client):
+            return Frame(await client.screenshot(), current_user_id)
+
+        return await CommandService.async_run_vnc_action(current_user_id, screenshot)
 
     @staticmethod
     def screenshot(current_user_id: int):
         """
         Take a screenshot via VNC (synchronous version).
+        """
+        return runtime.run(CommandService.async_screenshot(current_user_id))
+
+    @staticmethod
+    async def async_run_command_via_container(command: str, current_user_id: int) -> str:
+        """
+        Run a shell command inside the user's container and return its output.
 
         Args:
+            command (str): Shell command to run.
             current_user_id (int): ID of the current user executing the command.
 
         Returns:
-            bytes: The screenshot image data.
+            str: Combined output of the command.
         """
-        db = SessionLocal()
-        user = db.query(User).filter(User.id == current_user_id).first()
-        if not user:
-            raise ValueError(f"User with ID {current_user_id} not found.")
+        return await runtime.to_thread(
+            container_service().exec_command_in_container, current_user_id, command
+        )
+
+    @staticmethod
+    def run_command_via_container(command: str, current_user_id: int) -> str:
+        return runtime.run(CommandService.async_run_command_via_container(command, current_user_id))
 
-        async def async_screenshot():
-            async with asyncvnc.connect('127.0.0.1', user.vnc_port) as client:
-                pixels = await client.screenshot()
-                image = Image.fromarray(pixels)
-                image.save('screenshot.png')
-                return pixels
+    @staticmethod
+    async def async_run_background_command_via_container(command: str, current_user_id: int) -> str:
+        """
+        Start a shell command inside the user's container without waiting for it.
+        """
+        await runtime.to_thread(
+            container_service().exec_command_in_container, current_user_id, command, True
+        )
+        return "The command has been started."
 
-        return asyncio.run(async_screenshot())
+    @staticmethod
+    def run_background_command_via_container(command: str, current_user_id: int) -> str:
+        return runtime.run(CommandService.async_run_background_command_via_container(command, current_user_id))
+
+
+_container_service = None
+
+
+def container_service() -> ContainerService:
+    """
+    Shared ContainerService, so the Docker client and its connection pool are created once.
+    """
+    global _container_service
+    if _container_service is None:
+        _container_service = ContainerService()
+    return _container_service
@@ -1,22 +1,106 @@
-from orchestrator.services.llm_provider import G4FProvider
-from orchestrator.services.osatlas_service import OSAtlasProvider
-from orchestrator.services.providers import *
-
-grounding_model = OSAtlasProvider()
-# grounding_model = providers.ShowUIProvider()
-
-# vision_model = providers.FireworksProvider("llama-3.2")
-# vision_model = providers.OpenAIProvider("gpt-4o")
-# vision_model = providers.AnthropicProvider("claude-3.5-sonnet")
-# vision_model = providers.MoonshotProvider("moonshot-v1-vision")
-# vision_model = providers.MistralProvider("pixtral")
-#vision_model = providers.GroqProvider("llama-3.2")
-vision_model = OpenRouterProvider("qwen-2.5-vl")
-
-# action_model = FireworksProvider("llama-3.3")
-# action_model = providers.OpenAIProvider("gpt-4o")
-# action_model = providers.AnthropicProvider("claude-3.5-sonnet")
-# vision_model = providers.MoonshotProvider("moonshot-v1-vision")
-# action_model = MistralProvider("mistral")
-# action_model = G4FProvider('blackboxai')
-action_model = GroqProvider("llama-3.3")
+import importlib
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from orchestrator.services.encoding_profiles import EncodingProfile, register_profile
+
+load_dotenv()
+
+# Screenshot encoding per provider class (or "ClassName:model"). Coordinates returned by
+# grounding are mapped back to the native desktop resolution automatically.
+register_profile("OpenAIBaseProvider", EncodingProfile(format="JPEG", max_width=1280, max_height=1280, quality=85))
+register_profile("AnthropicBaseProvider", EncodingProfile(format="JPEG", max_width=1568, max_height=1568, quality=85))
+register_profile("OSAtlasProvider", EncodingProfile(format="JPEG", quality=90))
+# register_profile("GroqProvider:llama-3.2-90b-vision-preview", EncodingProfile(format="JPEG", max_width=1120, grayscale=True))
+
+# Provider names usable in the *_MODEL settings, resolved to classes only when first used
+PROVIDERS = {
+    "osatlas": "orchestrator.services.osatlas_service:OSAtlasProvider",
+    "g4f": "orchestrator.services.llm_provider:G4FProvider",
+    "llama": "orchestrator.services.providers:LlamaProvider",
+    "openrouter": "orchestrator.services.providers:OpenRouterProvider",
+    "fireworks": "orchestrator.services.providers:FireworksProvider",
+    "deepseek": "orchestrator.services.providers:DeepSeekProvider",
+    "openai": "orchestrator.services.providers:OpenAIProvider",
+    "gemini": "orchestrator.services.providers:GeminiProvider",
+    "anthropic": "orchestrator.services.providers:AnthropicProvider",
+    "groq": "orchestrator.services.providers:GroqProvider",
+    "mistral": "orchestrator.services.providers:MistralProvider",
+    "moonshot": "orchestrator.services.providers:MoonshotProvider",
+}
+
+# Models per role as "provider" or "provider:model", e.g. VISION_MODEL=anthropic:claude-3.5-sonnet
+MODELS = {
+    "grounding_model": os.getenv("GROUNDING_MODEL", "osatlas"),
+    "vision_model": os.getenv("VISION_MODEL", "openrouter:qwen-2.5-vl"),
+    "action_model": os.getenv("ACTION_MODEL", "groq:llama-3.3"),
+    # Folds old steps into a rolling summary, see context_service
+    "summary_model": os.getenv("SUMMARY_MODEL", os.getenv("ACTION_MODEL", "groq:llama-3.3")),
+    # Used in the fused step mode; must accept images and tools in one request
+    "step_model": os.getenv("STEP_MODEL", os.getenv("VISION_MODEL", "openrouter:qwen-2.5-vl")),
+}
+
+# How the agent decides each step:
+#   two_model: vision_model describes the screen, then action_model picks tool calls (two requests)
+#   fused:     step_model looks at the screen and picks tool calls in a single request
+STEP_MODES = ("two_model", "fused")
+STEP_MODE = os.getenv("STEP_MODE", "two_model")
+if STEP_MODE not in STEP_MODES:
+    raise ValueError(f"Unknown STEP_MODE '{STEP_MODE}'. Available: {', '.join(STEP_MODES)}")
+
+
+class ProviderRegistry:
+    """
+    Builds each configured provider the first time its role is used, then reuses it.
+
+    Importing this module does not import any provider SDK or open any network client.
+    """
+
+    def __init__(self, models: dict, providers: dict = PROVIDERS):
+        self.models = dict(models)
+        self.providers = providers
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def create(self, spec: str):
+        """
+        Instantiate a provider from a "provider:model" spec.
+        """
+        name, _, model = spec.partition(":")
+        if name not in self.providers:
+            raise ValueError(f"Unknown model provider '{name}'. Available: {', '.join(sorted(self.providers))}")
+        module_name, class_name = self.providers[name].split(":")
+        provider_class = getattr(importlib.import_module(module_name), class_name)
+        return provider_class(model) if model else provider_class()
+
+    def get(self, role: str):
+        if role not in self.models:
+            raise KeyError(f"No model configured for role '{role}'.")
+        instance = self._instances.get(role)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(role)
+                if instance is None:
+                    instance = self.create(self.models[role])
+                    self._instances[role] = instance
+        return instance
+
+    def set(self, role: str, spec: str):
+        """
+        Switch a role to another provider; the new one is built on next use.
+        """
+        with self._lock:
+            self.models[role] = spec
+            self._instances.pop(role, None)
+
+
+registry = ProviderRegistry(MODELS)
+
+
+def __getattr__(name):
+    # Keep `config_service.vision_model` etc. working, built lazily on first access
+    if name in MODELS:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
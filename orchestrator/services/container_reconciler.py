@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from orchestrator.models.base import SessionLocal
+from orchestrator.models.user import User
+from orchestrator.services.container_service import ContainerService, user_id_from_name
+from orchestrator.services.metrics_service import metrics, retries, span
+
+# Containers created or started at the same time
+CONTAINER_RECONCILE_WORKERS = int(os.getenv("CONTAINER_RECONCILE_WORKERS", "8"))
+# Full pass over all users, as a safety net behind the Docker events (seconds)
+CONTAINER_RECONCILE_INTERVAL = int(os.getenv("CONTAINER_RECONCILE_INTERVAL", "300"))
+# Wait before subscribing to Docker events again after the stream broke (seconds)
+CONTAINER_EVENTS_RETRY = float(os.getenv("CONTAINER_EVENTS_RETRY", "5"))
+# A container restarted this many times within the window is fixed again only once the window allows it
+CONTAINER_RESTART_LIMIT = int(os.getenv("CONTAINER_RESTART_LIMIT", "3"))
+CONTAINER_RESTART_WINDOW = float(os.getenv("CONTAINER_RESTART_WINDOW", "300"))
+
+# Container events after which a user's container may need to be started or created again
+WATCHED_EVENTS = ["die", "destroy"]
+# The container's state is looked up when it is fixed
+UNKNOWN = object()
+
+container_actions = metrics.counter(
+    "orchestrator_container_actions_total", "User containers created or started by the reconciler."
+)
+
+
+class ContainerReconciler:
+    """
+    Keeps one running container per user.
+
+    A pass lists all user containers in one Docker call, compares them with the users table and
+    creates or starts the missing ones on a bounded worker pool. Between passes, the Docker events
+    stream reports containers that stopped or were removed, and only those users are fixed, within
+    seconds. Each user has at most one fix in flight; an event arriving during it runs it again.
+    A container that keeps dying is restarted at most ``restart_limit`` times per ``restart_window``
+    seconds from events; further fixes wait for the window.
+    """
+
+    def __init__(self, service: ContainerService = None, session_factory=SessionLocal,
+                 workers: int = CONTAINER_RECONCILE_WORKERS, restart_limit: int = CONTAINER_RESTART_LIMIT,
+                 restart_window: float = CONTAINER_RESTART_WINDOW):
+        self._service = service
+        self.session_factory = session_factory
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="container-reconcile")
+        self._lock = threading.Lock()
+        self._in_flight = {}  # user_id -> Future
+        self._rerun = set()
+        self.restart_limit = restart_limit
+        self.restart_window = restart_window
+        self._restarts = {}  # user_id -> times of the last restart_limit restarts
+        self._delayed = {}  # user_id -> Timer of a postponed fix
+        self._running = False
+        self._stopped = threading.Event()
+        self._events = None
+        self._events_thread = None
+        self.passes = 0
+        self.created = 0
+        self.started = 0
+        self.failed = 0
+        self.orphans = 0
+        self.last_pass_seconds = None
+
+    @property
+    def service(self) -> ContainerService:
+        if self._service is None:
+            self._service = ContainerService()
+        return self._service
+
+    def reconcile(self) -> dict:
+        """
+        One full pass; returns once every container it found missing or stopped has been handled.
+
+        Returns:
+            dict: Users checked, containers created and started, and containers without a user.
+        """
+        started_at = time.perf_counter()
+        with span("container.reconcile"):
+            statuses = self.service.list_user_containers()
+            session = self.session_factory()
+            try:
+                user_ids = [user_id for (user_id,) in session.query(User.id)]
+            finally:
+                session.close()
+            created, started = self.created, self.started
+            wait([
+                self._ensure(user_id, statuses.get(user_id))
+                for user_id in user_ids
+                if statuses.get(user_id) != "running"
+            ])
+        # Containers of deleted users are reported, not removed
+        self.orphans = len(set(statuses) - set(user_ids))
+        self.passes += 1
+        self.last_pass_seconds = time.perf_counter() - started_at
+        return {
+            "users": len(user_ids),
+            "created": self.created - created,
+            "started": self.started - started,
+            "orphans": self.orphans,
+        }
+
+    def request(self, user_id: int):
+        """
+        Make sure a user's container exists and runs, e.g. right after the user was created.
+        Ignored until :meth:`start` is called.
+        """
+        if self._running:
+            self._ensure(user_id, UNKNOWN)
+
+    def _ensure(self, user_id: int, status, backoff: bool = False):
+        with self._lock:
+            future = self._in_flight.get(user_id)
+            if future is not None:
+                self._rerun.add(user_id)
+                return future
+            if backoff and user_id in self._delayed:
+                return None
+            delay = self._restart_delay(user_id) if backoff else 0
+            if delay > 0:
+                print(f"Container of user {user_id} restarted {self.restart_limit} times in "
+                      f"{self.restart_window:.0f}s, fixing it again in {delay:.0f}s.")
+                timer = threading.Timer(delay, self._run_delayed, (user_id,))
+                timer.daemon = True
+                self._delayed[user_id] = timer
+                timer.start()
+                return None
+            future = self._executor.submit(self._fix, user_id, status)
+            self._in_flight[user_id] = future
+        future.add_done_callback(lambda _: self._done(user_id))
+        return future
+
+    def _done(self, user_id: int):
+        with self._lock:
+            self._in_flight.pop(user_id, None)
+            rerun = user_id in self._rerun
+            self._rerun.discard(user_id)
+        if rerun:
+            self._ensure(user_id, UNKNOWN, backoff=True)
+
+    def _restart_delay(self, user_id: int) -> float:
+        """
+        Seconds until ``user_id`` may be restarted again; 0 while it is under the limit.
+        """
+        restarts = self._restarts.get(user_id)
+        if restarts is None or len(restarts) < self.restart_limit:
+            return 0
+        return max(0.0, restarts[0] + self.restart_window - time.monotonic())
+
+    def _run_delayed(self, user_id: int):
+        with self._lock:
+            self._delayed.pop(user_id, None)
+        self._ensure(user_id, UNKNOWN)
+
+    def _restarted(self, user_id: int):
+        with self._lock:
+            restarts = self._restarts.setdefault(user_id, deque(maxlen=self.restart_limit))
+            restarts.append(time.monotonic())
+
+    def _fix(self, user_id: int, status):
+        try:
+            if status is UNKNOWN:
+                status = self.service.container_status(user_id)
+            if status == "running":
+                return
+            if status is not None:
+                self.service.start_container(user_id)
+                self._restarted(user_id)
+                self._count("started")
+                return
+            session = self.session_factory()
+            try:
+                user = session.get(User, user_id)
+                if user is None:
+                    return
+                print(f"Container for user '{user.name}' does not exist. Creating one...")
+                if self.service.create_container(user, session) is None:
+                    raise RuntimeError(f"Failed to create container for user '{user.name}'.")
+            finally:
+                session.close()
+            self._restarted(user_id)
+            self._count("created")
+        except Exception as e:
+            self._count("failed")
+            print(f"Reconciling the container of user {user_id} failed: {e}")
+
+    def _count(self, action: str):
+        with self._lock:
+            setattr(self, action, getattr(self, action) + 1)
+        container_actions.inc(action=action)
+
+    def handle_event(self, event: dict):
+        """
+        React to one Docker container event.
+        """
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        user_id = user_id_from_name(attributes.get("name", ""))
+        if user_id is not None and event.get("Action") in WATCHED_EVENTS:
+            self._ensure(user_id, UNKNOWN, backoff=True)
+
+    def start(self):
+        """
+        Subscribe to Docker events on a background thread; each (re)subscription is followed
+        by a full pass, so nothing that happened while unsubscribed is missed.
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._stopped.clear()
+        self._events_thread = threading.Thread(target=self._watch_events, name="container-events", daemon=True)
+        self._events_thread.start()
+
+    def _watch_events(self):
+        while not self._stopped.is_set():
+            try:
+                self._events = self.service.client.events(
+                    decode=True, filters={"type": "container", "event": WATCHED_EVENTS}
+                )
+                self.reconcile()
+                for event in self._events:
+                    self.handle_event(event)
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print(f"Docker events stream failed: {e}")
+            if not self._stopped.wait(CONTAINER_EVENTS_RETRY):
+                retries.inc(operation="docker.events")
+
+    def stop(self):
+        self._running = False
+        self._stopped.set()
+        with self._lock:
+            delayed, self._delayed = list(self._delayed.values()), {}
+        for timer in delayed:
+            timer.cancel()
+        if self._events is not None:
+            self._events.close()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+            delayed = len(self._delayed)
+        return {
+            "passes": self.passes,
+            "created": self.created,
+            "started": self.started,
+            "failed": self.failed,
+            "orphans": self.orphans,
+            "in_flight": in_flight,
+            "delayed": delayed,
+            "watching_events": self._events_thread is not None and self._events_thread.is_alive(),
+            "last_pass_seconds": self.last_pass_seconds,
+        }
+
+
+container_reconciler = ContainerReconciler()
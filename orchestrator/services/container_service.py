@@ -1,18 +1,38 @@
-import docker
 import os
 import socket
 
 from orchestrator.models.base import SessionLocal, get_db
+from orchestrator.services.metrics_service import span
+
+CONTAINER_PREFIX = "orchestrator_container_"
+# Label holding the owner's user id, set on the containers this service creates
+USER_LABEL = "orchestrator.user_id"
+
+
+def container_name(user_id: int) -> str:
+    return f"{CONTAINER_PREFIX}{user_id}"
+
+
+def user_id_from_name(name: str):
+    """
+    User id of a container name such as ``/orchestrator_container_12``, or None for other containers.
+    """
+    suffix = name.lstrip("/")[len(CONTAINER_PREFIX):]
+    if name.lstrip("/").startswith(CONTAINER_PREFIX) and suffix.isdigit():
+        return int(suffix)
+    return None
 
 
 class ContainerService:
     def __init__(self):
+        import docker
+
         self.client = docker.from_env()
 
     
     def find_container_by_user(self, user):
         try:
-            container = self.client.containers.get(f"orchestrator_container_{user.id}")
+            container = self.client.containers.get(container_name(user.id))
             if container.status != "running":
                 container.start()
             return container
@@ -27,22 +47,24 @@ class ContainerService:
                 os.path.dirname(os.path.abspath(__file__)), "data", str(user.id)
             )
             os.makedirs(user_data_dir, exist_ok=True)
-            container = self.client.containers.run(
-                image="karam_orchestrator:latest",
-                command="sleep infinity",
-                detach=True,
-                name=f"orchestrator_container_{user.id}",
-                ports={
-                    "80/tcp": novnc_port,
-                    "5900/tcp": vnc_port
-                },
-                volumes={
-                    user_data_dir: {
-                        "bind": "/root/Desktop/orchestrator/data",
-                        "mode": "rw",
-                    }
-                },
-            )
+            with span("container.create"):
+                container = self.client.containers.run(
+                    image="karam_orchestrator:latest",
+                    command="sleep infinity",
+                    detach=True,
+                    name=container_name(user.id),
+                    labels={USER_LABEL: str(user.id)},
+                    ports={
+                        "80/tcp": novnc_port,
+                        "5900/tcp": vnc_port
+                    },
+                    volumes={
+                        user_data_dir: {
+                            "bind": "/root/Desktop/orchestrator/data",
+                            "mode": "rw",
+                        }
+                    },
+                )
             user.vnc_port = vnc_port
             
             user.novnc_port = novnc_port
@@ -53,26 +75,61 @@ class ContainerService:
             print(f"Failed to create container for user '{user.name}': {e}")
             return None
 
+    def list_user_containers(self) -> dict:
+        """
+        Status of every user container (e.g. "running", "exited") by user id, from one list call.
+
+        The listing is sparse, so Docker is not asked to inspect each container separately.
+        Containers are matched by name, which also covers those created before they were labeled.
+        """
+        with span("container.list"):
+            containers = self.client.containers.list(all=True, sparse=True, filters={"name": CONTAINER_PREFIX})
+        statuses = {}
+        for container in containers:
+            for name in container.attrs.get("Names") or []:
+                user_id = user_id_from_name(name)
+                if user_id is not None:
+                    statuses[user_id] = container.attrs.get("State")
+        return statuses
+
+    def container_status(self, user_id: int):
+        """
+        Status of the user's container, or None if it does not exist.
+        """
+        from docker.errors import NotFound
+
+        try:
+            return self.client.containers.get(container_name(user_id)).status
+        except NotFound:
+            return None
+
+    def start_container(self, user_id: int):
+        with span("container.start"):
+            self.client.containers.get(container_name(user_id)).start()
+
     def find_free_port(self):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.bind(("", 0))
             s.listen(1)
             return s.getsockname()[1]
 
-    def exec_command_in_container(self, user_id: int, command: str) -> str:
+    def exec_command_in_container(self, user_id: int, command: str, detach: bool = False) -> str:
         """
         Execute a command in the Docker container associated with the user.
 
         Args:
             user_id (int): The ID of the user.
             command (str): The command to execute in the container.
+            detach (bool): Start the command in the background and return immediately.
 
         Returns:
             str: The output of the command, or an error message if the container is not found.
         """
-        container = self.client.containers.get(f"orchestrator_container_{user_id}")
-        
-        exec_result = container.exec_run(command)
+        with span("container.exec", "background" if detach else "sync"):
+            container = self.client.containers.get(container_name(user_id))
+            exec_result = container.exec_run(["sh", "-c", command], detach=detach)
         print(exec_result)
-        
+        if detach:
+            return ""
+
         return exec_result.output.decode("utf-8")
@@ -0,0 +1,141 @@
+import os
+from dataclasses import dataclass
+
+from orchestrator.services.frame import Frame
+from orchestrator.services.runtime import runtime
+
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "12000"))
+# Most recent non-system messages always sent verbatim (a step is 2-4 messages)
+CONTEXT_RECENT_MESSAGES = int(os.getenv("CONTEXT_RECENT_MESSAGES", "12"))
+# Longer messages (e.g. command output) are cut down to this size, keeping head and tail
+CONTEXT_MESSAGE_MAX_TOKENS = int(os.getenv("CONTEXT_MESSAGE_MAX_TOKENS", "2000"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "800"))
+
+# Rough cost of one screenshot; providers bill images by resolution, this is a safe middle
+IMAGE_TOKENS = 1000
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You summarize the history of an AI agent operating an Ubuntu desktop. "
+    "Merge the previous summary and the new steps into one compact summary of what was seen, "
+    "what was done, what worked and what failed. Keep file names, commands and error messages. "
+    "Answer with the summary only."
+)
+
+
+def estimate_tokens(message) -> int:
+    """
+    Cheap token estimate of a chat message (about 4 characters per token, fixed cost per image).
+    """
+    content = message.get("content")
+    blocks = content if isinstance(content, list) else [content]
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for block in blocks:
+        if isinstance(block, (Frame, bytes)):
+            tokens += IMAGE_TOKENS
+        elif block:
+            tokens += len(str(block)) // CHARS_PER_TOKEN
+    return tokens
+
+
+def truncate_message(message, max_tokens: int):
+    """
+    Shorten a text message to about ``max_tokens``, keeping its beginning and end.
+    """
+    content = message.get("content")
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if not isinstance(content, str) or len(content) <= max_chars:
+        return message
+    half = max_chars // 2
+    return {**message, "content": f"{content[:half]}\n[... {len(content) - max_chars} characters omitted ...]\n{content[-half:]}"}
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    max_tokens: int = CONTEXT_MAX_TOKENS
+    recent_messages: int = CONTEXT_RECENT_MESSAGES
+    message_max_tokens: int = CONTEXT_MESSAGE_MAX_TOKENS
+    summary_max_tokens: int = CONTEXT_SUMMARY_MAX_TOKENS
+
+
+async def summarize_with_model(previous_summary, messages, max_tokens: int):
+    """
+    Default summarizer: asks the configured summary model to fold new messages into the summary.
+    """
+    # Imported here to keep the registry lazy
+    from orchestrator.services import config_service
+
+    history = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\nNEW STEPS:\n{history}"
+    summary = await config_service.summary_model.acall([
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": prompt},
+    ])
+    if isinstance(summary, tuple):
+        summary = summary[0]
+    return truncate_message({"content": summary or ""}, max_tokens)["content"]
+
+
+class ConversationContext:
+    """
+    Builds a bounded prompt from a task's full message history.
+
+    System messages (the OBJECTIVE) are always kept. The last ``recent_messages`` messages are
+    sent verbatim. Older THOUGHT/OBSERVATION messages are folded into a rolling summary by the
+    summary model on the runtime loop; until a summary is ready the not-yet-summarized messages
+    are kept as long as they fit. Oldest messages are dropped first when over ``max_tokens``.
+    """
+
+    def __init__(self, policy: ContextPolicy = None, summarizer=summarize_with_model):
+        self.policy = policy or ContextPolicy()
+        self.summarizer = summarizer
+        self.summary = None
+        self.summarized_upto = 0
+        self._pending = None
+        self._pending_upto = 0
+
+    def _collect_summary(self):
+        if self._pending is None or not self._pending.done():
+            return
+        try:
+            self.summary = self._pending.result()
+            self.summarized_upto = self._pending_upto
+        except Exception as e:
+            print(f"Context summarization failed, keeping the previous summary: {e}")
+        self._pending = None
+
+    def _schedule_summary(self, older):
+        if self._pending is not None or len(older) <= self.summarized_upto:
+            return
+        self._pending_upto = len(older)
+        self._pending = runtime.submit(
+            self.summarizer(self.summary, older[self.summarized_upto:], self.policy.summary_max_tokens)
+        )
+
+    def build(self, messages):
+        """
+        Return the messages to send for this step, within the token budget.
+        """
+        self._collect_summary()
+
+        pinned = [message for message in messages if message.get("role") == "system"]
+        rest = [truncate_message(message, self.policy.message_max_tokens)
+                for message in messages if message.get("role") != "system"]
+        split = max(0, len(rest) - self.policy.recent_messages)
+        older, recent = rest[:split], rest[split:]
+
+        self._schedule_summary(older)
+        unsummarized = older[self.summarized_upto:]
+        summary = [{"role": "user", "content": f"SUMMARY OF EARLIER STEPS: {self.summary}"}] if self.summary else []
+
+        budget = self.policy.max_tokens - sum(estimate_tokens(message) for message in pinned + summary)
+        kept = unsummarized + recent
+        sizes = [estimate_tokens(message) for message in kept]
+        total = sum(sizes)
+        start = 0
+        # Always keep the latest message, even if it alone is over budget
+        while total > budget and start < len(kept) - 1:
+            total -= sizes[start]
+            start += 1
+        return pinned + summary + kept[start:]
@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from orchestrator.models.base import SessionLocal
+from orchestrator.models.task import Task, TaskMessage
+
+# Most writes coalesced into one commit
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+# How long the first write of a batch waits for others to join it (milliseconds)
+DB_WRITE_INTERVAL_MS = int(os.getenv("DB_WRITE_INTERVAL_MS", "10"))
+
+
+class BatchedWriter:
+    """
+    One writer thread that groups message inserts and status updates of all running tasks
+    into shared commits.
+
+    With many tasks running, each committing its own rows would queue on the database's write
+    lock (SQLite allows one writer at a time), paying a full commit per message. Here writes
+    are queued, and whatever arrives within the batch interval is inserted in bulk and
+    committed once. Every write returns a future that resolves when its commit is done. If a
+    grouped commit fails, its writes are retried one by one, so only the failing ones raise.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = DB_WRITE_BATCH_SIZE,
+                 interval_ms: int = DB_WRITE_INTERVAL_MS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+
+    def _submit(self, kind: str, payload) -> Future:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((kind, payload, future))
+        return future
+
+    def append_message(self, task_id: int, content: str, created_at: datetime = None,
+                       artifact_digest: str = None) -> Future:
+        """
+        Queue a TaskMessage row for insertion.
+        """
+        return self._submit("message", {
+            "task_id": task_id,
+            "content": content,
+            "created_at": created_at or datetime.utcnow(),
+            "artifact_digest": artifact_digest,
+        })
+
+    def set_task_status(self, task_id: int, status) -> Future:
+        """
+        Queue a task status update; of several updates in one batch the last one is written.
+        """
+        return self._submit("status", (task_id, status))
+
+    def flush(self, timeout: float = None):
+        """
+        Block until every write queued before this call has been committed.
+        """
+        self._submit("flush", None).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        writes = [index for index, (kind, _, _) in enumerate(batch) if kind != "flush"]
+        errors = {}
+        try:
+            self._commit([batch[index] for index in writes])
+        except Exception as e:
+            # Rows of other tasks share the batch; retry each on its own so only the bad ones fail
+            print(f"Batched database write of {len(writes)} rows failed, retrying them one by one: {e}")
+            for index in writes:
+                try:
+                    self._commit([batch[index]])
+                except Exception as error:
+                    errors[index] = error
+            self.failed += len(errors)
+
+        for index, (_, _, future) in enumerate(batch):
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+    def _commit(self, writes):
+        if not writes:
+            return
+        messages = [payload for kind, payload, _ in writes if kind == "message"]
+        statuses = {}  # task_id -> status
+        for kind, payload, _ in writes:
+            if kind == "status":
+                statuses[payload[0]] = payload[1]
+
+        session = self.session_factory()
+        try:
+            if messages:
+                session.execute(insert(TaskMessage), messages)
+            for task_id, status in statuses.items():
+                session.execute(update(Task).where(Task.id == task_id).values(status=status))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        self.batches += 1
+        self.writes += len(messages) + len(statuses)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "rows_per_commit": self.writes / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+db_writer = BatchedWriter()
@@ -0,0 +1,116 @@
+import base64
+import io
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    How a screenshot is encoded before being sent to a model.
+
+    Frames larger than ``max_width``/``max_height`` are downscaled keeping their aspect ratio.
+    ``quality`` applies to JPEG and WebP only.
+    """
+
+    format: str = "PNG"
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+    quality: int = 85
+    grayscale: bool = False
+
+    def target_size(self, width: int, height: int) -> Tuple[int, int]:
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = min(scale, self.max_width / width)
+        if self.max_height and height > self.max_height:
+            scale = min(scale, self.max_height / height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def save_params(self):
+        if self.format.upper() in ("JPEG", "WEBP"):
+            return {"quality": self.quality}
+        return {}
+
+
+@dataclass
+class EncodedImage:
+    """
+    An encoded screenshot together with the scale needed to map its coordinates back to the desktop.
+    """
+
+    data: bytes
+    format: str
+    size: Tuple[int, int]
+    native_size: Tuple[int, int]
+    _base64: Optional[str] = field(default=None, repr=False)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EncodedImage":
+        """
+        Wrap already-encoded image bytes, detecting their format with Pillow.
+        """
+        image_format = "PNG"  # Default to PNG if detection fails
+        size = (0, 0)
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                image_format = img.format
+                size = img.size
+        except Exception as e:
+            print(f"Error detecting image type: {e}")
+        return cls(data, image_format, size, size)
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode("utf-8")
+        return self._base64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{self.base64}"
+
+    @property
+    def suffix(self) -> str:
+        return ".jpg" if self.format.upper() == "JPEG" else f".{self.format.lower()}"
+
+    def to_native(self, x, y):
+        """
+        Map a point in this image's pixel space back to native desktop coordinates.
+        """
+        width, height = self.size
+        native_width, native_height = self.native_size
+        if not width or not height:
+            return x, y
+        return round(x * native_width / width), round(y * native_height / height)
+
+
+DEFAULT_PROFILE = EncodingProfile()
+
+# Profiles by provider class name, or "ClassName:model" for a single model
+encoding_profiles = {}
+
+
+def register_profile(key: str, profile: EncodingProfile):
+    encoding_profiles[key] = profile
+
+
+def profile_for(provider) -> EncodingProfile:
+    """
+    Resolve the encoding profile of a provider instance.
+
+    The model-specific key wins over the class key, and a provider class falls back to the
+    profiles of its base classes (e.g. every ``OpenAIBaseProvider``).
+    """
+    model = getattr(provider, "model", None)
+    for cls in type(provider).__mro__:
+        profile = encoding_profiles.get(f"{cls.__name__}:{model}") or encoding_profiles.get(cls.__name__)
+        if profile:
+            return profile
+    return DEFAULT_PROFILE
@@ -0,0 +1,201 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+import numpy as np
+from PIL import Image
+
+from orchestrator.services.encoding_profiles import DEFAULT_PROFILE, EncodedImage, EncodingProfile
+
+# Side of the square pixel blocks averaged into one thumbnail value
+THUMBNAIL_BLOCK = 8
+
+
+class Frame:
+    """
+    A single capture of a user's desktop, kept in memory and shared by every consumer of a step.
+
+    The pixel array comes straight from the VNC framebuffer. The PIL image and every encoded
+    form (PNG for the vision model, a file for upload-only clients, ...) are produced lazily,
+    at most once per format, and cached on the frame.
+    """
+
+    def __init__(self, pixels: np.ndarray, user_id: int = None, captured_at: float = None):
+        # Drop the alpha channel, VNC frames are always opaque
+        if pixels.ndim == 3 and pixels.shape[2] == 4:
+            pixels = pixels[:, :, :3]
+        self.pixels = np.ascontiguousarray(pixels)
+        self.user_id = user_id
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        self._image = None
+        self._thumbnail = None
+        self._digest = None
+        self._encoded = {}
+        self._profiles = {}
+        self._paths = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_bytes(cls, image_data: bytes, user_id: int = None) -> "Frame":
+        """
+        Build a frame from an encoded image, e.g. one loaded from disk.
+        """
+        with Image.open(io.BytesIO(image_data)) as image:
+            return cls(np.asarray(image.convert("RGB")), user_id)
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def image(self) -> Image.Image:
+        """
+        The frame as a PIL image. Callers that draw on it must work on a copy.
+        """
+        if self._image is None:
+            with self._lock:
+                if self._image is None:
+                    self._image = Image.fromarray(self.pixels, "RGB")
+        return self._image
+
+    def encode(self, format: str = "PNG", **params) -> bytes:
+        """
+        Encode the frame, reusing the cached result for the same format and parameters.
+
+        Args:
+            format (str): Pillow image format name, e.g. "PNG" or "JPEG".
+            **params: Extra arguments passed to ``Image.save``.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        key = (format.upper(), tuple(sorted(params.items())))
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            with self._lock:
+                encoded = self._encoded.get(key)
+                if encoded is None:
+                    buffer = io.BytesIO()
+                    self.image.save(buffer, format=format, **params)
+                    encoded = buffer.getvalue()
+                    self._encoded[key] = encoded
+        return encoded
+
+    @property
+    def png(self) -> bytes:
+        return self.encode("PNG")
+
+    def encode_for(self, profile: EncodingProfile = DEFAULT_PROFILE) -> EncodedImage:
+        """
+        Encode the frame according to a provider's profile, cached per profile.
+
+        Returns:
+            EncodedImage: The encoded bytes plus the sizes needed to map coordinates back.
+        """
+        encoded = self._profiles.get(profile)
+        if encoded is None:
+            with self._lock:
+                encoded = self._profiles.get(profile)
+                if encoded is None:
+                    size = profile.target_size(self.width, self.height)
+                    if size == self.size and not profile.grayscale:
+                        data = self.encode(profile.format, **profile.save_params())
+                    else:
+                        image = self.image if size == self.size else self.image.resize(size, Image.BILINEAR)
+                        if profile.grayscale:
+                            image = image.convert("L")
+                        buffer = io.BytesIO()
+                        image.save(buffer, format=profile.format, **profile.save_params())
+                        data = buffer.getvalue()
+                    encoded = EncodedImage(data, profile.format.upper(), size, self.size)
+                    self._profiles[profile] = encoded
+        return encoded
+
+    @property
+    def digest(self) -> str:
+        """
+        SHA-256 of the raw pixels, identifying the exact screen content.
+        """
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.pixels.tobytes()).hexdigest()
+        return self._digest
+
+    @property
+    def thumbnail(self) -> np.ndarray:
+        """
+        Grayscale block-mean downsample of the frame (one value per THUMBNAIL_BLOCK square).
+
+        Averaging keeps every pixel's contribution, so even a few typed characters move the
+        affected blocks, while the array is small enough to compare in microseconds.
+        """
+        if self._thumbnail is None:
+            block = THUMBNAIL_BLOCK
+            height, width = self.height // block * block, self.width // block * block
+            gray = self.pixels[:height, :width].mean(axis=2, dtype=np.float32)
+            blocks = gray.reshape(height // block, block, width // block, block)
+            self._thumbnail = blocks.mean(axis=(1, 3)).astype(np.uint8)
+        return self._thumbnail
+
+    def changed_ratio(self, other: "Frame", pixel_threshold: int) -> float:
+        """
+        Fraction of thumbnail blocks whose brightness differs from ``other`` by more than ``pixel_threshold``.
+        """
+        if self.size != other.size:
+            return 1.0
+        return thumbnail_changed_ratio(self.thumbnail, other.thumbnail, pixel_threshold)
+
+    def to_file(self, profile: EncodingProfile = DEFAULT_PROFILE) -> str:
+        """
+        Write the encoded frame to a private temporary file, for clients that only accept paths.
+
+        The file is written once per frame and profile and removed when the frame is garbage collected.
+
+        Returns:
+            str: Path of the image file.
+        """
+        path = self._paths.get(profile)
+        if path is None:
+            encoded = self.encode_for(profile)
+            with self._lock:
+                path = self._paths.get(profile)
+                if path is None:
+                    fd, path = tempfile.mkstemp(prefix=f"frame_{self.user_id}_", suffix=encoded.suffix)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(encoded.data)
+                    weakref.finalize(self, _remove_file, path)
+                    self._paths[profile] = path
+        return path
+
+    def __repr__(self):
+        return f"<Frame(user_id={self.user_id}, size={self.width}x{self.height}, captured_at={self.captured_at})>"
+
+
+def thumbnail_changed_ratio(a: np.ndarray, b: np.ndarray, pixel_threshold: int) -> float:
+    """
+    Fraction of blocks whose brightness differs by more than ``pixel_threshold`` between two thumbnails.
+    """
+    if a.shape != b.shape:
+        return 1.0
+    if not a.size:
+        return 0.0
+    diff = np.abs(a.astype(np.int16) - b.astype(np.int16))
+    return float(np.count_nonzero(diff > pixel_threshold)) / diff.size
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,143 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+
+from orchestrator.services.frame import Frame
+
+GROUNDING_CACHE_MAX_ENTRIES = int(os.getenv("GROUNDING_CACHE_MAX_ENTRIES", "2048"))
+GROUNDING_CACHE_TTL = float(os.getenv("GROUNDING_CACHE_TTL", "86400"))
+# Optional JSON file the cache is loaded from and saved to; empty keeps it in memory only
+GROUNDING_CACHE_PATH = os.getenv("GROUNDING_CACHE_PATH", "")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a grounding query: lower case, single spaces, no surrounding quotes or punctuation.
+    """
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" \"'`.,;:!?")
+
+
+def model_key(model) -> str:
+    """
+    Name of the grounding provider and its model, e.g. "OSAtlasProvider" or "OpenRouterProvider:qwen-2.5-vl".
+    """
+    name = getattr(model, "model", None)
+    return f"{type(model).__name__}:{name}" if name else type(model).__name__
+
+
+@dataclass
+class GroundingEntry:
+    position: Tuple[int, int]
+    created_at: float
+
+
+class GroundingCache:
+    """
+    LRU/TTL cache of grounding results keyed by the grounding model, the normalized query and the
+    frame's pixel digest; switching GROUNDING_MODEL starts from an empty cache instead of reusing
+    another model's coordinates.
+
+    Only a screen with exactly the same pixels reuses a position: after a dialog opens or a
+    button moves by a few pixels a cached click would land in the wrong place, which is worse
+    than grounding again.
+    """
+
+    def __init__(self, max_entries: int = GROUNDING_CACHE_MAX_ENTRIES, ttl: float = GROUNDING_CACHE_TTL,
+                 path: str = GROUNDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    def _is_fresh(self, entry: GroundingEntry) -> bool:
+        return time.time() - entry.created_at <= self.ttl
+
+    def lookup(self, query: str, frame: Frame, model):
+        """
+        Return the position ``model`` found for ``query`` on this screen, or None.
+        """
+        key = (model_key(model), normalize_query(query), frame.digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._is_fresh(entry):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.position
+
+    def store(self, query: str, frame: Frame, model, position):
+        key = (model_key(model), normalize_query(query), frame.digest)
+        with self._lock:
+            self._entries[key] = GroundingEntry(tuple(position), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = [
+                    ((item["model"], item["query"], item["digest"]), GroundingEntry(tuple(item["position"]), item["created_at"]))
+                    for item in json.load(f)
+                ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Grounding cache not loaded from {self.path}: {e}")
+            return
+        with self._lock:
+            for key, entry in entries:
+                if self._is_fresh(entry):
+                    self._entries[key] = entry
+
+    def save(self):
+        """
+        Write fresh entries to ``path`` atomically.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            entries = [
+                {"model": model, "query": query, "digest": digest, "position": list(entry.position),
+                 "created_at": entry.created_at}
+                for (model, query, digest), entry in self._entries.items()
+                if self._is_fresh(entry)
+            ]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+grounding_cache = GroundingCache()
@@ -1,6 +1,18 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from models.group import Group
 from models.user import User
+from orchestrator.services.pagination import Field, paginate
+
+GROUP_FIELDS = {
+    "id": Field(Group.id),
+    "name": Field(Group.name),
+    "root_user": Field(Group.root_user),
+    "users": Field(
+        getter=lambda group: [{"id": user.id, "name": user.name} for user in group.users],
+        options=[selectinload(Group.users).load_only(User.id, User.name, User.group_id)],
+    ),
+}
+GROUP_DEFAULT_FIELDS = ["id", "name", "root_user"]
 
 
 def create_group(db: Session, name: str, root_user: str, description: str):
@@ -25,3 +37,10 @@ def get_group(db: Session, group_id: int):
 
 def get_groups(db: Session):
     return db.query(Group).all()
+
+
+def get_groups_page(db: Session, fields, cursor=None, limit=None):
+    """
+    One page of groups in creation order, with only the requested fields.
+    """
+    return paginate(db.query(Group), [Group.id], GROUP_FIELDS, fields, cursor, limit)
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import threading
+import weakref
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+_sync_client = None
+_sync_lock = threading.Lock()
+# An httpx.AsyncClient is bound to the loop it first ran on, so there is one pool per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _client_options():
+    import httpx
+
+    return {
+        "timeout": httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        "follow_redirects": True,
+    }
+
+
+def shared_http_client():
+    """
+    Keep-alive HTTP connection pool shared by every synchronous provider client.
+    """
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                import httpx
+
+                _sync_client = httpx.Client(**_client_options())
+    return _sync_client
+
+
+def shared_async_http_client():
+    """
+    Keep-alive HTTP connection pool shared by every async provider client on the running loop.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_options())
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Finished jobs kept in memory for status queries and late stream readers
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "500"))
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class Job:
+    """
+    A batch of tasks submitted by one process_tasks request, with the ordered stream of
+    events (steps, thoughts, tool calls, observations, timings) their processing produced.
+    """
+
+    def __init__(self, user_id: int, task_ids):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.task_ids = list(task_ids)
+        self.task_status = {task_id: JobStatus.QUEUED for task_id in self.task_ids}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._condition = threading.Condition()
+        if not self.task_ids:
+            self.finished_at = self.created_at
+
+    @property
+    def status(self) -> str:
+        statuses = set(self.task_status.values())
+        if not statuses or statuses <= {JobStatus.FINISHED, JobStatus.FAILED}:
+            return JobStatus.FAILED if JobStatus.FAILED in statuses else JobStatus.FINISHED
+        if statuses == {JobStatus.QUEUED}:
+            return JobStatus.QUEUED
+        return JobStatus.RUNNING
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def emit(self, event_type: str, task_id: int = None, **data):
+        """
+        Append an event and wake up every stream waiting on this job.
+        """
+        with self._condition:
+            if event_type == "task_started":
+                self.task_status[task_id] = JobStatus.RUNNING
+            elif event_type == "task_finished":
+                self.task_status[task_id] = JobStatus.FINISHED
+            elif event_type == "task_failed":
+                self.task_status[task_id] = JobStatus.FAILED
+            self.events.append({
+                "seq": len(self.events),
+                "type": event_type,
+                "task_id": task_id,
+                "time": time.time(),
+                "data": data,
+            })
+            if self.finished_at is None and self.status in (JobStatus.FINISHED, JobStatus.FAILED):
+                self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def listener(self, task_id: int):
+        """
+        Callback bound to one task, passed to the executor and ProcessorService.
+        """
+        return lambda event_type, **data: self.emit(event_type, task_id, **data)
+
+    def wait_events(self, since: int, timeout: float):
+        """
+        Return events with ``seq >= since``, waiting up to ``timeout`` seconds for new ones.
+        """
+        with self._condition:
+            if len(self.events) <= since and not self.done:
+                self._condition.wait(timeout)
+            return self.events[since:]
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "tasks": [{"id": task_id, "status": status} for task_id, status in self.task_status.items()],
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+        }
+
+
+class JobRegistry:
+    def __init__(self, retention: int = JOB_RETENTION):
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, task_ids) -> Job:
+        job = Job(user_id, task_ids)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.retention)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+
+job_registry = JobRegistry()
+
+
+def stream_events(job: Job, since: int = 0, heartbeat: float = 15.0):
+    """
+    Server-Sent Events generator for a job, ending once the job is done and fully sent.
+    """
+    while True:
+        events = job.wait_events(since, heartbeat)
+        if not events:
+            if job.done:
+                break
+            # Comment line, keeps proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        since = events[-1]["seq"] + 1
+    yield f"event: end\ndata: {json.dumps(job.as_dict())}\n\n"
@@ -1,12 +1,51 @@
-from openai import OpenAI
-from anthropic import Anthropic
-
-from PIL import Image
-import io
+import asyncio
 import json
+import os
 import re
-import base64
-import g4f
+import threading
+import weakref
+
+from orchestrator.services.encoding_profiles import EncodedImage, profile_for
+from orchestrator.services.frame import Frame
+from orchestrator.services.http_pool import LLM_TIMEOUT, shared_async_http_client, shared_http_client
+from orchestrator.services.metrics_service import llm_tokens, span
+from orchestrator.services.replay_service import recorded
+
+
+# Send provider cache hints (Anthropic cache_control) for the stable request prefix
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "1") != "0"
+
+
+class PromptCacheStats:
+    """
+    Process-wide token usage per "Provider:model", including prompt tokens served from the
+    provider's prompt cache.
+    """
+
+    def __init__(self):
+        self.usage = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, input_tokens: int, cached_tokens: int, cache_write_tokens: int, output_tokens: int):
+        with self._lock:
+            usage = self.usage.setdefault(key, {
+                "calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0,
+            })
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["cache_write_tokens"] += cache_write_tokens
+            usage["output_tokens"] += output_tokens
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                key: {**usage, "cached_ratio": usage["cached_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0}
+                for key, usage in self.usage.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
 
 
 def Message(content, role="assistant"):
@@ -37,11 +76,28 @@ class LLMProvider:
     # Mapping of model aliases
     aliases = {}
 
-    # Initialize the API client
+    # The API client is created on first use, so constructing a provider is cheap
     def __init__(self, model):
         self.model = self.aliases.get(model, model)
         print(f"Using {self.__class__.__name__} with {self.model}")
-        self.client = self.create_client()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.create_client()
+        return self._client
+
+    # Async API client for the running event loop, sharing that loop's HTTP connection pool
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self.create_async_client()
+            self._async_clients[loop] = client
+        return client
 
     # Convert our function schema to the provider's required format
     def create_function_schema(self, definitions):
@@ -70,9 +126,11 @@ class LLMProvider:
 
     # Wrap a content block in a text or an image object
     def wrap_block(self, block):
-        if isinstance(block, bytes):
-            # Pass raw bytes so that imghdr can detect the image type properly.
-            return self.create_image_block(block)
+        if isinstance(block, Frame):
+            # Screenshots are encoded once per provider profile and shared between calls
+            return self.create_image_block(block.encode_for(profile_for(self)))
+        elif isinstance(block, bytes):
+            return self.create_image_block(EncodedImage.from_bytes(block))
         else:
             return Text(block)
 
@@ -85,28 +143,79 @@ class LLMProvider:
         else:
             return message
 
-    # Create a chat completion using the API client
-    def completion(self, messages, **kwargs):
+    # Adjust the message list before it is sent, e.g. for providers with role restrictions
+    def prepare_messages(self, messages):
+        return messages
+
+    # Put system messages (prompt, OBJECTIVE) first, so consecutive requests of a task share
+    # the longest possible prefix for the provider's prompt cache
+    def order_messages(self, messages):
+        system = [message for message in messages if message.get("role") == "system"]
+        return system + [message for message in messages if message.get("role") != "system"]
+
+    # Build the keyword arguments of a chat completion request
+    def completion_request(self, messages, **kwargs):
         # Skip the tools parameter if it's None
         filtered_kwargs = {k: v for k, v in kwargs.items() if v is not None}
         # Wrap content blocks in image or text objects if necessary
-        new_messages = [self.transform_message(message) for message in messages]
-        # Call the inference provider
-        completion = self.client.create(
-            messages=new_messages, model=self.model, **filtered_kwargs
-        )
-        # Check for errors in the response
+        new_messages = [self.transform_message(message) for message in self.order_messages(messages)]
+        return {"messages": new_messages, "model": self.model, **filtered_kwargs}
+
+    # Check for errors in the response
+    def check_completion(self, completion):
         if hasattr(completion, "error"):
             raise Exception("Error calling model: {}".format(completion.error))
+        self.record_usage(completion)
         return completion
 
+    # Token counts of a response as (input, cached, cache_write, output), None if not reported
+    def usage_tokens(self, completion):
+        return None
+
+    def record_usage(self, completion):
+        tokens = self.usage_tokens(completion)
+        if tokens is None:
+            return
+        input_tokens, cached_tokens, cache_write_tokens, output_tokens = tokens
+        print(f"{self.__class__.__name__} usage: {input_tokens} input ({cached_tokens} cached, "
+              f"{cache_write_tokens} written to cache), {output_tokens} output")
+        prompt_cache_stats.record(self.metrics_target, *tokens)
+        for kind, count in zip(("input", "cached", "cache_write", "output"), tokens):
+            llm_tokens.inc(count, model=self.metrics_target, kind=kind)
+
+    # Label of this provider and model in metrics and traces
+    @property
+    def metrics_target(self):
+        return f"{self.__class__.__name__}:{self.model}"
 
+    # Create a chat completion using the API client
+    def completion(self, messages, **kwargs):
+        with span("llm.request", self.metrics_target):
+            completion = self.client.create(**self.completion_request(messages, **kwargs))
+            return self.check_completion(completion)
+
+    # Create a chat completion using the async API client
+    async def acompletion(self, messages, **kwargs):
+        with span("llm.request", self.metrics_target):
+            completion = await self.async_client.create(**self.completion_request(messages, **kwargs))
+            return self.check_completion(completion)
 
 
 class OpenAIBaseProvider(LLMProvider):
 
     def create_client(self):
-        return OpenAI(base_url=self.base_url, api_key=self.api_key).chat.completions
+        from openai import OpenAI
+
+        return OpenAI(
+            base_url=self.base_url, api_key=self.api_key, http_client=shared_http_client(), timeout=LLM_TIMEOUT
+        ).chat.completions
+
+    def create_async_client(self):
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            base_url=self.base_url, api_key=self.api_key, http_client=shared_async_http_client(), timeout=LLM_TIMEOUT
+        ).chat.completions
 
     def create_function_def(self, name, details, properties, required):
         return {
@@ -122,26 +231,38 @@ class OpenAIBaseProvider(LLMProvider):
             },
         }
 
-    def create_image_block(self, image_data: bytes):
-        # Use Pillow to detect the image type
-        image_type = "png"  # Default to PNG if detection fails
-        try:
-            with Image.open(io.BytesIO(image_data)) as img:
-                image_type = img.format.lower()
-        except Exception as e:
-            print(f"Error detecting image type: {e}")
-
-        # Base64-encode the raw image bytes.
-        encoded = base64.b64encode(image_data).decode("utf-8")
+    def create_image_block(self, image: EncodedImage):
         return {
             "type": "image_url",
-            "image_url": {"url": f"data:image/{image_type};base64,{encoded}"},
+            "image_url": {"url": image.data_url},
         }
 
+    # OpenAI-compatible APIs cache long prompt prefixes automatically, there is nothing to mark
+    def usage_tokens(self, completion):
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if cached is None:
+            # DeepSeek reports its context cache hits separately
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return usage.prompt_tokens or 0, cached or 0, 0, usage.completion_tokens or 0
+
+    @recorded
     def call(self, messages, functions=None):
         # If functions are provided, only return actions
         tools = self.create_function_schema(functions) if functions else None
-        completion = self.completion(messages, tools=tools)
+        completion = self.completion(self.prepare_messages(messages), tools=tools)
+        return self.parse_completion(completion, functions)
+
+    @recorded
+    async def acall(self, messages, functions=None):
+        tools = self.create_function_schema(functions) if functions else None
+        completion = await self.acompletion(self.prepare_messages(messages), tools=tools)
+        return self.parse_completion(completion, functions)
+
+    def parse_completion(self, completion, functions=None):
         message = completion.choices[0].message
         print(completion)
         print(message)
@@ -180,7 +301,16 @@ class OpenAIBaseProvider(LLMProvider):
 class AnthropicBaseProvider(LLMProvider):
 
     def create_client(self):
-        return Anthropic(api_key=self.api_key).messages
+        from anthropic import Anthropic
+
+        return Anthropic(api_key=self.api_key, http_client=shared_http_client(), timeout=LLM_TIMEOUT).messages
+
+    def create_async_client(self):
+        from anthropic import AsyncAnthropic
+
+        return AsyncAnthropic(
+            api_key=self.api_key, http_client=shared_async_http_client(), timeout=LLM_TIMEOUT
+        ).messages
 
     def create_function_def(self, name, details, properties, required):
         return {
@@ -193,17 +323,17 @@ class AnthropicBaseProvider(LLMProvider):
             },
         }
 
-    def create_image_block(self, base64_image):
+    def create_image_block(self, image: EncodedImage):
         return {
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
-                "data": base64_image,
+                "media_type": image.media_type,
+                "data": image.base64,
             },
         }
 
-    def call(self, messages, functions=None):
+    def request_kwargs(self, messages, functions=None):
         tools = self.create_function_schema(functions) if functions else None
 
         # Move all messages with the system role to a system parameter
@@ -211,11 +341,38 @@ class AnthropicBaseProvider(LLMProvider):
             msg.get("content") for msg in messages if msg.get("role") == "system"
         )
         messages = [msg for msg in messages if msg.get("role") != "system"]
-
+        if PROMPT_CACHING:
+            # Tools and system come before the messages, so a breakpoint on each caches the
+            # prompt, OBJECTIVE and tool schema that every step of a task repeats
+            if tools:
+                tools[-1] = {**tools[-1], "cache_control": {"type": "ephemeral"}}
+            if system:
+                system = [{**Text(system), "cache_control": {"type": "ephemeral"}}]
+        return messages, {"system": system, "tools": tools, "max_tokens": 4096}
+
+    @recorded
+    def call(self, messages, functions=None):
+        messages, kwargs = self.request_kwargs(messages, functions)
         # Call the Anthropic API
-        completion = self.completion(
-            messages, system=system, tools=tools, max_tokens=4096
-        )
+        completion = self.completion(messages, **kwargs)
+        return self.parse_completion(completion, functions)
+
+    @recorded
+    async def acall(self, messages, functions=None):
+        messages, kwargs = self.request_kwargs(messages, functions)
+        completion = await self.acompletion(messages, **kwargs)
+        return self.parse_completion(completion, functions)
+
+    def usage_tokens(self, completion):
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        written = getattr(usage, "cache_creation_input_tokens", None) or 0
+        # input_tokens only counts the uncached part of the prompt
+        return usage.input_tokens + cached + written, cached, written, usage.output_tokens
+
+    def parse_completion(self, completion, functions=None):
         text = "".join(getattr(block, "text", "") for block in completion.content)
 
         # Return response text and tool calls separately
@@ -239,21 +396,25 @@ class MistralBaseProvider(OpenAIBaseProvider):
             details["description"] = details["description"].get("description", "")
         return super().create_function_def(name, details, properties, required)
 
-    def call(self, messages, functions=None):
+    def prepare_messages(self, messages):
+        messages = list(messages)
         if messages and messages[-1].get("role") == "assistant":
             prefix = messages.pop()["content"]
             if messages and messages[-1].get("role") == "user":
-                messages[-1]["content"] = (
-                        prefix + "\n" + messages[-1].get("content", "")
-                )
+                messages[-1] = {
+                    **messages[-1],
+                    "content": prefix + "\n" + messages[-1].get("content", ""),
+                }
             else:
                 messages.append({"role": "user", "content": prefix})
-        return super().call(messages, functions)
+        return messages
 
 class G4FProvider(LLMProvider):
 
     def create_client(self):
         # استفاده از g4f به عنوان کلاینت
+        import g4f
+
         return g4f.ChatCompletion
 
     def create_function_def(self, name, details, properties, required):
@@ -270,6 +431,7 @@ class G4FProvider(LLMProvider):
             },
         }
 
+    @recorded
     def call(self, messages, functions=None):
         """
         ارسال درخواست به مدل و پردازش پاسخ.
@@ -283,6 +445,36 @@ class G4FProvider(LLMProvider):
                 - content (str): متن پاسخ مدل.
                 - tool_calls (list): لیستی از فراخوانی‌های تابع (هر تابع یک دیکشنری با کلیدهای 'name' و 'arguments').
         """
+        messages = self.prepare_tool_messages(messages, functions)
+
+        # ایجاد completion با استفاده از g4f
+        try:
+            print(messages)
+            with span("llm.request", self.metrics_target):
+                completion = self.client.create(
+                    model=self.model,  # یا هر مدل دیگری که پشتیبانی می‌شود
+                    messages=messages,
+                )
+        except Exception as e:
+            print(f"Error during completion: {e}")
+            return "", []  # برگرداندن مقادیر پیش‌فرض در صورت خطا
+
+        return self.parse_response(completion, functions)
+
+    @recorded
+    async def acall(self, messages, functions=None):
+        messages = self.prepare_tool_messages(messages, functions)
+        try:
+            with span("llm.request", self.metrics_target):
+                completion = await self.client.create_async(model=self.model, messages=messages)
+        except Exception as e:
+            print(f"Error during completion: {e}")
+            return "", []
+
+        return self.parse_response(completion, functions)
+
+    def prepare_tool_messages(self, messages, functions=None):
+        messages = list(messages)
         # print(messages)
         # اگر توابع ارائه شده‌اند، آن‌ها را به مدل بفهمانید
         if functions:
@@ -344,17 +536,9 @@ class G4FProvider(LLMProvider):
             # اضافه کردن توابع به پیام‌ها
             messages.append({"role": "user", "content": "Please generate tool calls based on the following functions: " + json.dumps(functions_list)})
 
-        # ایجاد completion با استفاده از g4f
-        try:
-            print(messages)
-            completion = self.create_client().create(
-                model=self.model,  # یا هر مدل دیگری که پشتیبانی می‌شود
-                messages=messages,
-            )
-        except Exception as e:
-            print(f"Error during completion: {e}")
-            return "", []  # برگرداندن مقادیر پیش‌فرض در صورت خطا
+        return messages
 
+    def parse_response(self, completion, functions=None):
         # پردازش پاسخ
         response = completion
         # print(response)
@@ -0,0 +1,248 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Task timelines kept in memory for the timeline API
+TRACE_RETENTION = int(os.getenv("TRACE_RETENTION", "200"))
+# Spans kept per task; the oldest are dropped first
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "5000"))
+
+# Seconds; from a pooled VNC key press up to a slow multimodal request
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_key(labels: dict):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format.
+
+    Besides counters and histograms, collectors can be registered that report gauges from
+    existing stats (executor queue, caches) at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, metric_class, name, help, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, help, **options)
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def register_collector(self, collector):
+        """
+        Register ``collector()`` returning {gauge name: (help, {label tuple: value} or value)}.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, (help, values) in gauges.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                if not isinstance(values, dict):
+                    values = {(): values}
+                for labels, value in values.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+span_seconds = metrics.histogram("orchestrator_span_seconds", "Duration of traced operations.")
+span_calls = metrics.counter("orchestrator_span_calls_total", "Traced operations started.")
+span_errors = metrics.counter("orchestrator_span_errors_total", "Traced operations that raised.")
+llm_tokens = metrics.counter("orchestrator_llm_tokens_total", "Model tokens by kind (input, cached, cache_write, output).")
+retries = metrics.counter("orchestrator_retries_total", "Operations retried after a failure.")
+
+
+class Trace:
+    """
+    Timeline of one task's spans, grouped by step.
+    """
+
+    def __init__(self, task_id: int):
+        self.task_id = task_id
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, step, started: float, seconds: float, error, labels: dict):
+        span = {
+            "name": name,
+            "step": step,
+            "start": started - self._origin,
+            "seconds": seconds,
+            "error": error,
+        }
+        if labels:
+            span["labels"] = labels
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > TRACE_MAX_SPANS:
+                del self.spans[0]
+
+    def as_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        steps = OrderedDict()
+        for span in spans:
+            steps.setdefault(span["step"], []).append(span)
+        return {
+            "task_id": self.task_id,
+            "started_at": self.started_at,
+            "steps": [
+                {"step": step, "seconds": sum(span["seconds"] for span in step_spans if span["name"] == "step"),
+                 "spans": step_spans}
+                for step, step_spans in steps.items()
+            ],
+        }
+
+
+class TraceRegistry:
+    def __init__(self, retention: int = TRACE_RETENTION):
+        self.retention = retention
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, task_id: int) -> Trace:
+        trace = Trace(task_id)
+        with self._lock:
+            self._traces[task_id] = trace
+            self._traces.move_to_end(task_id)
+            while len(self._traces) > self.retention:
+                self._traces.popitem(last=False)
+        return trace
+
+    def get(self, task_id: int):
+        return self._traces.get(task_id)
+
+
+trace_registry = TraceRegistry()
+
+# The trace and step of the task being processed; copied into runtime coroutines and threads
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_step = contextvars.ContextVar("current_step", default=None)
+
+
+def record_span(name: str, started: float, seconds: float, target: str = "", error=None, **labels):
+    """
+    Record a finished operation: latency histogram and counters under ``span``/``target``,
+    plus an entry in the current task's timeline if a task is being traced.
+    """
+    span_calls.inc(span=name, target=target)
+    if error is not None:
+        span_errors.inc(span=name, target=target)
+    span_seconds.observe(seconds, span=name, target=target)
+    trace = current_trace.get()
+    if trace is not None:
+        if target:
+            labels = {**labels, "target": target}
+        trace.add(name, current_step.get(), started, seconds, error, labels)
+
+
+@contextmanager
+def span(name: str, target: str = "", **labels):
+    """
+    Time a block and record it with :func:`record_span`; exceptions are counted and re-raised.
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        record_span(name, started, time.perf_counter() - started, target, error, **labels)
@@ -1,8 +1,11 @@
-from gradio_client import Client, handle_file
-
 import os
 
+from orchestrator.services.encoding_profiles import profile_for
+from orchestrator.services.frame import Frame
 from orchestrator.services.grounding_service import extract_bbox_midpoint
+from orchestrator.services.metrics_service import span
+from orchestrator.services.replay_service import recorded
+from orchestrator.services.runtime import runtime
 
 
 OSATLAS_HUGGINGFACE_SOURCE = "maxiw/OS-ATLAS"
@@ -18,18 +21,44 @@ class OSAtlasProvider:
     """
 
     def __init__(self):
-        self.client = Client(OSATLAS_HUGGINGFACE_SOURCE, hf_token=HF_TOKEN)
+        self._client = None
+
+    @property
+    def client(self):
+        # gradio_client is slow to import and connects to the Space on construction
+        if self._client is None:
+            from gradio_client import Client
+
+            self._client = Client(OSATLAS_HUGGINGFACE_SOURCE, hf_token=HF_TOKEN)
+        return self._client
 
+    @recorded
     def call(self, prompt, image_data):
-        result = self.client.predict(
-            image=handle_file(image_data),
-            text_input=prompt + "\nReturn the response in the form of a bbox",
-            model_id=OSATLAS_HUGGINGFACE_MODEL,
-            api_name=OSATLAS_HUGGINGFACE_API,
-        )
+        from gradio_client import handle_file
+
+        encoded = None
+        # The Gradio client uploads from a path, so in-memory frames are written once
+        if isinstance(image_data, Frame):
+            encoded = image_data.encode_for(profile_for(self))
+            image_data = image_data.to_file(profile_for(self))
+        with span("grounding.request", "OSAtlasProvider"):
+            result = self.client.predict(
+                image=handle_file(image_data),
+                text_input=prompt + "\nReturn the response in the form of a bbox",
+                model_id=OSATLAS_HUGGINGFACE_MODEL,
+                api_name=OSATLAS_HUGGINGFACE_API,
+            )
         position = extract_bbox_midpoint(result[1])
+        if position and encoded:
+            # Grounding ran on the downscaled upload, click on the native desktop
+            position = encoded.to_native(*position)
         print(position)
         image_url = result[2]
         print(f"bbox {image_url}", "gray")
         return position
 
+    async def acall(self, prompt, image_data):
+        # gradio_client is synchronous, so the request runs on the runtime's I/O threads (and
+        # goes through the record/replay layer of call)
+        return await runtime.to_thread(self.call, prompt, image_data)
+
@@ -0,0 +1,120 @@
+import base64
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.orm import load_only
+
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "100"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "1000"))
+
+
+class InvalidPageRequest(ValueError):
+    """
+    A malformed cursor, limit or field list in a list request.
+    """
+
+
+@dataclass
+class Field:
+    """
+    A field a list endpoint can return.
+
+    ``column`` is loaded when the field is requested; ``getter`` computes the value from the row
+    (the column's value by default); ``options`` are loader options (e.g. ``selectinload``) the
+    field needs, so related rows are fetched for the whole page in one query.
+    """
+
+    column: Any = None
+    getter: Optional[Callable] = None
+    options: List[Any] = field(default_factory=list)
+
+    def value(self, row, name):
+        return self.getter(row) if self.getter else getattr(row, name)
+
+
+@dataclass
+class Page:
+    items: List[dict]
+    next_cursor: Optional[str]
+
+
+def select_fields(fields: dict, requested: Optional[str], default: List[str]) -> List[str]:
+    """
+    Names of the fields to return for ``?fields=a,b``, or ``default`` when none are requested.
+
+    Raises:
+        InvalidPageRequest: If an unknown field is requested.
+    """
+    if not requested:
+        return list(default)
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(fields)}.")
+    return names
+
+
+def page_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return API_PAGE_SIZE
+    if limit < 1:
+        raise InvalidPageRequest("limit must be at least 1.")
+    return min(limit, API_MAX_PAGE_SIZE)
+
+
+def encode_cursor(values) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, key_columns) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(key_columns, values)
+        ]
+    except ValueError:
+        raise InvalidPageRequest("Invalid cursor.")
+
+
+def paginate(query, key_columns, fields: dict, names: List[str], cursor: Optional[str] = None,
+             limit: Optional[int] = None) -> Page:
+    """
+    One page of ``query`` ordered by ``key_columns``, continuing after ``cursor``.
+
+    Keyset pagination: the cursor holds the key of the last row returned, and the next page is
+    the rows with a greater key, so every page is one index range scan whatever its depth.
+    Only the columns behind ``names`` are loaded, and the loader options of the requested
+    fields are applied once for the page.
+
+    Returns:
+        Page: The serialized rows and the cursor of the next page (None on the last page).
+
+    Raises:
+        InvalidPageRequest: If the cursor or limit is malformed.
+    """
+    limit = page_limit(limit)
+    key_columns = list(key_columns)
+    if cursor:
+        query = query.filter(tuple_(*key_columns) > tuple_(*decode_cursor(cursor, key_columns)))
+    columns = {column.key: column for column in key_columns}
+    for name in names:
+        if fields[name].column is not None:
+            columns[fields[name].column.key] = fields[name].column
+    query = query.options(load_only(*columns.values()))
+    for name in names:
+        query = query.options(*fields[name].options)
+    rows = query.order_by(*key_columns).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+    return Page([{name: fields[name].value(row, name) for name in names} for row in rows], next_cursor)
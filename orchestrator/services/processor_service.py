@@ -1,17 +1,47 @@
-import os
-import tempfile
-from PIL import Image
+import time
+from datetime import datetime
+from sqlalchemy.orm.attributes import set_committed_value
 import json
-import base64  # اضافه کردن کتابخانه‌ی base64
 
 from orchestrator.models import user
 from orchestrator.models.task import Message, TaskStatus, Task, TaskMessage
 from orchestrator.services.command_service import CommandService
-from orchestrator.services.config_service import grounding_model, vision_model, action_model
+from orchestrator.services import config_service
+from orchestrator.services.artifact_store import artifact_store, derived_digest
+from orchestrator.services.context_service import ConversationContext
+from orchestrator.services.db_writer import db_writer
+from orchestrator.services.encoding_profiles import profile_for
 from orchestrator.services.grounding_service import draw_big_dot
+from orchestrator.services.metrics_service import current_step, current_trace, record_span, span, trace_registry
+from orchestrator.services.recording_service import RECORDING_ENABLED, SessionRecorder
+from orchestrator.services.runtime import runtime
+from orchestrator.services.screen_cache import ScreenDescriptionCache
+from orchestrator.services.step_pipeline import StepPipeline
+
+# Tools that locate their target on the screen with the grounding model
+GROUNDED_TOOLS = {"click", "double_click", "right_click"}
+# Keyboard tools run over one VNC session when called one after another: (batch action, tool result)
+BATCHED_TOOLS = {
+    "send_key": (lambda params: {"type": "key", "name": params["name"]}, None),
+    "type_text": (lambda params: {"type": "type", "text": params["text"]}, "The text has been typed."),
+}
+
+
+def tool_label(name) -> str:
+    """
+    Metric label for a tool call: the registered tool's name, or "unknown" for a name the model
+    made up, since every distinct label value becomes a new time series.
+    """
+    name = str(name).lower()
+    return name if name in tools else "unknown"
 
-TYPING_DELAY_MS = 12
-TYPING_GROUP_SIZE = 50
+
+SYSTEM_PROMPT = "You are an AI assistant with computer use abilities."
+FUSED_STEP_PROMPT = (
+    "This image shows the current display of the computer. First write what you see on the screen that is "
+    "relevant to the objective and whether the objective is complete. Then call the tool for the next single "
+    "step, or call stop if the objective is complete."
+)
 
 tools = {
     "stop": {
@@ -23,17 +53,54 @@ tools = {
 
 class ProcessorService:
 
-    def __init__(self, db, task):
+    def __init__(self, db, task, listener=None, step_mode=None):
         self.db = db
         self.task = task
-        # self.image_counter = 0  # Current screenshot number
-        # self.tmp_dir = tempfile.mkdtemp()  # Folder to store screenshots
+        self.listener = listener  # listener(event_type, **data) برای دنبال کردن زنده‌ی مراحل
+        self.step_mode = step_mode or config_service.STEP_MODE  # two_model یا fused
+        self.latest_frame = None
+        self.description_cache = ScreenDescriptionCache()
+        self.context = ConversationContext()  # پنجره‌ی پیام‌های اخیر + خلاصه‌ی مراحل قدیمی
+        self.step_artifact = None  # digest اسکرین‌شاتی که پیام THOUGHT این مرحله به آن اشاره می‌کند
+        self.location_artifact = None  # digest تصویر محل آخرین کلیک
+        # ضبط همه‌ی فریم‌های تسک برای بازبینی (keyframe + تغییرات هر ناحیه)
+        self.recorder = SessionRecorder.for_task(task.id) if RECORDING_ENABLED and task.id is not None else None
+        self.pipeline = StepPipeline(task.user_id)  # اسکرین‌شات و grounding را با بقیه‌ی مرحله هم‌پوشانی می‌دهد
+        self.pending_writes = []  # پیام‌هایی که db_writer هنوز commit نکرده
 
         print("The agent will use the following actions:")
         for action, details in tools.items():
             param_str = ", ".join(details.get("params").keys())
             print(f"- {action}({param_str})")
 
+    def emit(self, event_type, **data):
+        if self.listener:
+            self.listener(event_type, **data)
+
+    def append_message(self, task_message):
+        """
+        Add a message to the task's history and queue its row for the batched database writer.
+        """
+        task_message.task_id = self.task.id
+        task_message.created_at = datetime.utcnow()
+        # بدون اضافه شدن به session؛ ردیف را db_writer همراه با پیام‌های تسک‌های دیگر commit می‌کند
+        set_committed_value(self.task, "task_messages", list(self.task.task_messages) + [task_message])
+        if self.task.id is not None:
+            self.pending_writes.append(db_writer.append_message(
+                self.task.id, task_message.content, task_message.created_at, task_message.artifact_digest
+            ))
+
+    def flush_messages(self):
+        """
+        Wait until every message of this task has been committed.
+
+        Raises:
+            Exception: The error of the first failed write.
+        """
+        pending, self.pending_writes = self.pending_writes, []
+        for future in pending:
+            future.result()
+
     def call_function(self, name, arguments):
         func_impl = getattr(self, name.lower()) if name.lower() in tools else None
         if func_impl:
@@ -52,24 +119,32 @@ class ProcessorService:
 
         return decorator
 
-    def save_image(self, image, prefix="image"):
-        self.image_counter += 1
-        filename = f"{prefix}_{self.image_counter}.png"
-        filepath = os.path.join(self.tmp_dir, filename)
-        if isinstance(image, Image.Image):
-            image.save(filepath)
-        else:
-            with open(filepath, "wb") as f:
-                f.write(image)
-        return filepath
+    def save_image(self, image, digest=None):
+        """
+        Store a frame or image in the artifact store; the file is written in the background.
+
+        Returns:
+            str: The content digest to reference the image by.
+        """
+        return artifact_store.put(image, digest)
+
+    def screen_model(self):
+        # مدلی که اسکرین‌شات‌ها را می‌بیند
+        return config_service.step_model if self.step_mode == "fused" else config_service.vision_model
+
+    def screen_profile(self):
+        return profile_for(self.screen_model())
 
     def screenshot(self):
-        CommandService.screenshot(self.task.user_id)
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        filename = os.path.join(BASE_DIR, "data", str(self.task.user_id), 'screenshot.png')
-        self.latest_screenshot = filename
-        with open(filename, "rb") as image_file:
-            return image_file.read()
+        # اگر اسکرین‌شات بعد از آخرین اکشن از قبل گرفته شده، همان را استفاده کن
+        with span("step.screenshot"):
+            self.latest_frame = self.pipeline.take_screenshot(self.screen_profile())
+        self.record_frame(self.latest_frame)
+        return self.latest_frame
+
+    def record_frame(self, frame):
+        if self.recorder is not None:
+            self.recorder.add(frame, current_step.get())
 
     @tool(
         description="Run a shell command and return the result.",
@@ -89,7 +164,7 @@ class ProcessorService:
 
     @tool(
         description="Send a key or combination of keys to the system.",
-        params={"name": "Key or combination (e.g. 'Return', 'Ctl-C')"},
+        params={"name": "Key or combination (e.g. 'Return', 'Ctrl+C')"},
     )
     def send_key(self, name):
         result = CommandService.send_key(name, self.task.user_id)
@@ -103,14 +178,42 @@ class ProcessorService:
         CommandService.typing(text, self.task.user_id)
         return "The text has been typed."
 
+    def run_batch(self, tool_calls):
+        """
+        Run consecutive keyboard tool calls as one batch over a single VNC session.
+
+        Returns:
+            list: (result, seconds) per tool call, results matching the single-call tools.
+        """
+        try:
+            actions = [BATCHED_TOOLS[call["name"]][0](call.get("parameters") or {}) for call in tool_calls]
+            results = CommandService.run_actions(actions, self.task.user_id)
+        except Exception as e:
+            return [(f"Error executing function: {str(e)}", 0.0)] * len(tool_calls)
+        return [
+            (BATCHED_TOOLS[call["name"]][1] if result["ok"] else f"Error executing function: {result['error']}",
+             result["seconds"])
+            for call, result in zip(tool_calls, results)
+        ]
+
     def find_x_y(self, query):
         """Base method for all click operations"""
-        self.screenshot()
-        position = grounding_model.call(query, self.latest_screenshot)
-        dot_image = draw_big_dot(Image.open(self.latest_screenshot), position)
-        filepath = self.save_image(dot_image, "location")
+        with span("step.grounding"):
+            frame, position = self.pipeline.take_grounding(query, config_service.grounding_model)
+        self.latest_frame = frame
+        self.record_frame(frame)
+        if position:
+            # رسم و ذخیره‌ی محل کلیک در پس‌زمینه، خارج از مسیر اجرای مرحله
+            self.location_artifact = self.save_location(frame, position)
         return position
 
+    def save_location(self, frame, position):
+        # تصویر فقط به فریم و محل کلیک بستگی دارد، پس digest آن بدون رسم معلوم است
+        return self.save_image(
+            lambda: draw_big_dot(frame.image.copy(), position),
+            derived_digest(frame.digest, "location", *position),
+        )
+
     @tool(
         description="Click on a specified UI element.",
         params={"query": "Item or UI element on the screen to click"},
@@ -142,11 +245,16 @@ class ProcessorService:
 
 
     def append_screenshot(self):
-        screenshot_bytes = self.screenshot()
+        frame = self.screenshot()
+        # اگر صفحه از آخرین توصیف تغییری نکرده، توصیف قبلی را دوباره استفاده کن
+        cached_description = self.description_cache.lookup(frame)
+        if cached_description is not None:
+            return cached_description
+
         screenshot_message_for_model = {
             "role": "user",
             "content": [
-                screenshot_bytes,  # ارسال به صورت باینری
+                frame,  # فریم در حافظه، provider خودش آن را encode می‌کند
                 "This image shows the current display of the computer. Please respond in the following format:\n"
                 "The objective is: [put the objective here]\n"
                 "On the screen, I see: [an extensive list of everything that might be relevant to the objective including windows, icons, menus, apps, and UI elements]\n"
@@ -157,10 +265,11 @@ class ProcessorService:
         }
         # print(messages)
         # ارسال پیام به مدل
-        model_response = vision_model.call(self.task.messages() + [screenshot_message_for_model])
-        
-        # تبدیل تصویر به Base64 برای ذخیره‌سازی در دیتابیس
-        # screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
+        with span("step.vision"):
+            model_response = runtime.run(
+                config_service.vision_model.acall(self.context.build(self.task.messages()) + [screenshot_message_for_model])
+            )
+        self.description_cache.store(frame, model_response)
         
         # ایجاد پیام برای ذخیره‌سازی در دیتابیس
         screenshot_message_for_db = TaskMessage(
@@ -182,7 +291,71 @@ class ProcessorService:
         
         return model_response
 
+    def two_model_step(self, step):
+        """
+        Describe the screen with the vision model, then pick tool calls with the action model.
+
+        Returns:
+            tuple: (content, tool_calls) of the action model.
+        """
+        # اضافه کردن اسکرین‌شات و دریافت پاسخ از مدل
+        started = time.perf_counter()
+        screenshot_thought = self.append_screenshot()
+        self.emit("thought", step=step, source="vision", text=screenshot_thought,
+                  seconds=time.perf_counter() - started)
+        self.append_message(TaskMessage(content=json.dumps({
+            "role": "user",
+            "content": f"THOUGHT: {screenshot_thought}"
+        }), artifact_digest=self.save_image(self.latest_frame)))
+        self.step_artifact = None
+        
+        # فراخوانی مدل برای دریافت محتوا و فراخوانی ابزارها
+        started = time.perf_counter()
+        with span("step.action"):
+            content, tool_calls = runtime.run(config_service.action_model.acall(
+                    [{"role": "system", "content": SYSTEM_PROMPT}] +
+                    self.context.build(self.task.messages()) +
+                    [{"role": "assistant", "content": "I will now use tool calls to take these actions, or use the stop command if the objective is complete."}],
+                tools,
+            ))
+        print(content, tool_calls)
+        self.emit("thought", step=step, source="action", text=content, tool_calls=tool_calls,
+                  seconds=time.perf_counter() - started)
+        return content, tool_calls
+
+    def fused_step(self, step):
+        """
+        Look at the screen and pick tool calls in a single request to the step model.
+
+        Returns:
+            tuple: (content, tool_calls), content holding the model's reading of the screen.
+        """
+        frame = self.screenshot()
+        self.step_artifact = self.save_image(frame)
+        started = time.perf_counter()
+        with span("step.fused"):
+            content, tool_calls = runtime.run(config_service.step_model.acall(
+                [{"role": "system", "content": SYSTEM_PROMPT}] +
+                self.context.build(self.task.messages()) +
+                [{"role": "user", "content": [frame, FUSED_STEP_PROMPT]}],
+                tools,
+            ))
+        print(content, tool_calls)
+        self.emit("thought", step=step, source="fused", text=content, tool_calls=tool_calls,
+                  seconds=time.perf_counter() - started)
+        return content, tool_calls
+
     def process_task(self):
+        # زمان‌بندی مراحل این تسک برای /metrics و timeline
+        trace_token = current_trace.set(trace_registry.start(self.task.id))
+        try:
+            self.run_steps()
+        finally:
+            current_trace.reset(trace_token)
+            if self.recorder is not None:
+                self.recorder.close()
+
+    def run_steps(self):
         # تبدیل محتوای task_messages به دیکشنری
 
         initial_message = {
@@ -190,61 +363,91 @@ class ProcessorService:
             "content": f"OBJECTIVE: {self.task.description}"
         }
         # اضافه کردن پیام اولیه (هدف تسک)
-        self.task.task_messages.append(TaskMessage(content=json.dumps(initial_message)))
-        
-        should_continue = True
-        while should_continue:
-            # اضافه کردن اسکرین‌شات و دریافت پاسخ از مدل
-            screenshot_thought = self.append_screenshot()
-            self.task.task_messages.append(TaskMessage(content=json.dumps({
-                "role": "user",
-                "content": f"THOUGHT: {screenshot_thought}"
-            })))
-            
-            # فراخوانی مدل برای دریافت محتوا و فراخوانی ابزارها
-            content, tool_calls = action_model.call( 
-                    [{"role": "system", "content": "You are an AI assistant with computer use abilities."}] +
-                    self.task.messages() +
-                    [{"role": "assistant", "content": "I will now use tool calls to take these actions, or use the stop command if the objective is complete."}],
-                tools,
-            )
-            print(content, tool_calls)
-            
-            if content:
-                # اضافه کردن پاسخ مدل به پیام‌ها
-                thought_message = TaskMessage(
-                    content=json.dumps({
-                        "role": "assistant",
-                        "content": f"THOUGHT: {content}"
-                    })
-                )
-                self.task.task_messages.append(thought_message)
-                
-            should_continue = False
-            for tool_call in tool_calls:
-                name, parameters = tool_call.get("name"), tool_call.get("parameters")
-                should_continue = name != "stop"
-                if not should_continue:
-                    break
-                
-                # اضافه کردن فراخوانی ابزار به پیام‌ها
-                # tool_call_message = TaskMessage(
-                #     content=json.dumps(tool_call)
-                # )
-                # self.task.task_messages.append(tool_call_message)
-                
-                # اجرای ابزار و دریافت نتیجه
-                result = self.call_function(name, parameters)
-                
-                # اضافه کردن نتیجه به پیام‌ها
-                observation_message = TaskMessage(
-                    content=json.dumps({
-                        "role": "assistant",
-                        "content": f"OBSERVATION: {result}"
-                    })
-                )
-                self.task.task_messages.append(observation_message)
+        self.append_message(TaskMessage(content=json.dumps(initial_message)))
         
-        # ذخیره‌سازی تسک در دیتابیس
-        self.db.add(self.task)
-        self.db.commit()
+        try:
+            step = 0
+            should_continue = True
+            while should_continue:
+                step += 1
+                step_started = time.perf_counter()
+                current_step.set(step)
+                self.emit("step_started", step=step)
+
+                if self.step_mode == "fused":
+                    content, tool_calls = self.fused_step(step)
+                else:
+                    content, tool_calls = self.two_model_step(step)
+
+                # grounding اولین کلیک را همین حالا شروع کن، صفحه تا اجرای آن تغییری نمی‌کند
+                if tool_calls and tool_calls[0].get("name") in GROUNDED_TOOLS and tool_calls[0].get("parameters"):
+                    self.pipeline.start_grounding(tool_calls[0]["parameters"].get("query"), config_service.grounding_model)
+
+                if content:
+                    # اضافه کردن پاسخ مدل به پیام‌ها
+                    thought_message = TaskMessage(
+                        content=json.dumps({
+                            "role": "assistant",
+                            "content": f"THOUGHT: {content}"
+                        }),
+                        artifact_digest=self.step_artifact,  # در حالت fused، صفحه‌ای که مدل دیده
+                    )
+                    self.append_message(thought_message)
+
+                should_continue = False
+                batched = {}  # index -> (result, seconds) of tool calls already run in a batch
+                for index, tool_call in enumerate(tool_calls):
+                    name, parameters = tool_call.get("name"), tool_call.get("parameters")
+                    should_continue = name != "stop"
+                    if not should_continue:
+                        break
+
+                    # چند ابزار صفحه‌کلید پشت سر هم را در یک نشست VNC اجرا کن
+                    if name in BATCHED_TOOLS and index not in batched:
+                        end = index
+                        while end < len(tool_calls) and tool_calls[end].get("name") in BATCHED_TOOLS:
+                            end += 1
+                        if end - index > 1:
+                            batched.update(zip(range(index, end), self.run_batch(tool_calls[index:end])))
+
+                    # اضافه کردن فراخوانی ابزار به پیام‌ها
+                    # tool_call_message = TaskMessage(
+                    #     content=json.dumps(tool_call)
+                    # )
+                    # self.task.task_messages.append(tool_call_message)
+
+                    # اجرای ابزار و دریافت نتیجه
+                    self.emit("tool_call", step=step, name=name, parameters=parameters)
+                    started = time.perf_counter()
+                    self.location_artifact = None
+                    if index in batched:
+                        result, seconds = batched[index]
+                    else:
+                        # The raw name is kept in the task's timeline only
+                        with span("tool", tool_label(name), name=name):
+                            result = self.call_function(name, parameters)
+                        seconds = time.perf_counter() - started
+                    if index == len(tool_calls) - 1:
+                        # اسکرین‌شات مرحله‌ی بعد را هم‌زمان با ثبت نتیجه بگیر
+                        self.pipeline.prefetch_screenshot(self.screen_profile())
+                    self.emit("observation", step=step, name=name, result=str(result), seconds=seconds)
+
+                    # اضافه کردن نتیجه به پیام‌ها
+                    observation_message = TaskMessage(
+                        content=json.dumps({
+                            "role": "assistant",
+                            "content": f"OBSERVATION: {result}"
+                        }),
+                        artifact_digest=self.location_artifact,  # تصویر محل کلیک، اگر ابزار کلیک بود
+                    )
+                    self.append_message(observation_message)
+
+                step_seconds = time.perf_counter() - step_started
+                record_span("step", step_started, step_seconds, self.step_mode)
+                self.emit("step_finished", step=step, mode=self.step_mode, seconds=step_seconds)
+        finally:
+            # پیش‌خوانی‌ها و grounding را حتی اگر مرحله‌ای خطا داد ببند و پیام‌های صف‌شده را بنویس
+            self.pipeline.close()
+            current_step.set(None)
+            with span("db.commit"):
+                self.flush_messages()
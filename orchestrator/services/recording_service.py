@@ -0,0 +1,277 @@
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+
+from orchestrator.services.frame import Frame
+
+# Record every screen a task captures, for reviewing what the agent did
+RECORDING_ENABLED = os.getenv("RECORDING_ENABLED", "1") == "1"
+RECORDING_DIR = os.getenv("RECORDING_DIR", "recordings")
+# A full frame is stored every this many frames; seeking decodes at most this many records
+RECORDING_KEYFRAME_INTERVAL = int(os.getenv("RECORDING_KEYFRAME_INTERVAL", "20"))
+# Side of the square regions compared between consecutive frames
+RECORDING_TILE = int(os.getenv("RECORDING_TILE", "32"))
+# Above this fraction of changed regions a keyframe is stored instead of a delta
+RECORDING_KEYFRAME_CHANGED_RATIO = float(os.getenv("RECORDING_KEYFRAME_CHANGED_RATIO", "0.5"))
+RECORDING_COMPRESSION = int(os.getenv("RECORDING_COMPRESSION", "3"))
+
+FILE_MAGIC = b"ORCREC1\n"
+# kind, timestamp, step, width, height, tile, payload length
+RECORD_HEADER = struct.Struct("<BdiHHHI")
+KEYFRAME = 0
+DELTA = 1
+NO_STEP = -1
+
+
+def recording_path(task_id: int, directory: str = RECORDING_DIR) -> str:
+    return os.path.join(directory, f"task_{task_id}.rec")
+
+
+def to_timestamp(created_at: datetime) -> float:
+    """
+    Epoch seconds of a ``TaskMessage.created_at`` (naive UTC), comparable to frame timestamps.
+    """
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray, tile: int) -> np.ndarray:
+    """
+    (row, column) of every ``tile``-sized region that differs between two frames of the same size.
+    """
+    height, width = current.shape[:2]
+    rows, columns = -(-height // tile), -(-width // tile)
+    changed = np.any(previous != current, axis=2)
+    changed = np.pad(changed, ((0, rows * tile - height), (0, columns * tile - width)))
+    return np.argwhere(changed.reshape(rows, tile, columns, tile).any(axis=(1, 3))).astype(np.uint16)
+
+
+def encode_delta(current: np.ndarray, tiles: np.ndarray, tile: int) -> bytes:
+    parts = [struct.pack("<I", len(tiles)), tiles.tobytes()]
+    for row, column in tiles:
+        parts.append(current[row * tile:(row + 1) * tile, column * tile:(column + 1) * tile].tobytes())
+    return b"".join(parts)
+
+
+def apply_delta(pixels: np.ndarray, data: bytes, tile: int):
+    count = struct.unpack_from("<I", data)[0]
+    tiles = np.frombuffer(data, dtype=np.uint16, count=count * 2, offset=4).reshape(count, 2)
+    offset = 4 + tiles.nbytes
+    height, width = pixels.shape[:2]
+    for row, column in tiles:
+        top, left = int(row) * tile, int(column) * tile
+        block_height, block_width = min(tile, height - top), min(tile, width - left)
+        size = block_height * block_width * 3
+        pixels[top:top + block_height, left:left + block_width] = np.frombuffer(
+            data, dtype=np.uint8, count=size, offset=offset
+        ).reshape(block_height, block_width, 3)
+        offset += size
+
+
+class SessionRecorder:
+    """
+    Appends the screens of one task to a recording: keyframes plus the changed regions
+    between consecutive frames, each tagged with its capture time and step.
+
+    Frames are compared and compressed on the recorder's own thread, in capture order, so
+    recording adds nothing to the agent loop but a queue put.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = RECORDING_KEYFRAME_INTERVAL,
+                 tile: int = RECORDING_TILE, keyframe_changed_ratio: float = RECORDING_KEYFRAME_CHANGED_RATIO):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.tile = tile
+        self.keyframe_changed_ratio = keyframe_changed_ratio
+        self.frames = 0
+        self.bytes_written = 0
+        self._previous = None
+        self._since_keyframe = 0
+        self._last_frame = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # A task run again continues its recording, starting with a keyframe; a record cut
+            # short by a crash is dropped first
+            entries = RecordingReader(path).index()
+            end = entries[-1].offset + RECORD_HEADER.size + entries[-1].length if entries else len(FILE_MAGIC)
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(FILE_MAGIC)
+
+    @classmethod
+    def for_task(cls, task_id: int, directory: str = RECORDING_DIR) -> "SessionRecorder":
+        return cls(recording_path(task_id, directory))
+
+    def add(self, frame, step: int = None):
+        """
+        Queue a captured frame; the same frame object added twice in a row is recorded once.
+        """
+        if frame is None or frame is self._last_frame:
+            return
+        self._last_frame = frame
+        self._executor.submit(self._write, frame.pixels, frame.captured_at, NO_STEP if step is None else step)
+
+    def _write(self, pixels: np.ndarray, timestamp: float, step: int):
+        try:
+            height, width = pixels.shape[:2]
+            previous = self._previous
+            kind, payload = KEYFRAME, pixels.tobytes()
+            if previous is not None and previous.shape == pixels.shape and self._since_keyframe < self.keyframe_interval:
+                tiles = changed_tiles(previous, pixels, self.tile)
+                total = -(-height // self.tile) * -(-width // self.tile)
+                if len(tiles) <= total * self.keyframe_changed_ratio:
+                    kind, payload = DELTA, encode_delta(pixels, tiles, self.tile)
+            payload = zlib.compress(payload, RECORDING_COMPRESSION)
+            self._file.write(RECORD_HEADER.pack(kind, timestamp, step, width, height, self.tile, len(payload)))
+            self._file.write(payload)
+            self._file.flush()
+            self._previous = pixels
+            self._since_keyframe = 0 if kind == KEYFRAME else self._since_keyframe + 1
+            self.frames += 1
+            self.bytes_written += RECORD_HEADER.size + len(payload)
+        except Exception as e:
+            print(f"Recording frame to {self.path} failed: {e}")
+
+    def close(self):
+        """
+        Write the frames still queued and close the file.
+        """
+        self._executor.shutdown(wait=True)
+        self._file.close()
+
+
+@dataclass
+class RecordEntry:
+    position: int
+    offset: int
+    kind: int
+    timestamp: float
+    step: int
+    width: int
+    height: int
+    tile: int
+    length: int
+
+    def as_dict(self):
+        return {
+            "index": self.position,
+            "step": None if self.step == NO_STEP else self.step,
+            "timestamp": self.timestamp,
+            "keyframe": self.kind == KEYFRAME,
+            "size": [self.width, self.height],
+        }
+
+
+class RecordingReader:
+    """
+    Random access to a recording. The index is built from the record headers alone, so
+    seeking reads and decodes only the frames from the nearest keyframe on.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._read_index()
+            return self._index
+
+    def _read_index(self):
+        entries = []
+        with open(self.path, "rb") as f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise ValueError(f"{self.path} is not a recording.")
+            size = os.fstat(f.fileno()).st_size
+            while True:
+                offset = f.tell()
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                kind, timestamp, step, width, height, tile, length = RECORD_HEADER.unpack(header)
+                if offset + RECORD_HEADER.size + length > size:
+                    break  # A record still being written
+                entries.append(RecordEntry(len(entries), offset, kind, timestamp, step, width, height, tile, length))
+                f.seek(length, os.SEEK_CUR)
+        return entries
+
+    def seek_step(self, step: int) -> int:
+        """
+        Position of the first frame captured in ``step`` or a later one.
+
+        Raises:
+            LookupError: If the recording has no frame from that step on.
+        """
+        for entry in self.index():
+            if entry.step != NO_STEP and entry.step >= step:
+                return entry.position
+        raise LookupError(f"No frame recorded for step {step}.")
+
+    def seek_time(self, timestamp: float) -> int:
+        """
+        Position of the last frame captured at or before ``timestamp`` (the first frame if none).
+        """
+        position = 0
+        for entry in self.index():
+            if entry.timestamp > timestamp:
+                break
+            position = entry.position
+        return position
+
+    def frames(self, start: int = 0, count: int = None):
+        """
+        Yield (entry, pixels) from position ``start`` on, decoding from the keyframe before it.
+        """
+        entries = self.index()
+        if not entries:
+            return
+        start = max(0, min(start, len(entries) - 1))
+        keyframe = start
+        while keyframe > 0 and entries[keyframe].kind != KEYFRAME:
+            keyframe -= 1
+        end = len(entries) if count is None else min(len(entries), start + count)
+        pixels = None
+        with open(self.path, "rb") as f:
+            for entry in entries[keyframe:end]:
+                f.seek(entry.offset + RECORD_HEADER.size)
+                data = zlib.decompress(f.read(entry.length))
+                if entry.kind == KEYFRAME:
+                    pixels = np.frombuffer(data, dtype=np.uint8).reshape(entry.height, entry.width, 3).copy()
+                else:
+                    apply_delta(pixels, data, entry.tile)
+                if entry.position >= start:
+                    yield entry, pixels.copy()
+
+    def frame_at(self, position: int):
+        for entry, pixels in self.frames(position, 1):
+            return entry, pixels
+        raise LookupError(f"No frame {position} in {self.path}.")
+
+
+def multipart_frames(reader: RecordingReader, start: int = 0, count: int = None, image_format: str = "JPEG",
+                     boundary: str = "frame"):
+    """
+    Encode frames from ``start`` on as a multipart/x-mixed-replace body, one image per part
+    with its step and capture time in the part headers.
+    """
+    media_type = f"image/{image_format.lower()}"
+    for entry, pixels in reader.frames(start, count):
+        data = Frame(pixels).encode(image_format)
+        step = "" if entry.step == NO_STEP else entry.step
+        yield (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Length: {len(data)}\r\n"
+            f"X-Frame-Index: {entry.position}\r\nX-Step: {step}\r\nX-Timestamp: {entry.timestamp}\r\n\r\n"
+        ).encode("ascii") + data + b"\r\n"
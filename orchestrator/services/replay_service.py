@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from orchestrator.services.encoding_profiles import EncodedImage
+from orchestrator.services.frame import Frame
+
+# off: always call the model; record: call the model and store the response;
+# replay: only serve stored responses; auto: serve stored responses, record the rest
+MODEL_REPLAY_MODE = os.getenv("MODEL_REPLAY_MODE", "off")
+MODEL_REPLAY_DIR = os.getenv("MODEL_REPLAY_DIR", "model_replay")
+
+REPLAY_MODES = ("off", "record", "replay", "auto")
+
+
+class ReplayMissError(LookupError):
+    """
+    Raised in replay mode when no response was recorded for a request.
+    """
+
+
+def canonical(value):
+    """
+    JSON-serializable form of a request argument; images are replaced by their digest.
+    """
+    if isinstance(value, Frame):
+        return {"image_sha256": value.digest}
+    if isinstance(value, EncodedImage):
+        return {"image_sha256": hashlib.sha256(value.data).hexdigest()}
+    if isinstance(value, bytes):
+        return {"bytes_sha256": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class ModelReplay:
+    """
+    Records model responses on disk keyed by a hash of the request, and serves them back.
+
+    The key covers the provider class, model, and every call argument (messages, tools,
+    prompt), with images reduced to their SHA-256 digest. A recorded session therefore
+    replays as long as the agent sees the same screens, without any network request.
+    """
+
+    def __init__(self, mode: str = MODEL_REPLAY_MODE, directory: str = MODEL_REPLAY_DIR):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown MODEL_REPLAY_MODE '{mode}'. Available: {', '.join(REPLAY_MODES)}")
+        self.mode = mode
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def request(self, provider, args, kwargs):
+        return {
+            "provider": provider.__class__.__name__,
+            "model": getattr(provider, "model", None),
+            "args": canonical(list(args)),
+            "kwargs": canonical(kwargs),
+        }
+
+    @staticmethod
+    def key(request) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def lookup(self, key: str):
+        """
+        Returns:
+            tuple: (found, response).
+        """
+        try:
+            with open(self.path(key), "rb") as f:
+                response = pickle.load(f)["response"]
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.misses += 1
+            return False, None
+        with self._lock:
+            self.hits += 1
+        return True, response
+
+    def record(self, key: str, request, response):
+        """
+        Store a response atomically, next to the request it answers.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"request": request, "response": response, "recorded_at": time.time()}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+    def before_call(self, provider, args, kwargs):
+        """
+        Returns:
+            tuple: (request, key, found, response); request is None when replay is off.
+        """
+        if self.mode == "off":
+            return None, None, False, None
+        request = self.request(provider, args, kwargs)
+        key = self.key(request)
+        if self.mode == "record":
+            return request, key, False, None
+        found, response = self.lookup(key)
+        if not found and self.mode == "replay":
+            raise ReplayMissError(f"No recorded response for {request['provider']} request {key}")
+        return request, key, found, response
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "directory": self.directory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+model_replay = ModelReplay()
+
+
+def is_empty_response(response) -> bool:
+    """
+    True for a response without any content, such as the ``("", [])`` a provider returns when
+    its request failed; recording it would replay a transient failure forever.
+    """
+    if isinstance(response, tuple):
+        return all(not part for part in response)
+    return not response
+
+
+def recorded(method):
+    """
+    Decorator for provider ``call``/``acall`` methods, routing them through :data:`model_replay`.
+    Empty responses are returned but not recorded.
+    """
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            request, key, found, response = model_replay.before_call(self, args, kwargs)
+            if found:
+                return response
+            response = await method(self, *args, **kwargs)
+            if request is not None and not is_empty_response(response):
+                model_replay.record(key, request, response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        request, key, found, response = model_replay.before_call(self, args, kwargs)
+        if found:
+            return response
+        response = method(self, *args, **kwargs)
+        if request is not None and not is_empty_response(response):
+            model_replay.record(key, request, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+RUNTIME_IO_THREADS = int(os.getenv("RUNTIME_IO_THREADS", "32"))
+
+
+class AsyncRuntime:
+    """
+    A single long-running event loop, on a background thread, shared by all desktop I/O.
+
+    VNC sessions, Docker calls and model requests are submitted here as coroutines, so the
+    sockets they open outlive a single action and I/O for many users overlaps on one loop.
+    Blocking libraries (the Docker SDK, sync model clients) are run on the loop's bounded
+    thread pool via :meth:`to_thread`. Synchronous callers use :meth:`run`.
+    """
+
+    def __init__(self, io_threads: int = RUNTIME_IO_THREADS):
+        self.io_threads = io_threads
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._startup_hooks = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        The runtime event loop, started on first access.
+        """
+        with self._start_lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(
+                    ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="runtime-io")
+                )
+                self._thread = threading.Thread(target=self._run_loop, name="async-runtime", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        for hook in self._startup_hooks:
+            self._loop.create_task(hook())
+        self._loop.run_forever()
+
+    def on_start(self, hook):
+        """
+        Register a coroutine function to be scheduled as a background task when the loop starts.
+        """
+        self._startup_hooks.append(hook)
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.create_task, hook())
+        return hook
+
+    def in_runtime_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro) -> Future:
+        """
+        Schedule a coroutine on the runtime loop without waiting for it.
+
+        The caller's context variables (e.g. the task being traced) are visible to the coroutine.
+
+        Returns:
+            concurrent.futures.Future: Resolves with the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(_with_context(contextvars.copy_context(), coro), self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """
+        Run a coroutine on the runtime loop and block until it finishes.
+
+        Raises:
+            RuntimeError: If called from the runtime thread itself, which would deadlock.
+        """
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() cannot be called from inside the runtime loop; await instead.")
+        return self.submit(coro).result(timeout)
+
+    async def to_thread(self, func, *args, **kwargs):
+        """
+        Await a blocking function on the runtime's I/O thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+
+async def _with_context(context: contextvars.Context, coro):
+    # Tasks copy the loop thread's context; bring the submitting thread's values over instead
+    for variable, value in context.items():
+        variable.set(value)
+    return await coro
+
+
+runtime = AsyncRuntime()
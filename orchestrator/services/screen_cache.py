@@ -0,0 +1,90 @@
+import os
+import threading
+
+from orchestrator.services.frame import Frame
+
+# A thumbnail block counts as changed when its mean brightness moves by more than this
+SCREEN_DIFF_PIXEL_THRESHOLD = int(os.getenv("SCREEN_DIFF_PIXEL_THRESHOLD", "8"))
+# Fraction of thumbnail blocks allowed to change while the screen still counts as unchanged.
+# 0 (the default) reuses a description only for pixel-identical screens: typed text, a toggled
+# checkbox or a moved caret fit in a few blocks and must not get the old description.
+SCREEN_DIFF_CHANGED_RATIO = float(os.getenv("SCREEN_DIFF_CHANGED_RATIO", "0"))
+
+
+class ScreenCacheStats:
+    """
+    Process-wide hit/miss counters, summed over every task's cache.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+screen_cache_stats = ScreenCacheStats()
+
+
+class ScreenDescriptionCache:
+    """
+    Remembers the last frame a task described with the vision model and its description.
+
+    When a new frame has exactly the same pixels, the previous description is returned and the
+    multimodal call can be skipped. A non-zero ``changed_ratio`` also accepts frames where only
+    that fraction of thumbnail blocks changed, for screens with a clock or blinking cursor.
+    """
+
+    def __init__(self, pixel_threshold: int = SCREEN_DIFF_PIXEL_THRESHOLD,
+                 changed_ratio: float = SCREEN_DIFF_CHANGED_RATIO):
+        self.pixel_threshold = pixel_threshold
+        self.changed_ratio = changed_ratio
+        self.frame = None
+        self.description = None
+        self.hits = 0
+        self.misses = 0
+
+    def is_unchanged(self, frame: Frame) -> bool:
+        if self.frame is None:
+            return False
+        if frame.digest == self.frame.digest:
+            return True
+        return self.changed_ratio > 0 and frame.changed_ratio(self.frame, self.pixel_threshold) <= self.changed_ratio
+
+    def lookup(self, frame: Frame):
+        """
+        Return the cached description if ``frame`` shows the same screen, otherwise None.
+        """
+        hit = self.is_unchanged(frame)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        screen_cache_stats.record(hit)
+        return self.description if hit else None
+
+    def store(self, frame: Frame, description):
+        self.frame = frame
+        self.description = description
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
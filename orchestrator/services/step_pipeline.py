@@ -0,0 +1,109 @@
+from orchestrator.services.command_service import CommandService
+from orchestrator.services.grounding_cache import grounding_cache
+from orchestrator.services.metrics_service import retries
+from orchestrator.services.runtime import runtime
+
+
+def prepare_frame(frame, profile):
+    """
+    Compute everything the next vision call needs from a frame: the digest used by the
+    unchanged-screen cache, and the encoding for the model.
+    """
+    frame.digest
+    frame.encode_for(profile)
+    return frame
+
+
+class StepPipeline:
+    """
+    Overlaps the desktop I/O of an agent step with the rest of the step.
+
+    - The screenshot for the next step is captured (and encoded for the vision model) as soon
+      as the last action of a step has run, while the observation is being recorded.
+    - Grounding for a click starts as soon as the tool call is parsed, before it is executed.
+    - Annotation work (drawing and saving the click position) runs on the artifact store's
+      writer threads, off the step's path.
+
+    Every screenshot is still taken after the action it follows, so the agent sees the same
+    screens and makes the same decisions as in a strictly serial loop.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._screenshot = None
+        self._grounding = None  # (query, future)
+
+    async def capture(self, profile=None):
+        frame = await CommandService.async_screenshot(self.user_id)
+        if profile is not None:
+            await runtime.to_thread(prepare_frame, frame, profile)
+        return frame
+
+    def prefetch_screenshot(self, profile=None):
+        """
+        Start capturing the next screenshot in the background.
+        """
+        self.discard_screenshot()
+        self._screenshot = runtime.submit(self.capture(profile))
+
+    def discard_screenshot(self):
+        if self._screenshot is not None:
+            self._screenshot.cancel()
+            self._screenshot = None
+
+    def take_screenshot(self, profile=None):
+        """
+        Return the prefetched screenshot, or capture one now if none is pending.
+        """
+        future, self._screenshot = self._screenshot, None
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"Prefetched screenshot failed, capturing again: {e}")
+                retries.inc(operation="screenshot.prefetch")
+        return runtime.run(self.capture(profile))
+
+    async def ground(self, query, model):
+        """
+        Capture the screen and locate ``query`` on it, from the grounding cache when possible.
+
+        Returns:
+            tuple: (frame, position), position being None if the element was not found.
+        """
+        frame = await CommandService.async_screenshot(self.user_id)
+        position = await runtime.to_thread(grounding_cache.lookup, query, frame, model)
+        if position is None:
+            position = await model.acall(query, frame)
+            if position:
+                grounding_cache.store(query, frame, model, position)
+        return frame, position
+
+    def start_grounding(self, query, model):
+        """
+        Start grounding ``query`` in the background; :meth:`take_grounding` picks it up.
+        """
+        if self._grounding is not None:
+            self._grounding[1].cancel()
+        self._grounding = (query, runtime.submit(self.ground(query, model)))
+
+    def take_grounding(self, query, model):
+        """
+        Return the (frame, position) of ``query``, reusing a grounding started in advance.
+        """
+        started, self._grounding = self._grounding, None
+        if started is not None:
+            started_query, future = started
+            if started_query == query:
+                return future.result()
+            future.cancel()
+        return runtime.run(self.ground(query, model))
+
+    def close(self):
+        """
+        Drop prefetched work that is no longer needed.
+        """
+        self.discard_screenshot()
+        if self._grounding is not None:
+            self._grounding[1].cancel()
+            self._grounding = None
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from orchestrator.models.base import get_db
+from orchestrator.models.task import Task, TaskStatus
+from orchestrator.services.db_writer import db_writer
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "8"))
+
+
+class QueuedTask:
+    def __init__(self, task_id: int, user_id: int):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.future = Future()
+        self.listeners = []
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def emit(self, event_type: str, **data):
+        for listener in self.listeners:
+            try:
+                listener(event_type, **data)
+            except Exception as e:
+                print(f"Task {self.task_id} event listener failed: {e}")
+
+
+def run_task(task_id: int, listener=None):
+    """
+    Process one task in its own database session, tracking its status.
+
+    Args:
+        task_id (int): ID of the task.
+        listener: Optional ``listener(event_type, **data)`` callback receiving step events.
+    """
+    # Imported here so the executor can be imported without the model providers
+    from orchestrator.services.processor_service import ProcessorService
+
+    with get_db() as db:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            raise ValueError(f"Task with ID {task_id} not found.")
+        previous_status = task.status
+        # Status changes share commits with the message writes of other running tasks
+        db_writer.set_task_status(task_id, TaskStatus.IN_PROGRESS).result()
+        try:
+            ProcessorService(db, task, listener).process_task()
+            db_writer.set_task_status(task_id, TaskStatus.FINISH).result()
+        except Exception:
+            db_writer.set_task_status(task_id, previous_status).result()
+            raise
+
+
+class TaskExecutor:
+    """
+    In-process executor that runs tasks of many users in parallel on a bounded worker pool.
+
+    Each user has a FIFO queue and at most one task running at a time, since a task drives the
+    user's single desktop. A user's next task is only handed to the pool when the previous one
+    finishes, so workers never sit blocked waiting for a busy desktop.
+    """
+
+    def __init__(self, max_workers: int = TASK_WORKERS, runner=run_task):
+        self.max_workers = max_workers
+        self.runner = runner
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task-worker")
+        self._lock = threading.Lock()
+        self._queues = {}  # user_id -> deque of QueuedTask waiting for the user's desktop
+        self._running = {}  # user_id -> QueuedTask
+        self._tasks = OrderedDict()  # task_id -> QueuedTask, queued or running
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._started = 0
+
+    def submit(self, task_id: int, user_id: int, listener=None) -> Future:
+        """
+        Queue a task behind the user's other tasks. Submitting a task that is already queued
+        or running returns its existing future and only adds the listener.
+        """
+        with self._lock:
+            queued = self._tasks.get(task_id)
+            if queued:
+                if listener:
+                    queued.listeners.append(listener)
+                    listener("task_queued", user_id=user_id)
+                    if queued.started_at is not None:
+                        listener("task_started", wait_seconds=queued.started_at - queued.submitted_at)
+                return queued.future
+            queued = QueuedTask(task_id, user_id)
+            if listener:
+                queued.listeners.append(listener)
+                listener("task_queued", user_id=user_id)
+            self._tasks[task_id] = queued
+            self._queues.setdefault(user_id, deque()).append(queued)
+            self._dispatch(user_id)
+            return queued.future
+
+    # Must be called with the lock held
+    def _dispatch(self, user_id: int):
+        if user_id in self._running:
+            return
+        queue = self._queues.get(user_id)
+        if not queue:
+            self._queues.pop(user_id, None)
+            return
+        queued = queue.popleft()
+        self._running[user_id] = queued
+        self._pool.submit(self._run, queued)
+
+    def _run(self, queued: QueuedTask):
+        queued.started_at = time.monotonic()
+        wait = queued.started_at - queued.submitted_at
+        with self._lock:
+            self._started += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        if not queued.future.set_running_or_notify_cancel():
+            self._finish(queued, failed=False)
+            return
+        queued.emit("task_started", wait_seconds=wait)
+        try:
+            result = self.runner(queued.task_id, queued.emit)
+        except Exception as e:
+            print(f"Task {queued.task_id} of user {queued.user_id} failed: {e}")
+            self._finish(queued, failed=True)
+            queued.emit("task_failed", error=str(e), duration_seconds=time.monotonic() - queued.started_at)
+            queued.future.set_exception(e)
+        else:
+            self._finish(queued, failed=False)
+            queued.emit("task_finished", duration_seconds=time.monotonic() - queued.started_at)
+            queued.future.set_result(result)
+
+    def _finish(self, queued: QueuedTask, failed: bool):
+        with self._lock:
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._tasks.pop(queued.task_id, None)
+            self._running.pop(queued.user_id, None)
+            self._dispatch(queued.user_id)
+
+    def is_pending(self, task_id: int) -> bool:
+        return task_id in self._tasks
+
+    def stats(self):
+        with self._lock:
+            running = len(self._running)
+            return {
+                "workers": self.max_workers,
+                "running": running,
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "utilization": running / self.max_workers,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_seconds": self._wait_total / self._started if self._started else 0.0,
+                "max_wait_seconds": self._wait_max,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+task_executor = TaskExecutor()
@@ -1,12 +1,35 @@
 from typing import Dict, List, Tuple, Union
-from orchestrator.models.task import Task
+from orchestrator.models.task import Task, TaskMessage, TaskStatus
 from orchestrator.models.user import User
+from orchestrator.services.pagination import Field, InvalidPageRequest, Page, paginate
 from orchestrator.services.processor_service import ProcessorService
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 import json
 import os
 import re
 
+TASK_FIELDS = {
+    "id": Field(Task.id),
+    "description": Field(Task.description),
+    "user_id": Field(Task.user_id),
+    "status": Field(Task.status, getter=lambda task: task.status.value if task.status else None),
+    "parent_task_id": Field(Task.parent_task_id),
+    "user_name": Field(getter=lambda task: task.user.name if task.user else None, options=[joinedload(Task.user)]),
+    "child_task_ids": Field(getter=lambda task: [child.id for child in task.child_tasks],
+                            options=[selectinload(Task.child_tasks).load_only(Task.id, Task.parent_task_id)]),
+}
+TASK_DEFAULT_FIELDS = ["id", "description", "user_id"]
+
+MESSAGE_FIELDS = {
+    "id": Field(TaskMessage.id),
+    "created_at": Field(TaskMessage.created_at,
+                        getter=lambda message: message.created_at.isoformat() if message.created_at else None),
+    "artifact_digest": Field(TaskMessage.artifact_digest),
+    "role": Field(TaskMessage.content, getter=lambda message: json.loads(message.content).get("role")),
+    "content": Field(TaskMessage.content, getter=lambda message: json.loads(message.content).get("content")),
+}
+MESSAGE_DEFAULT_FIELDS = ["id", "created_at", "role", "content", "artifact_digest"]
+
 def extract_json_blocks(text: str) -> List[Union[dict, list]]:
     """
     Extract JSON blocks from a text string.
@@ -178,6 +201,71 @@ class TaskService:
         except Exception as e:
             raise Exception(f"Failed to fetch tasks for user {user_id}: {str(e)}")
 
+    @staticmethod
+    def get_tasks_page(db: Session, user_id: int, fields: List[str], cursor: str = None, limit: int = None,
+                       status: str = None) -> Page:
+        """
+        One page of a user's tasks in creation order, with only the requested fields.
+
+        Args:
+            db (Session): Database session.
+            user_id (int): ID of the user.
+            fields (List[str]): Names from TASK_FIELDS to return.
+            cursor (str): next_cursor of the previous page.
+            limit (int): Page size.
+            status (str): Only tasks in this status (a TaskStatus value).
+
+        Returns:
+            Page: The tasks and the cursor of the next page.
+
+        Raises:
+            InvalidPageRequest: If the cursor, limit or status is invalid.
+        """
+        query = db.query(Task).filter(Task.user_id == user_id)
+        if status:
+            try:
+                query = query.filter(Task.status == TaskStatus(status))
+            except ValueError:
+                raise InvalidPageRequest(f"Unknown status {status!r}.")
+        return paginate(query, [Task.id], TASK_FIELDS, fields, cursor, limit)
+
+    @staticmethod
+    def get_messages_page(db: Session, task_id: int, fields: List[str], cursor: str = None,
+                          limit: int = None) -> Page:
+        """
+        One page of a task's messages in the order they were written, with only the requested fields.
+
+        Returns:
+            Page: The messages and the cursor of the next page.
+
+        Raises:
+            InvalidPageRequest: If the cursor or limit is invalid.
+        """
+        query = db.query(TaskMessage).filter(TaskMessage.task_id == task_id)
+        return paginate(query, [TaskMessage.created_at, TaskMessage.id], MESSAGE_FIELDS, fields, cursor, limit)
+
+    @staticmethod
+    def get_pending_tasks_by_user(db: Session, user_id: int) -> List[Task]:
+        """
+        Fetch the tasks of a user that have not been started yet.
+
+        Args:
+            db (Session): Database session.
+            user_id (int): ID of the user.
+
+        Returns:
+            List[Task]: Tasks in the NEW state, oldest first.
+        """
+        try:
+            return (
+                db.query(Task)
+                .filter(Task.user_id == user_id, Task.status == TaskStatus.NEW)
+                .order_by(Task.id)
+                .all()
+            )
+        except Exception as e:
+            raise Exception(f"Failed to fetch pending tasks for user {user_id}: {str(e)}")
+
     @staticmethod
     def process_tasks(db: Session, user_id: int) -> Tuple[str, str]:
         """
@@ -1,9 +1,23 @@
-from orchestrator.models.base import SessionLocal
-from sqlalchemy.orm import Session
-from services.container_service import ContainerService
+from orchestrator.services.pagination import Field, paginate
+from sqlalchemy.orm import Session, joinedload, selectinload
+from orchestrator.services.container_reconciler import container_reconciler
 from models.user import User
 from models.user import User
 
+USER_FIELDS = {
+    "id": Field(User.id),
+    "name": Field(User.name),
+    "parent_user_id": Field(User.parent_user_id),
+    "group_id": Field(User.group_id),
+    "description": Field(User.description),
+    "vnc_port": Field(User.novnc_port, getter=lambda user: user.novnc_port),
+    "group_name": Field(getter=lambda user: user.group.name if user.group else None,
+                        options=[joinedload(User.group)]),
+    "children": Field(getter=lambda user: [child.id for child in user.children],
+                      options=[selectinload(User.children).load_only(User.id, User.parent_user_id)]),
+}
+USER_DEFAULT_FIELDS = ["id", "name", "parent_user_id", "vnc_port"]
+
 
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -27,23 +41,18 @@ def create_user(
 
 
 def check_and_create_containers():
-    """Check and create containers for all users."""
-    container_service = ContainerService()
-    db = SessionLocal()
-    users = db.query(User).all()
-
-
-    for user in users:
-        if not container_service.find_container_by_user(user):
-            print(f"Container for user '{user.name}' does not exist. Creating one...")
-            container = container_service.create_container(user, db)
-            if container:
-                print(f"Container created successfully for user '{user.name}'.")
-            else:
-                print(f"Failed to create container for user '{user.name}'.")
-        else:
-            print(f"Container for user '{user.name}' already exists.")
+    """Check and create containers for all users, in one pass of the container reconciler."""
+    result = container_reconciler.reconcile()
+    print(f"Containers reconciled: {result}")
+    return result
 
 
 def get_users_by_group(db: Session, group_id: int):
     return db.query(User).filter(User.group_id == group_id).all()
+
+
+def get_users_by_group_page(db: Session, group_id: int, fields, cursor=None, limit=None):
+    """
+    One page of a group's users in creation order, with only the requested fields.
+    """
+    return paginate(db.query(User).filter(User.group_id == group_id), [User.id], USER_FIELDS, fields, cursor, limit)
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+
+import asyncvnc
+
+from orchestrator.services.metrics_service import retries
+from orchestrator.services.runtime import runtime
+
+VNC_HOST = os.getenv("VNC_HOST", "127.0.0.1")
+VNC_POOL_MAX_SIZE = int(os.getenv("VNC_POOL_MAX_SIZE", "256"))
+VNC_POOL_IDLE_TIMEOUT = float(os.getenv("VNC_POOL_IDLE_TIMEOUT", "300"))
+VNC_CONNECT_TIMEOUT = float(os.getenv("VNC_CONNECT_TIMEOUT", "10"))
+
+# Errors that mean the socket is gone and the connection must be rebuilt
+CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+class VNCConnection:
+    """
+    A long-lived VNC client bound to a single user's desktop.
+    """
+
+    def __init__(self, user_id: int, port: int, client: asyncvnc.Client):
+        self.user_id = user_id
+        self.port = port
+        self.client = client
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def is_healthy(self, port: int) -> bool:
+        """
+        Check that the connection still points at the user's current port and the socket is open.
+        """
+        if self.port != port:
+            # The container was recreated with a new port mapping
+            return False
+        if self.client.writer.is_closing() or self.client.reader.at_eof():
+            return False
+        return True
+
+    def is_idle(self, idle_timeout: float) -> bool:
+        return not self.lock.locked() and time.monotonic() - self.last_used > idle_timeout
+
+    async def close(self):
+        try:
+            self.client.writer.close()
+            await self.client.writer.wait_closed()
+        except CONNECTION_ERRORS:
+            pass
+
+
+class VNCConnectionPool:
+    """
+    Pool of persistent VNC connections, one per user.
+
+    Connections are created on first use, reused by every following action, rebuilt when
+    they are found broken or the user's VNC port changed, closed after being idle for
+    ``idle_timeout`` seconds and evicted least-recently-used when the pool is full (connections
+    in use are never evicted, so the pool can briefly hold more than ``max_size``).
+
+    asyncio streams are bound to the loop that opened them, so every VNC action runs on
+    the shared :data:`runtime` loop.
+    """
+
+    def __init__(self, host: str = VNC_HOST, max_size: int = VNC_POOL_MAX_SIZE,
+                 idle_timeout: float = VNC_POOL_IDLE_TIMEOUT, connect_timeout: float = VNC_CONNECT_TIMEOUT):
+        self.host = host
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._connections = OrderedDict()
+        self._connect_locks = defaultdict(asyncio.Lock)
+        runtime.on_start(self.evict_idle_periodically)
+
+    async def evict_idle_periodically(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 1))
+            await self.evict_idle()
+
+    async def _connect(self, user_id: int, port: int) -> VNCConnection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, port), self.connect_timeout
+        )
+        try:
+            client = await asyncio.wait_for(asyncvnc.Client.create(reader, writer), self.connect_timeout)
+        except BaseException:
+            writer.close()
+            raise
+        return VNCConnection(user_id, port, client)
+
+    async def _discard(self, user_id: int, connection: VNCConnection = None):
+        """
+        Close the user's pooled connection; with ``connection``, only if it is still the pooled one.
+        """
+        if connection is not None and self._connections.get(user_id) is not connection:
+            await connection.close()
+            return
+        connection = self._connections.pop(user_id, None)
+        lock = self._connect_locks.get(user_id)
+        if lock is not None and not lock.locked():
+            # Nobody is connecting for this user; a later acquire creates a new lock
+            del self._connect_locks[user_id]
+        if connection:
+            await connection.close()
+
+    async def acquire(self, user_id: int, port: int) -> VNCConnection:
+        """
+        Return a healthy connection for the user, opening a new one if necessary.
+        """
+        # Serialize connection setup per user so concurrent callers share one handshake
+        async with self._connect_locks[user_id]:
+            connection = self._connections.get(user_id)
+            if connection and not connection.is_healthy(port):
+                await self._discard(user_id)
+                connection = None
+
+            if connection is None:
+                connection = await self._connect(user_id, port)
+                self._connections[user_id] = connection
+                await self._evict_overflow(keep=user_id)
+
+        self._connections.move_to_end(user_id)
+        return connection
+
+    async def _evict_overflow(self, keep: int = None):
+        """
+        Close least-recently-used connections until the pool fits ``max_size``.
+
+        Connections in use and the one just opened for ``keep`` are skipped, so the pool may
+        exceed ``max_size`` while more users than that are running actions at the same time.
+        """
+        for user_id, connection in list(self._connections.items()):
+            if len(self._connections) <= self.max_size:
+                break
+            if user_id != keep and not connection.lock.locked():
+                await self._discard(user_id)
+
+    async def evict_idle(self):
+        """
+        Close every connection that has not been used within the idle timeout.
+        """
+        idle = [user_id for user_id, connection in self._connections.items()
+                if connection.is_idle(self.idle_timeout)]
+        for user_id in idle:
+            await self._discard(user_id)
+
+    @asynccontextmanager
+    async def session(self, user_id: int, port: int):
+        """
+        Hold the user's connection exclusively for a sequence of actions.
+
+        Yields:
+            asyncvnc.Client: The connected VNC client.
+        """
+        connection = await self.acquire(user_id, port)
+        async with connection.lock:
+            try:
+                yield connection.client
+                await connection.client.drain()
+            except BaseException:
+                # Whatever interrupted the actions (a dead socket, a cancelled capture, a protocol
+                # error) may have left the RFB stream mid-message; never hand this socket out again
+                await self._discard(user_id, connection)
+                raise
+            finally:
+                connection.last_used = time.monotonic()
+
+    async def execute(self, user_id: int, port: int, action):
+        """
+        Run ``action(client)`` on the user's connection, reconnecting once if the socket was dead.
+        """
+        reused = user_id in self._connections
+        try:
+            async with self.session(user_id, port) as client:
+                return await action(client)
+        except CONNECTION_ERRORS:
+            if not reused:
+                raise
+            # A stale socket is only noticed on use; retry once over a fresh connection
+            retries.inc(operation="vnc.reconnect")
+            async with self.session(user_id, port) as client:
+                return await action(client)
+
+    def run(self, user_id: int, port: int, action, timeout: float = None):
+        """
+        Synchronous wrapper around :meth:`execute` for non-async callers.
+        """
+        return runtime.run(self.execute(user_id, port, action), timeout)
+
+    async def close_all(self):
+        for user_id in list(self._connections):
+            await self._discard(user_id)
+
+    def __len__(self):
+        return len(self._connections)
+
+
+vnc_pool = VNCConnectionPool()
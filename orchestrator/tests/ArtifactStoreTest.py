@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from orchestrator.services.artifact_store import ArtifactStore, derived_digest, image_digest
+from orchestrator.services.frame import Frame
+
+
+def make_frame(value):
+    pixels = np.zeros((48, 64, 3), dtype=np.uint8)
+    pixels[8:16, 8:24] = value
+    return Frame(pixels)
+
+
+class ArtifactStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def store(self, **kwargs):
+        store = ArtifactStore(self.directory, **kwargs)
+        self.addCleanup(store._pool.shutdown)
+        return store
+
+    def test_same_content_is_stored_once(self):
+        store = self.store()
+        first = store.put(make_frame(200))
+        store.flush()
+        second = store.put(make_frame(200))
+        store.flush()
+
+        self.assertEqual(first, second)
+        self.assertEqual(store.stats()["writes"], 1)
+        self.assertEqual(store.stats()["deduplicated"], 1)
+        self.assertTrue(np.array_equal(store.load(first).pixels, make_frame(200).pixels))
+
+    def test_frame_and_image_digests_agree(self):
+        frame = make_frame(90)
+        self.assertEqual(image_digest(frame.image), frame.digest)
+
+    def test_callable_is_only_rendered_when_missing(self):
+        store = self.store()
+        calls = []
+
+        def render():
+            calls.append(1)
+            return make_frame(10).image
+
+        digest = derived_digest("0" * 64, "location", 3, 4)
+        store.put(render, digest)
+        store.flush()
+        store.put(render, digest)
+        store.flush()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(os.path.exists(store.path(digest)))
+
+    def test_retention_by_age_then_size(self):
+        store = self.store(max_age=3600, max_bytes=10 ** 9)
+        digests = [store.put(make_frame(value)) for value in (1, 2, 3)]
+        store.flush()
+        now = time.time()
+        os.utime(store.path(digests[0]), (now - 7200, now - 7200))
+        os.utime(store.path(digests[1]), (now - 60, now - 60))
+
+        self.assertEqual(store.evict(now), 1)
+        self.assertFalse(os.path.exists(store.path(digests[0])))
+
+        store.max_bytes = os.path.getsize(store.path(digests[2]))
+        self.assertEqual(store.evict(now), 1)
+        self.assertFalse(os.path.exists(store.path(digests[1])))
+        self.assertTrue(os.path.exists(store.path(digests[2])))
+
+    def test_invalid_digest_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store().path("../../etc/passwd")
+
+
+if __name__ == '__main__':
+    unittest.main()
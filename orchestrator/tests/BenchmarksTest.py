@@ -0,0 +1,29 @@
+import unittest
+
+from orchestrator.benchmarks import hot_paths
+from orchestrator.benchmarks.fakes import FakeRFBServer
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    """
+    Runs each benchmark group once on a tiny screen, so the suite keeps working as services change.
+    """
+
+    def test_groups_run(self):
+        server = FakeRFBServer(64, 48).start()
+        self.addCleanup(server.stop)
+        results = {}
+        results.update(hot_paths.bench_vnc(server, 2))
+        results.update(hot_paths.bench_encoding(64, 48, 2))
+        results.update(hot_paths.bench_parsing(1))
+        results.update(hot_paths.bench_database(2))
+        results.update(hot_paths.bench_concurrent_writes(2, writers=2, messages=2))
+        results.update(hot_paths.bench_container(2))
+
+        self.assertGreater(server.events, 0)
+        for name, result in results.items():
+            self.assertGreaterEqual(result["mean_ms"], 0, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import threading
+import time
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from orchestrator.models.base import Base
+from orchestrator.models.user import User
+from orchestrator.services.container_reconciler import ContainerReconciler
+from orchestrator.services.container_service import user_id_from_name
+
+
+class FakeContainerService:
+    """
+    Records the Docker calls the reconciler makes; creating a container takes a little while.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = dict(statuses)
+        self.list_calls = 0
+        self.status_calls = 0
+        self.created = []
+        self.started = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def list_user_containers(self):
+        self.list_calls += 1
+        return dict(self.statuses)
+
+    def container_status(self, user_id):
+        self.status_calls += 1
+        return self.statuses.get(user_id)
+
+    def start_container(self, user_id):
+        time.sleep(0.05)
+        self.started.append(user_id)
+        self.statuses[user_id] = "running"
+
+    def create_container(self, user, session):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+            self.created.append(user.id)
+            self.statuses[user.id] = "running"
+        return object()
+
+
+class ContainerReconcilerTestCase(unittest.TestCase):
+    def setUp(self):
+        # One shared connection, so the reconciler's worker threads see the same in-memory database
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        with self.session_factory() as db:
+            db.add_all([User(name=f"user {index}") for index in range(6)])
+            db.commit()
+
+    def reconciler(self, statuses, workers=2, **kwargs):
+        service = FakeContainerService(statuses)
+        reconciler = ContainerReconciler(service, self.session_factory, workers=workers, **kwargs)
+        self.addCleanup(reconciler._executor.shutdown)
+        self.addCleanup(reconciler.stop)
+        return reconciler, service
+
+    def wait_idle(self, reconciler):
+        deadline = time.monotonic() + 5
+        while reconciler.stats()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_one_listing_and_bounded_parallel_fixes(self):
+        reconciler, service = self.reconciler({1: "running", 2: "exited", 99: "running"})
+        result = reconciler.reconcile()
+
+        self.assertEqual(service.list_calls, 1)
+        self.assertEqual(service.started, [2])
+        self.assertEqual(sorted(service.created), [3, 4, 5, 6])
+        self.assertEqual(service.max_active, 2)
+        self.assertEqual(result, {"users": 6, "created": 4, "started": 1, "orphans": 1})
+
+        self.assertEqual(reconciler.reconcile()["created"], 0)
+
+    def test_events_fix_only_the_affected_user(self):
+        reconciler, service = self.reconciler({user_id: "running" for user_id in range(1, 7)})
+        service.statuses.pop(3)
+        reconciler.handle_event({"Action": "destroy", "Actor": {"Attributes": {"name": "orchestrator_container_3"}}})
+        reconciler.handle_event({"Action": "destroy", "Actor": {"Attributes": {"name": "unrelated"}}})
+        self.wait_idle(reconciler)
+
+        self.assertEqual(service.created, [3])
+        self.assertEqual(service.list_calls, 0)
+
+    def test_event_during_a_fix_runs_it_again(self):
+        reconciler, service = self.reconciler({})
+
+        reconciler._ensure(4, "exited")
+        reconciler.handle_event({"Action": "die", "Actor": {"Attributes": {"name": "orchestrator_container_4"}}})
+        self.wait_idle(reconciler)
+        # The second run finds the container running and leaves it alone
+        self.assertEqual(service.started, [4])
+        self.assertEqual(service.status_calls, 1)
+
+    def test_crash_looping_container_waits_for_the_restart_window(self):
+        reconciler, service = self.reconciler({}, restart_limit=2, restart_window=0.3)
+        die = {"Action": "die", "Actor": {"Attributes": {"name": "orchestrator_container_4"}}}
+        for _ in range(3):
+            service.statuses[4] = "exited"
+            reconciler.handle_event(die)
+            self.wait_idle(reconciler)
+        # The third die event is held back until the first restart leaves the window
+        self.assertEqual(service.started, [4, 4])
+        self.assertEqual(reconciler.stats()["delayed"], 1)
+
+        deadline = time.monotonic() + 5
+        while len(service.started) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(service.started, [4, 4, 4])
+        self.assertEqual(reconciler.stats()["delayed"], 0)
+
+    def test_container_names(self):
+        self.assertEqual(user_id_from_name("/orchestrator_container_12"), 12)
+        self.assertIsNone(user_id_from_name("/orchestrator_container_12_old"))
+        self.assertIsNone(user_id_from_name("/other_orchestrator_container_12"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from orchestrator.services.context_service import ContextPolicy, ConversationContext, estimate_tokens
+
+
+def history(steps):
+    messages = [{"role": "system", "content": "OBJECTIVE: Install Telegram"}]
+    for step in range(steps):
+        messages.append({"role": "user", "content": f"THOUGHT: screen {step} " + "x" * 400})
+        messages.append({"role": "assistant", "content": f"OBSERVATION: step {step} done"})
+    return messages
+
+
+class ContextServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.summarized = []
+
+        async def summarizer(previous, messages, max_tokens):
+            self.summarized.append(len(messages))
+            return f"{previous or ''} {len(messages)} messages".strip()
+
+        self.policy = ContextPolicy(max_tokens=1000, recent_messages=4)
+        self.context = ConversationContext(self.policy, summarizer)
+
+    def wait_summary(self):
+        self.context._pending.result(timeout=5)
+
+    def test_short_history_is_sent_unchanged(self):
+        messages = history(2)
+        self.assertEqual(self.context.build(messages), messages)
+
+    def test_old_steps_are_rolled_into_summary(self):
+        messages = history(10)
+        self.context.build(messages)
+        self.wait_summary()
+        built = self.context.build(messages)
+
+        self.assertEqual(built[0], messages[0])
+        self.assertEqual(built[1]["content"], "SUMMARY OF EARLIER STEPS: 16 messages")
+        self.assertEqual(built[2:], messages[-4:])
+        self.assertEqual(self.summarized, [16])
+
+        # Only the messages that left the window since are summarized next
+        messages = history(11)
+        self.context.build(messages)
+        self.wait_summary()
+        self.assertEqual(self.summarized, [16, 2])
+
+    def test_prompt_stays_within_budget_while_summary_is_pending(self):
+        for steps in (5, 20, 50):
+            built = self.context.build(history(steps))
+            self.assertLessEqual(sum(estimate_tokens(m) for m in built), self.policy.max_tokens)
+            self.assertEqual(built[-1], history(steps)[-1])
+
+    def test_long_message_is_truncated(self):
+        messages = history(0) + [{"role": "user", "content": "OBSERVATION: " + "y" * 100000}]
+        built = self.context.build(messages)
+        self.assertLessEqual(estimate_tokens(built[-1]), self.policy.message_max_tokens + 20)
+        self.assertIn("characters omitted", built[-1]["content"])
+
+
+if __name__ == '__main__':
+    unittest.main()
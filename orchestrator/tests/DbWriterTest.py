@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from orchestrator.models.base import Base, create_db_engine
+from orchestrator.models.task import Task, TaskMessage, TaskStatus
+from orchestrator.services.db_writer import BatchedWriter
+
+
+class DbWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(directory.name, 'test.db')}", echo=False)
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as session:
+            tasks = [Task(description=f"task {index}") for index in range(8)]
+            session.add_all(tasks)
+            session.commit()
+            self.task_ids = [task.id for task in tasks]
+
+    def test_sqlite_runs_in_wal_mode(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+
+    def test_concurrent_appends_are_grouped_into_few_commits(self):
+        writer = BatchedWriter(session_factory=self.Session, interval_ms=20)
+
+        def append(task_id):
+            futures = [writer.append_message(task_id, f'"{index}"') for index in range(25)]
+            for future in futures:
+                future.result()
+
+        threads = [threading.Thread(target=append, args=(task_id,)) for task_id in self.task_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self.Session() as session:
+            self.assertEqual(session.query(TaskMessage).count(), 200)
+            rows = session.query(TaskMessage).filter(TaskMessage.task_id == self.task_ids[0]).order_by(TaskMessage.id)
+            self.assertEqual([row.content for row in rows], [f'"{index}"' for index in range(25)])
+        self.assertLess(writer.stats()["batches"], 200)
+
+    def test_last_status_in_a_batch_wins_and_flush_waits(self):
+        writer = BatchedWriter(session_factory=self.Session, interval_ms=50)
+        writer.set_task_status(self.task_ids[0], TaskStatus.IN_PROGRESS)
+        writer.set_task_status(self.task_ids[0], TaskStatus.FINISH)
+        writer.flush(timeout=5)
+
+        with self.Session() as session:
+            self.assertEqual(session.get(Task, self.task_ids[0]).status, TaskStatus.FINISH)
+
+    def test_failed_batch_fails_its_futures(self):
+        writer = BatchedWriter(session_factory=self.Session)
+        future = writer.append_message(self.task_ids[0], None)  # content is NOT NULL
+        with self.assertRaises(Exception):
+            future.result(timeout=5)
+        self.assertEqual(writer.stats()["failed"], 1)
+
+    def test_a_bad_row_does_not_fail_other_tasks_in_its_batch(self):
+        writer = BatchedWriter(session_factory=self.Session, interval_ms=100)
+        good_task, bad_task = self.task_ids[:2]
+        futures = [
+            writer.append_message(good_task, '"before"'),
+            writer.append_message(bad_task, None),
+            writer.set_task_status(good_task, TaskStatus.FINISH),
+            writer.append_message(good_task, '"after"'),
+        ]
+        with self.assertRaises(Exception):
+            futures[1].result(timeout=5)
+        for future in futures[:1] + futures[2:]:
+            future.result(timeout=5)
+
+        with self.Session() as session:
+            rows = session.query(TaskMessage).filter(TaskMessage.task_id == good_task).order_by(TaskMessage.id)
+            self.assertEqual([row.content for row in rows], ['"before"', '"after"'])
+            self.assertEqual(session.query(TaskMessage).filter(TaskMessage.task_id == bad_task).count(), 0)
+            self.assertEqual(session.get(Task, good_task).status, TaskStatus.FINISH)
+        self.assertEqual(writer.stats()["failed"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
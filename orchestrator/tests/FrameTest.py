@@ -0,0 +1,42 @@
+import os
+import unittest
+
+import numpy as np
+
+from orchestrator.services.encoding_profiles import EncodingProfile
+from orchestrator.services.frame import Frame
+
+
+class FrameTestCase(unittest.TestCase):
+    def setUp(self):
+        pixels = np.random.randint(0, 255, (48, 64, 4), dtype=np.uint8)
+        self.frame = Frame(pixels, user_id=1)
+
+    def test_encode_is_cached_per_format(self):
+        png = self.frame.encode("PNG")
+        self.assertIs(png, self.frame.png)
+        self.assertIsNot(png, self.frame.encode("JPEG", quality=80))
+
+    def test_png_round_trip(self):
+        decoded = Frame.from_bytes(self.frame.png)
+        self.assertEqual(decoded.size, (64, 48))
+        self.assertTrue((decoded.pixels == self.frame.pixels).all())
+
+    def test_profile_downscales_and_maps_back(self):
+        frame = Frame(np.zeros((500, 1536, 3), dtype=np.uint8))
+        encoded = frame.encode_for(EncodingProfile(format="JPEG", max_width=768))
+        self.assertEqual(encoded.size, (768, 250))
+        self.assertEqual(encoded.media_type, "image/jpeg")
+        self.assertEqual(encoded.to_native(384, 125), (768, 250))
+        self.assertIs(encoded, frame.encode_for(EncodingProfile(format="JPEG", max_width=768)))
+
+    def test_to_file_writes_once(self):
+        path = self.frame.to_file()
+        self.assertEqual(path, self.frame.to_file())
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.frame.png)
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import atexit
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from orchestrator.services.frame import Frame
+from orchestrator.services.grounding_cache import GroundingCache
+
+
+class FakeGrounding:
+    def __init__(self, model=None):
+        self.model = model
+
+
+class GroundingCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pixels = np.full((480, 640, 3), 200, dtype=np.uint8)
+        self.cache = GroundingCache(max_entries=2, ttl=60, path="")
+        self.model = FakeGrounding()
+
+    def test_normalized_query_hits(self):
+        self.cache.store("Terminal icon", Frame(self.pixels), self.model, (10, 490))
+        self.assertEqual(self.cache.lookup("  terminal   ICON.", Frame(self.pixels.copy()), self.model), (10, 490))
+        self.assertIsNone(self.cache.lookup("firefox icon", Frame(self.pixels), self.model))
+
+    def test_changed_screen_misses(self):
+        self.cache.store("ok button", Frame(self.pixels), self.model, (320, 240))
+        dialog = self.pixels.copy()
+        dialog[100:300, 100:500] = 30
+        self.assertIsNone(self.cache.lookup("ok button", Frame(dialog), self.model))
+
+    def test_slightly_moved_button_misses(self):
+        screen = self.pixels.copy()
+        screen[230:250, 300:340] = 90
+        self.cache.store("ok button", Frame(screen), self.model, (320, 240))
+        moved = self.pixels.copy()
+        moved[230:250, 303:343] = 90
+        self.assertIsNone(self.cache.lookup("ok button", Frame(moved), self.model))
+
+    def test_other_grounding_model_misses(self):
+        self.cache.store("ok button", Frame(self.pixels), FakeGrounding("qwen-2.5-vl"), (320, 240))
+        self.assertEqual(self.cache.lookup("ok button", Frame(self.pixels), FakeGrounding("qwen-2.5-vl")), (320, 240))
+        self.assertIsNone(self.cache.lookup("ok button", Frame(self.pixels), FakeGrounding("qwen-2-vl")))
+        self.assertIsNone(self.cache.lookup("ok button", Frame(self.pixels), self.model))
+
+    def test_lru_eviction(self):
+        for i, query in enumerate(["a", "b", "c"]):
+            self.cache.store(query, Frame(self.pixels), self.model, (i, i))
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.lookup("a", Frame(self.pixels), self.model))
+
+    def test_persistence(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "grounding.json")
+        cache = GroundingCache(path=path)
+        cache.store("menu", Frame(self.pixels), self.model, (5, 6))
+        cache.save()
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)[0]["position"], [5, 6])
+        loaded = GroundingCache(path=path)
+        for saved in (cache, loaded):
+            atexit.unregister(saved.save)
+        self.assertEqual(loaded.lookup("menu", Frame(self.pixels), self.model), (5, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+from orchestrator.services.command_service import CommandService
+from orchestrator.services.metrics_service import metrics
+
+
+class FakeDevice:
+    def __init__(self, log, device):
+        self.log = log
+        self.device = device
+
+    def __getattr__(self, name):
+        return lambda *args: self.log.append((self.device, name) + args)
+
+
+class FakeClient:
+    def __init__(self):
+        self.log = []
+        self.mouse = FakeDevice(self.log, "mouse")
+        self.keyboard = FakeDevice(self.log, "keyboard")
+        self.writer = FakeDevice(self.log, "writer")
+
+    async def drain(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.client = FakeClient()
+        self.sessions = 0
+
+    @asynccontextmanager
+    async def session(self, user_id, port):
+        self.sessions += 1
+        yield self.client
+
+
+class GuiBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = FakePool()
+        patches = [
+            mock.patch("orchestrator.services.command_service.vnc_pool", self.pool),
+            mock.patch.object(CommandService, "get_vnc_port", staticmethod(lambda user_id: 5901)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_actions_share_one_session(self):
+        results = CommandService.run_actions([
+            {"type": "click", "x": 10, "y": 20},
+            {"type": "key", "name": "Ctrl+L"},
+            {"type": "type", "text": "ls"},
+        ], 1, settle_ms=0)
+
+        self.assertEqual(self.pool.sessions, 1)
+        self.assertTrue(all(result["ok"] for result in results))
+        self.assertEqual(results[2]["result"], "keys")
+        self.assertEqual(self.pool.client.log[:3], [
+            ("mouse", "move", 10, 20), ("mouse", "click"), ("keyboard", "press", "Ctrl", "L"),
+        ])
+
+    def test_batch_sizes_share_one_latency_series(self):
+        for size in (1, 3):
+            CommandService.run_actions([{"type": "key", "name": "Escape"}] * size, 1, settle_ms=0)
+
+        calls = [line for line in metrics.render().splitlines()
+                 if line.startswith('orchestrator_span_calls_total{span="vnc.batch"')]
+        self.assertEqual(len(calls), 1)
+        self.assertIn('orchestrator_vnc_batch_actions_bucket{le="4"}', metrics.render())
+
+    def test_actions_after_a_failure_are_skipped(self):
+        results = CommandService.run_actions([
+            {"type": "scroll"},
+            {"type": "click"},
+        ], 1, settle_ms=0)
+
+        self.assertEqual([result["ok"] for result in results], [False, False])
+        self.assertIn("Unknown action type", results[0]["error"])
+        self.assertEqual(self.pool.client.log, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from orchestrator.models.base import create_db_engine, init_db
+from orchestrator.models.task import Task, TaskMessage
+
+# task_messages as created before messages referenced stored artifacts
+OLD_TASK_MESSAGES = """
+CREATE TABLE task_messages (
+    id INTEGER NOT NULL PRIMARY KEY,
+    content VARCHAR NOT NULL,
+    created_at DATETIME,
+    task_id INTEGER REFERENCES tasks (id)
+)
+"""
+
+
+class InitDbTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = create_db_engine(f"sqlite:///{os.path.join(directory.name, 'old.db')}", echo=False)
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            connection.execute(text(OLD_TASK_MESSAGES))
+            connection.execute(text("INSERT INTO task_messages (content, task_id) VALUES ('\"old\"', 1)"))
+
+    def test_missing_columns_and_indexes_are_added_to_an_old_schema(self):
+        init_db(self.engine)
+        init_db(self.engine)  # a second start finds nothing to add
+
+        inspector = inspect(self.engine)
+        self.assertIn("artifact_digest", {column["name"] for column in inspector.get_columns("task_messages")})
+        self.assertIn("ix_task_messages_task_id_created_at",
+                      {index["name"] for index in inspector.get_indexes("task_messages")})
+
+        with sessionmaker(bind=self.engine)() as db:
+            db.add(Task(description="task"))
+            db.add(TaskMessage(task_id=1, content='"new"', artifact_digest="ab" * 32))
+            db.commit()
+            messages = db.query(TaskMessage).order_by(TaskMessage.id).all()
+            self.assertEqual([(message.content, message.artifact_digest) for message in messages],
+                             [('"old"', None), ('"new"', "ab" * 32)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import unittest
+
+from orchestrator.services.metrics_service import (
+    MetricsRegistry, Trace, current_step, current_trace, metrics, record_span, span,
+)
+from orchestrator.services.runtime import runtime
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.counter("test_calls_total", "Calls.").inc(2, span="vnc.action")
+        registry.histogram("test_seconds", "Latency.").observe(0.02, span="vnc.action")
+        registry.register_collector(lambda: {"test_queue_depth": ("Queue depth.", 3)})
+
+        text = registry.render()
+        self.assertIn('test_calls_total{span="vnc.action"} 2', text)
+        self.assertIn('test_seconds_bucket{span="vnc.action",le="0.025"} 1', text)
+        self.assertIn('test_seconds_bucket{span="vnc.action",le="0.01"} 0', text)
+        self.assertIn('test_seconds_count{span="vnc.action"} 1', text)
+        self.assertIn("# TYPE test_queue_depth gauge\ntest_queue_depth 3", text)
+
+    def test_span_records_errors_and_reraises(self):
+        with self.assertRaises(ValueError):
+            with span("test.failing", "target"):
+                raise ValueError("boom")
+        self.assertIn('orchestrator_span_errors_total{span="test.failing",target="target"} 1', metrics.render())
+
+    def test_timeline_groups_spans_by_step(self):
+        trace = Trace(task_id=7)
+        token = current_trace.set(trace)
+        try:
+            for step in (1, 2):
+                current_step.set(step)
+                started = time.perf_counter()
+                with span("step.vision"):
+                    pass
+                record_span("step", started, 0.5)
+        finally:
+            current_trace.reset(token)
+            current_step.set(None)
+
+        timeline = trace.as_dict()
+        self.assertEqual([step["step"] for step in timeline["steps"]], [1, 2])
+        self.assertEqual(timeline["steps"][0]["seconds"], 0.5)
+        self.assertEqual([span["name"] for span in timeline["steps"][0]["spans"]], ["step.vision", "step"])
+
+    def test_trace_follows_work_onto_the_runtime(self):
+        trace = Trace(task_id=8)
+        token = current_trace.set(trace)
+        try:
+            async def request():
+                await runtime.to_thread(lambda: record_span("test.io", time.perf_counter(), 0.01))
+
+            runtime.run(request())
+        finally:
+            current_trace.reset(token)
+
+        self.assertEqual([span["name"] for span in trace.spans], ["test.io"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from orchestrator.services import replay_service
+from orchestrator.services.frame import Frame
+from orchestrator.services.replay_service import ModelReplay, ReplayMissError, recorded
+
+
+class FakeProvider:
+    model = "fake-1"
+
+    def __init__(self):
+        self.calls = 0
+        self.response = ("answer", [{"name": "stop", "parameters": {}}])
+
+    @recorded
+    def call(self, messages, functions=None):
+        self.calls += 1
+        return self.response
+
+    @recorded
+    async def acall(self, messages, functions=None):
+        self.calls += 1
+        return self.response
+
+
+class ModelReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.provider = FakeProvider()
+        self.pixels = np.zeros((60, 80, 3), dtype=np.uint8)
+
+    def use(self, mode):
+        patch = mock.patch.object(replay_service, "model_replay", ModelReplay(mode, self.directory))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def messages(self, pixels):
+        return [{"role": "user", "content": [Frame(pixels), "What is on the screen?"]}]
+
+    def test_recorded_response_is_replayed(self):
+        self.use("record")
+        self.provider.call(self.messages(self.pixels), {"stop": {}})
+        self.use("replay")
+        # Same pixels in a new frame, and the async method, hit the same recording
+        response = asyncio.run(self.provider.acall(self.messages(self.pixels.copy()), {"stop": {}}))
+        self.assertEqual(response, ("answer", [{"name": "stop", "parameters": {}}]))
+        self.assertEqual(self.provider.calls, 1)
+
+    def test_failed_request_is_not_recorded(self):
+        self.use("auto")
+        self.provider.response = ("", [])  # what a provider returns after swallowing an error
+        asyncio.run(self.provider.acall(self.messages(self.pixels)))
+        self.provider.response = ("answer", [])
+        self.assertEqual(self.provider.call(self.messages(self.pixels)), ("answer", []))
+        self.assertEqual(self.provider.calls, 2)
+        self.assertEqual(replay_service.model_replay.stats()["recorded"], 1)
+
+    def test_replay_miss_raises(self):
+        self.use("record")
+        self.provider.call(self.messages(self.pixels))
+        self.use("replay")
+        changed = self.pixels.copy()
+        changed[0, 0] = 255
+        with self.assertRaises(ReplayMissError):
+            self.provider.call(self.messages(changed))
+
+    def test_auto_records_misses(self):
+        self.use("auto")
+        self.provider.call(self.messages(self.pixels))
+        self.provider.call(self.messages(self.pixels))
+        self.assertEqual(self.provider.calls, 1)
+        self.assertEqual(replay_service.model_replay.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
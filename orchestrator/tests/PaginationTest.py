@@ -0,0 +1,96 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from orchestrator.models.base import Base
+from orchestrator.models.task import Task, TaskMessage, TaskStatus
+from orchestrator.models.user import User
+from orchestrator.services.pagination import InvalidPageRequest, select_fields
+from orchestrator.services.task_service import TASK_FIELDS, TaskService
+
+
+class PaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.db.close)
+
+        self.user = User(name="alice")
+        self.db.add(self.user)
+        self.db.flush()
+        statuses = [TaskStatus.NEW, TaskStatus.FINISH]
+        self.tasks = [Task(description=f"task {index}", user_id=self.user.id, status=statuses[index % 2])
+                      for index in range(7)]
+        self.db.add_all(self.tasks)
+        self.db.flush()
+        self.tasks[1].parent_task_id = self.tasks[0].id
+        started = datetime(2025, 1, 1)
+        # Two messages share a timestamp, so the id breaks the tie
+        for index, offset in enumerate([0, 1, 1, 2, 3]):
+            self.db.add(TaskMessage(task_id=self.tasks[0].id, created_at=started + timedelta(seconds=offset),
+                                    content=json.dumps({"role": "user", "content": f"message {index}"})))
+        self.db.commit()
+
+    def count_queries(self):
+        queries = []
+        listener = lambda *args: queries.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", listener)
+        return queries
+
+    def test_pages_cover_all_tasks_once(self):
+        ids, cursor = [], None
+        while True:
+            page = TaskService.get_tasks_page(self.db, self.user.id, ["id"], cursor, limit=3)
+            ids.extend(item["id"] for item in page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(ids, [task.id for task in self.tasks])
+
+    def test_status_filter_and_fields(self):
+        page = TaskService.get_tasks_page(self.db, self.user.id, ["id", "status"], status="finish")
+        self.assertEqual([item["status"] for item in page.items], ["finish"] * 3)
+        self.assertEqual(set(page.items[0]), {"id", "status"})
+        with self.assertRaises(InvalidPageRequest):
+            TaskService.get_tasks_page(self.db, self.user.id, ["id"], status="unknown")
+
+    def test_related_fields_do_not_query_per_row(self):
+        user_id, child_id = self.user.id, self.tasks[1].id
+        self.db.expunge_all()
+        queries = self.count_queries()
+        page = TaskService.get_tasks_page(self.db, user_id, ["id", "user_name", "child_task_ids"])
+        self.assertEqual(page.items[0]["user_name"], "alice")
+        self.assertEqual(page.items[0]["child_task_ids"], [child_id])
+        self.assertEqual(len(queries), 2)
+
+    def test_messages_page_in_written_order(self):
+        first = TaskService.get_messages_page(self.db, self.tasks[0].id, ["content"], limit=2)
+        second = TaskService.get_messages_page(self.db, self.tasks[0].id, ["content", "role"], first.next_cursor)
+        self.assertEqual([item["content"] for item in first.items + second.items],
+                         [f"message {index}" for index in range(5)])
+        self.assertEqual(second.items[0]["role"], "user")
+        self.assertIsNone(second.next_cursor)
+
+    def test_invalid_requests(self):
+        with self.assertRaises(InvalidPageRequest):
+            TaskService.get_messages_page(self.db, self.tasks[0].id, ["id"], cursor="not-a-cursor")
+        with self.assertRaises(InvalidPageRequest):
+            select_fields(TASK_FIELDS, "id,secret", ["id"])
+        with self.assertRaises(InvalidPageRequest):
+            TaskService.get_tasks_page(self.db, self.user.id, ["id"], limit=0)
+
+    def test_message_pages_use_the_composite_index(self):
+        plan = self.db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM task_messages WHERE task_id = 1 ORDER BY created_at, id"
+        )).fetchall()
+        self.assertIn("ix_task_messages_task_id_created_at", " ".join(str(row) for row in plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
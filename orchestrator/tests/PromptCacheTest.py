@@ -0,0 +1,51 @@
+import unittest
+from types import SimpleNamespace
+
+from orchestrator.services.llm_provider import AnthropicBaseProvider, OpenAIBaseProvider, prompt_cache_stats
+
+tools = {
+    "click": {"description": "Click on an item.", "params": {"query": "The item to click."}},
+    "stop": {"description": "Stop.", "params": {}},
+}
+
+
+class PromptCacheTestCase(unittest.TestCase):
+    def test_system_messages_lead_the_request(self):
+        provider = OpenAIBaseProvider("gpt")
+        request = provider.completion_request([
+            {"role": "system", "content": "You are an AI assistant."},
+            {"role": "user", "content": "THOUGHT: 1"},
+            {"role": "system", "content": "OBJECTIVE: Install Telegram"},
+        ])
+        self.assertEqual([m["role"] for m in request["messages"]], ["system", "system", "user"])
+
+    def test_anthropic_marks_tools_and_system_for_caching(self):
+        provider = AnthropicBaseProvider("claude")
+        messages, kwargs = provider.request_kwargs([
+            {"role": "system", "content": "OBJECTIVE: Install Telegram"},
+            {"role": "user", "content": "THOUGHT: 1"},
+        ], tools)
+        self.assertEqual(messages, [{"role": "user", "content": "THOUGHT: 1"}])
+        self.assertEqual(kwargs["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(kwargs["tools"][-1]["cache_control"], {"type": "ephemeral"})
+        self.assertNotIn("cache_control", kwargs["tools"][0])
+
+    def test_cached_tokens_are_recorded(self):
+        provider = AnthropicBaseProvider("claude-test")
+        usage = SimpleNamespace(input_tokens=10, cache_read_input_tokens=1500, cache_creation_input_tokens=0,
+                                output_tokens=40)
+        provider.check_completion(SimpleNamespace(usage=usage, content=[]))
+
+        provider = OpenAIBaseProvider("gpt-test")
+        usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=30,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+        provider.check_completion(SimpleNamespace(usage=usage, choices=[]))
+
+        stats = prompt_cache_stats.as_dict()
+        self.assertEqual(stats["AnthropicBaseProvider:claude-test"]["cached_tokens"], 1500)
+        self.assertEqual(stats["AnthropicBaseProvider:claude-test"]["input_tokens"], 1510)
+        self.assertEqual(stats["OpenAIBaseProvider:gpt-test"]["cached_ratio"], 0.512)
+
+
+if __name__ == '__main__':
+    unittest.main()
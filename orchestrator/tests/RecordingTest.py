@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from orchestrator.services.frame import Frame
+from orchestrator.services.recording_service import (
+    RecordingReader, SessionRecorder, multipart_frames, to_timestamp,
+)
+
+
+def make_frames(count):
+    frames = []
+    pixels = np.zeros((70, 100, 3), dtype=np.uint8)
+    for index in range(count):
+        pixels = pixels.copy()
+        pixels[(index * 7) % 60:(index * 7) % 60 + 5, 90:100] = 255 - index  # touches the edge tiles
+        frames.append(Frame(pixels, captured_at=1000.0 + index))
+    return frames
+
+
+class RecordingTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "task_1.rec")
+
+    def record(self, frames, **kwargs):
+        recorder = SessionRecorder(self.path, tile=16, **kwargs)
+        for index, frame in enumerate(frames):
+            recorder.add(frame, step=index // 2 + 1)
+        recorder.close()
+        return recorder
+
+    def test_every_frame_is_restored_exactly(self):
+        frames = make_frames(9)
+        self.record(frames, keyframe_interval=4)
+        reader = RecordingReader(self.path)
+
+        entries = reader.index()
+        self.assertEqual(len(entries), 9)
+        self.assertEqual([entry.kind == 0 for entry in entries][:6], [True, False, False, False, False, True])
+        for position in (8, 0, 3, 6):
+            entry, pixels = reader.frame_at(position)
+            self.assertTrue(np.array_equal(pixels, frames[position].pixels), position)
+            self.assertEqual(entry.timestamp, frames[position].captured_at)
+
+    def test_deltas_are_smaller_than_keyframes(self):
+        recorder = self.record(make_frames(6), keyframe_interval=100)
+        entries = RecordingReader(self.path).index()
+        self.assertTrue(all(entry.length < entries[0].length for entry in entries[1:]))
+        self.assertEqual(recorder.frames, 6)
+
+    def test_seek_by_step_and_message_time(self):
+        self.record(make_frames(6))
+        reader = RecordingReader(self.path)
+        self.assertEqual(reader.seek_step(2), 2)
+        with self.assertRaises(LookupError):
+            reader.seek_step(10)
+        created_at = datetime.utcfromtimestamp(1003.5)
+        self.assertEqual(reader.seek_time(to_timestamp(created_at)), 3)
+
+    def test_a_cut_record_is_dropped_and_recording_continues(self):
+        frames = make_frames(4)
+        self.record(frames[:3])
+        with open(self.path, "ab") as f:
+            f.write(b"\x01partial")
+        self.assertEqual(len(RecordingReader(self.path).index()), 3)
+
+        self.record(frames[3:])
+        reader = RecordingReader(self.path)
+        self.assertEqual(len(reader.index()), 4)
+        self.assertTrue(np.array_equal(reader.frame_at(3)[1], frames[3].pixels))
+
+    def test_multipart_stream(self):
+        self.record(make_frames(4))
+        parts = list(multipart_frames(RecordingReader(self.path), start=2, image_format="PNG"))
+        self.assertEqual(len(parts), 2)
+        self.assertTrue(parts[0].startswith(b"--frame\r\nContent-Type: image/png\r\n"))
+        self.assertIn(b"X-Step: 2\r\n", parts[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
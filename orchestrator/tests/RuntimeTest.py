@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import threading
+import unittest
+
+from orchestrator.services.runtime import AsyncRuntime
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class RuntimeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runtime = AsyncRuntime(io_threads=2)
+        self.addCleanup(self.runtime.stop)
+
+    def test_context_variables_reach_the_loop_and_io_threads(self):
+        async def read():
+            in_thread = await self.runtime.to_thread(request_id.get)
+            return request_id.get(), in_thread, threading.current_thread().name
+
+        token = request_id.set("task-7")
+        try:
+            value, in_thread, thread_name = self.runtime.run(read(), timeout=5)
+            submitted = self.runtime.submit(read()).result(5)
+        finally:
+            request_id.reset(token)
+        self.assertEqual((value, in_thread, thread_name), ("task-7", "task-7", "async-runtime"))
+        self.assertEqual(submitted[:2], ("task-7", "task-7"))
+        # Values set on the loop do not leak back into the caller
+        self.assertIsNone(request_id.get())
+
+    def test_start_hooks_run_before_and_after_start(self):
+        started = []
+        first, second = threading.Event(), threading.Event()
+
+        async def before():
+            started.append("before")
+            first.set()
+
+        async def after():
+            started.append("after")
+            second.set()
+
+        self.runtime.on_start(before)
+        self.runtime.run(asyncio.sleep(0), timeout=5)
+        self.runtime.on_start(after)
+        self.assertTrue(first.wait(5) and second.wait(5))
+        self.assertEqual(started, ["before", "after"])
+
+    def test_exceptions_reach_the_caller(self):
+        async def fail():
+            raise KeyError("missing")
+
+        def fail_in_thread():
+            raise ValueError("blocking call failed")
+
+        with self.assertRaises(KeyError):
+            self.runtime.run(fail(), timeout=5)
+        with self.assertRaises(ValueError):
+            self.runtime.run(self.runtime.to_thread(fail_in_thread), timeout=5)
+        with self.assertRaises(KeyError):
+            self.runtime.submit(fail()).result(5)
+
+    def test_run_inside_the_loop_raises_instead_of_deadlocking(self):
+        async def nested():
+            self.runtime.run(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            self.runtime.run(nested(), timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from orchestrator.services.frame import Frame
+from orchestrator.services.screen_cache import ScreenDescriptionCache
+
+
+class ScreenDescriptionCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pixels = np.full((480, 640, 3), 200, dtype=np.uint8)
+        self.cache = ScreenDescriptionCache(pixel_threshold=8, changed_ratio=0.0005)
+
+    def test_identical_screen_is_a_hit(self):
+        self.assertIsNone(self.cache.lookup(Frame(self.pixels)))
+        self.cache.store(Frame(self.pixels), "a desktop")
+        self.assertEqual(self.cache.lookup(Frame(self.pixels.copy())), "a desktop")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_typed_text_is_a_miss(self):
+        self.cache.store(Frame(self.pixels), "an empty terminal")
+        typed = self.pixels.copy()
+        typed[100:116, 40:120] = 0  # a short word worth of dark glyphs
+        self.assertIsNone(self.cache.lookup(Frame(typed)))
+
+    def test_small_change_is_a_miss_by_default(self):
+        cache = ScreenDescriptionCache()
+        cache.store(Frame(self.pixels), "a form with an empty name field")
+        typed = self.pixels.copy()
+        typed[300:310, 500:506] = 0  # one typed character
+        self.assertIsNone(cache.lookup(Frame(typed)))
+        caret = self.pixels.copy()
+        caret[300:312, 520] = 0  # the caret moved by one position
+        self.assertIsNone(cache.lookup(Frame(caret)))
+        self.assertEqual(cache.lookup(Frame(self.pixels.copy())), "a form with an empty name field")
+
+    def test_single_block_flicker_is_a_hit_when_tolerated(self):
+        self.cache.store(Frame(self.pixels), "a terminal")
+        blink = self.pixels.copy()
+        blink[200:208, 16:24] = 0  # cursor blink inside one block
+        self.assertEqual(self.cache.lookup(Frame(blink)), "a terminal")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Cold-start budget for `import orchestrator.app`, in seconds
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", "1.5"))
+
+HEAVY_MODULES = ("gradio_client", "g4f", "openai", "anthropic", "docker")
+
+STARTUP_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import orchestrator.app
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+class StartupTestCase(unittest.TestCase):
+    def test_app_cold_start(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"orchestrator.app cold start: {result['seconds']:.3f}s")
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["seconds"], COLD_START_TARGET_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
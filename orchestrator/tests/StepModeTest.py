@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from orchestrator.models.task import Task
+from orchestrator.services import config_service, processor_service
+from orchestrator.services.artifact_store import ArtifactStore
+from orchestrator.services.frame import Frame
+from orchestrator.services.metrics_service import current_step
+from orchestrator.services.processor_service import ProcessorService, tool_label
+
+
+class FakeModel:
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    async def acall(self, messages, functions=None):
+        self.requests.append((messages, functions))
+        return self.response
+
+
+class StepModeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.task = Task(description="Open the terminal", user_id=1)
+        self.frame = Frame(np.zeros((60, 80, 3), dtype=np.uint8))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = ArtifactStore(directory.name)
+        self.addCleanup(store.flush)
+        patcher = mock.patch.object(processor_service, "artifact_store", store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def processor(self, mode):
+        processor = ProcessorService(None, self.task, step_mode=mode)
+        processor.pipeline.take_screenshot = lambda profile=None: self.frame
+        return processor
+
+    def test_fused_step_is_one_request_with_screen_and_tools(self):
+        step_model = FakeModel(("A terminal icon is visible.", [{"name": "click", "parameters": {"query": "terminal"}}]))
+        with mock.patch.object(config_service.registry, "get", lambda role: {"step_model": step_model}[role]):
+            content, tool_calls = self.processor("fused").fused_step(1)
+
+        self.assertEqual(content, "A terminal icon is visible.")
+        self.assertEqual(tool_calls[0]["name"], "click")
+        messages, functions = step_model.requests[0]
+        self.assertIs(messages[-1]["content"][0], self.frame)
+        self.assertIn("click", functions)
+
+    def test_two_model_step_makes_two_requests(self):
+        vision_model = FakeModel("On the screen, I see a terminal icon.")
+        action_model = FakeModel((None, [{"name": "stop", "parameters": {}}]))
+        models = {"vision_model": vision_model, "action_model": action_model}
+        with mock.patch.object(config_service.registry, "get", lambda role: models[role]):
+            content, tool_calls = self.processor("two_model").two_model_step(1)
+
+        self.assertEqual(tool_calls, [{"name": "stop", "parameters": {}}])
+        self.assertEqual(len(vision_model.requests), 1)
+        self.assertEqual(len(action_model.requests), 1)
+
+    def test_failing_step_still_closes_the_pipeline_and_flushes(self):
+        processor = self.processor("fused")
+        processor.fused_step = mock.Mock(side_effect=RuntimeError("provider unavailable"))
+        processor.pipeline.close = mock.Mock()
+        processor.flush_messages = mock.Mock()
+
+        with self.assertRaises(RuntimeError):
+            processor.run_steps()
+        processor.pipeline.close.assert_called_once()
+        processor.flush_messages.assert_called_once()
+        self.assertIsNone(current_step.get())
+
+    def test_only_registered_tools_become_metric_labels(self):
+        self.assertEqual(tool_label("Click"), "click")
+        self.assertEqual(tool_label("clikc_the_button"), "unknown")
+        self.assertEqual(tool_label(None), "unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
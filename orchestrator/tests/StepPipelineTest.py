@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from orchestrator.services.encoding_profiles import DEFAULT_PROFILE
+from orchestrator.services.frame import Frame
+from orchestrator.services.grounding_cache import GroundingCache
+from orchestrator.services.step_pipeline import StepPipeline
+
+
+class FakeGroundingModel:
+    def __init__(self):
+        self.queries = []
+
+    async def acall(self, query, frame):
+        self.queries.append(query)
+        return 10, 20
+
+
+class StepPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.captures = 0
+
+        async def screenshot(user_id):
+            self.captures += 1
+            return Frame(np.full((120, 160, 3), self.captures, dtype=np.uint8), user_id)
+
+        patches = [
+            mock.patch("orchestrator.services.step_pipeline.CommandService.async_screenshot", screenshot),
+            mock.patch("orchestrator.services.step_pipeline.grounding_cache", GroundingCache(path="")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.pipeline = StepPipeline(user_id=1)
+        self.model = FakeGroundingModel()
+
+    def test_prefetched_screenshot_is_used_once(self):
+        self.pipeline.prefetch_screenshot(DEFAULT_PROFILE)
+        frame = self.pipeline.take_screenshot(DEFAULT_PROFILE)
+        self.assertEqual(self.captures, 1)
+        # Encoded for the vision model in the background
+        self.assertIn(DEFAULT_PROFILE, frame._profiles)
+
+        self.pipeline.take_screenshot()
+        self.assertEqual(self.captures, 2)
+
+    def test_started_grounding_is_reused(self):
+        self.pipeline.start_grounding("terminal icon", self.model)
+        frame, position = self.pipeline.take_grounding("terminal icon", self.model)
+        self.assertEqual(position, (10, 20))
+        self.assertEqual(self.model.queries, ["terminal icon"])
+        self.assertEqual(self.captures, 1)
+
+    def test_other_query_is_grounded_again(self):
+        self.pipeline.start_grounding("terminal icon", self.model)
+        self.pipeline.take_grounding("firefox icon", self.model)
+        self.assertEqual(self.model.queries[-1], "firefox icon")
+
+
+if __name__ == '__main__':
+    unittest.main()
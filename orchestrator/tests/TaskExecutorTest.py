@@ -0,0 +1,60 @@
+import threading
+import time
+import unittest
+
+from orchestrator.services.task_executor import TaskExecutor
+
+
+class TaskExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.active_users = set()
+        self.overlaps = 0
+        self.user_of = {}
+
+    def runner(self, task_id, listener=None):
+        user_id = self.user_of[task_id]
+        with self.lock:
+            if user_id in self.active_users:
+                self.overlaps += 1
+            self.active_users.add(user_id)
+        time.sleep(0.05)
+        with self.lock:
+            self.active_users.discard(user_id)
+        return task_id
+
+    def test_users_run_in_parallel_but_tasks_of_a_user_do_not(self):
+        executor = TaskExecutor(max_workers=4, runner=self.runner)
+        futures = []
+        for task_id in range(16):
+            self.user_of[task_id] = task_id % 4
+            futures.append(executor.submit(task_id, task_id % 4))
+
+        started = time.monotonic()
+        self.assertEqual([future.result(5) for future in futures], list(range(16)))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(self.overlaps, 0)
+        self.assertLess(elapsed, 16 * 0.05)
+        stats = executor.stats()
+        self.assertEqual(stats["completed"], 16)
+        self.assertEqual(stats["queue_depth"], 0)
+        executor.shutdown()
+
+    def test_failed_task_does_not_block_the_user(self):
+        def runner(task_id, listener=None):
+            if task_id == 1:
+                raise RuntimeError("desktop unreachable")
+            return task_id
+
+        executor = TaskExecutor(max_workers=2, runner=runner)
+        failing = executor.submit(1, 7)
+        following = executor.submit(2, 7)
+        self.assertRaises(RuntimeError, failing.result, 5)
+        self.assertEqual(following.result(5), 2)
+        self.assertEqual(executor.stats()["failed"], 1)
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import unittest
+from unittest import mock
+
+from orchestrator.models.task import Task, TaskMessage
+
+
+class TaskMessagesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.task = Task(description="Install Telegram")
+
+    def append(self, content):
+        self.task.task_messages.append(TaskMessage(content=json.dumps({"role": "user", "content": content})))
+
+    def test_only_new_rows_are_decoded(self):
+        self.append("OBJECTIVE")
+        self.append("THOUGHT: 1")
+        self.assertEqual([m["content"] for m in self.task.messages()], ["OBJECTIVE", "THOUGHT: 1"])
+
+        self.append("THOUGHT: 2")
+        with mock.patch("orchestrator.models.task.json.loads", wraps=json.loads) as loads:
+            messages = self.task.messages()
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(messages[-1]["content"], "THOUGHT: 2")
+
+    def test_returned_list_is_a_copy(self):
+        self.append("OBJECTIVE")
+        self.task.messages().append({"role": "user", "content": "extra"})
+        self.assertEqual(len(self.task.messages()), 1)
+
+    def test_replaced_rows_rebuild_the_cache(self):
+        self.append("OBJECTIVE")
+        self.task.messages()
+        self.task.task_messages = [TaskMessage(content=json.dumps({"role": "user", "content": "other"}))]
+        self.assertEqual(self.task.messages()[0]["content"], "other")
+
+
+if __name__ == '__main__':
+    unittest.main()
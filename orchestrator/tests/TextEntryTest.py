@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+from asyncvnc import key_codes
+
+from orchestrator.services import command_service
+from orchestrator.services.command_service import client_cut_text, key_action, key_events, text_entry_method, type_keys, paste_text
+
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+
+class FakeKeyboard:
+    def __init__(self):
+        self.pressed = []
+
+    def press(self, *keys):
+        self.pressed.append(keys)
+
+
+class FakeClient:
+    def __init__(self):
+        self.writer = FakeWriter()
+        self.keyboard = FakeKeyboard()
+
+    async def drain(self):
+        pass
+
+
+class TextEntryTestCase(unittest.TestCase):
+    def test_key_events_cover_newlines_and_unicode(self):
+        events = key_events("a\nس")
+        self.assertEqual(len(events), 3 * 16)
+        self.assertEqual(events[:8], b"\x04\x01\x00\x00" + key_codes["a"].to_bytes(4, "big"))
+        self.assertEqual(events[20:24], key_codes["Return"].to_bytes(4, "big"))
+
+    def test_client_cut_text_header(self):
+        self.assertEqual(client_cut_text("hi"), b"\x06\x00\x00\x00\x00\x00\x00\x02hi")
+
+    def test_method_depends_on_length_and_charset(self):
+        self.assertEqual(text_entry_method("ls -la"), "keys")
+        self.assertEqual(text_entry_method("x" * command_service.TYPING_PASTE_THRESHOLD), "paste")
+        self.assertEqual(text_entry_method("س" * command_service.TYPING_PASTE_THRESHOLD), "keys")
+
+    def test_keys_are_sent_in_groups(self):
+        client = FakeClient()
+        asyncio.run(type_keys(client, "x" * 120, group_size=50, delay_ms=0))
+        self.assertEqual([len(data) // 16 for data in client.writer.writes], [50, 50, 20])
+
+    def test_paste_sets_clipboard_then_presses_paste_keys(self):
+        client = FakeClient()
+        asyncio.run(paste_text(client, "echo hello"))
+        self.assertEqual(client.writer.writes, [client_cut_text("echo hello")])
+        self.assertEqual(client.keyboard.pressed, [tuple(command_service.TYPING_PASTE_KEYS)])
+
+    def test_key_names_split_into_combinations(self):
+        client = FakeClient()
+        for name in ("Ctrl+C", "Ctrl++", "+", "Ctrl+Shift++", "Return"):
+            asyncio.run(key_action(client, {"name": name}))
+        self.assertEqual(client.keyboard.pressed, [
+            ("Ctrl", "C"), ("Ctrl", "+"), ("+",), ("Ctrl", "Shift", "+"), ("Return",),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from orchestrator.benchmarks.fakes import FakeRFBServer
+from orchestrator.services.runtime import runtime
+from orchestrator.services.vnc_pool import VNCConnectionPool
+
+
+async def screenshot(client):
+    return await client.screenshot()
+
+
+class VncPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = self.start_server()
+        self.pool = VNCConnectionPool(host=self.server.host)
+        self.addCleanup(lambda: runtime.run(self.pool.close_all()))
+
+    def start_server(self):
+        server = FakeRFBServer(64, 48).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def screenshot(self, user_id=1, port=None):
+        return self.pool.run(user_id, port or self.server.port, screenshot, timeout=5)
+
+    def test_reconnects_after_the_server_closed_the_socket(self):
+        self.screenshot()
+        self.server.drop_connections()
+        self.assertEqual(self.screenshot().shape, (48, 64, 4))
+        self.assertEqual(self.server.connections, 2)
+
+    def test_port_change_rebuilds_the_connection(self):
+        other = self.start_server()
+        self.screenshot()
+        self.screenshot(port=other.port)
+        self.assertEqual((self.server.connections, other.connections), (1, 1))
+        self.assertEqual(len(self.pool), 1)
+        self.assertEqual(self.pool._connections[1].port, other.port)
+
+    def test_idle_connections_and_their_locks_are_dropped(self):
+        self.pool.idle_timeout = 0.01
+        self.screenshot(1)
+        self.screenshot(2)
+        time.sleep(0.02)
+        runtime.run(self.pool.evict_idle())
+        self.assertEqual(len(self.pool), 0)
+        self.assertEqual(dict(self.pool._connect_locks), {})
+
+    def test_least_recently_used_connection_is_evicted(self):
+        self.pool.max_size = 2
+        for user_id in (1, 2, 1, 3):
+            self.screenshot(user_id)
+        self.assertEqual(list(self.pool._connections), [1, 3])
+        self.assertNotIn(2, self.pool._connect_locks)
+
+    def test_connections_in_use_are_not_evicted(self):
+        self.pool.max_size = 1
+
+        async def scenario():
+            async with self.pool.session(1, self.server.port):
+                await self.pool.acquire(2, self.server.port)
+                await self.pool.acquire(3, self.server.port)
+                return list(self.pool._connections)
+
+        # User 1 is busy, so the pool holds two connections until its session ends
+        self.assertEqual(runtime.run(scenario(), timeout=5), [1, 3])
+        self.screenshot(4)
+        self.assertEqual(list(self.pool._connections), [4])
+
+    def test_cancelled_action_does_not_leave_a_desynced_connection(self):
+        self.screenshot()
+        reached = threading.Event()
+
+        async def partial_screenshot(client):
+            # Request an update and read only the start of it, like a capture cancelled mid-read
+            client.video.data = None
+            client.video.refresh()
+            await client.reader.readexactly(4)
+            reached.set()
+            await asyncio.sleep(60)
+
+        future = runtime.submit(self.pool.execute(1, self.server.port, partial_screenshot))
+        self.assertTrue(reached.wait(5))
+        future.cancel()
+
+        self.assertEqual(self.screenshot().shape, (48, 64, 4))
+        self.assertEqual(self.server.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()